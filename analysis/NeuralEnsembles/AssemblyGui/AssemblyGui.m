@@ -543,7 +543,13 @@ elseif minspk_op==1 && pc_op==1 && dc_op==1 && cent_op==1 && nsur_op==0
     
 elseif minspk_op==1 && pc_op==1 && dc_op==1 && cent_op==1 && nsur_op==1 && prct_op==0
     % 5.- only changing core-cell threshoild
-    idthr = prctile(handles.data.sur_cel_cor,handles.pars.prct,3);
+    if isfield(handles.data,'sur_cel_cor')
+        idthr = prctile(handles.data.sur_cel_cor,handles.pars.prct,3);
+    else
+        % saved data do not keep the surrogate correlations, only the
+        % thresholds of new surrogates are needed
+        [~,idthr] = find_core_cells_by_correlation(handles.data.raster,handles.data.ensmat_out,handles.pars.nsur,handles.pars.prct);
+    end
     handles.data.core_cells = handles.data.ens_cel_corr>idthr;
     handles.data.id_sel_core = sum(handles.data.core_cells,1)>handles.pars.minsize;
     
@@ -852,7 +858,9 @@ function save_butt_Callback(hObject, eventdata, handles)
 try
     [saveFileName,savePathName] = uiputfile('*.mat','Save data to mat file',handles.filepath);
     ens_data = handles.data;
-    ens_data = rmfield(ens_data,'sur_cel_cor');
+    if isfield(ens_data,'sur_cel_cor')
+        ens_data = rmfield(ens_data,'sur_cel_cor');
+    end
     ens_data.pars = handles.pars;
     ens_data.filename = handles.pars.filename;
     ens_data.filepath = handles.filepath;
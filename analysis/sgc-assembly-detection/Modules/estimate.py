@@ -1,65 +1,162 @@
+import os
+import sys
+import time
+import importlib
 import warnings
 
+import numpy as np
+import scipy.sparse
 import networkx as nx
 
 
-def estimate(graph, K=40, K0=40, MCsweeps=10000, seed=None, verbose=False):
+# Whether the native extension may be compiled on first use when it is missing
+# or older than its sources; a failed build is only attempted once per process
+AUTOMATIC_BUILD = True;
+
+__build_failed = False;
+
+
+def __import_native():
+
+    global __build_failed
+
+    from Modules.estimate_py.c import build as __build
+    if AUTOMATIC_BUILD and not __build_failed and __build.outdated():
+        if __build.build(verbose=False):
+            importlib.invalidate_caches()
+        else:
+            __build_failed = True;
+
+    from Modules.estimate_py.c import estimate as __estimate
+    return __estimate
+
+
+def estimate(graph, K=40, K0=40, MCsweeps=10000, seed=None, verbose=False, state=None, return_state=False):
 
     """
     Function to calculate the number of communities in a network using the method of Newman and Reinert, which calculates a posterior probability by Monte Carlo simulation of the integrated likelihood of a degree-corrected stochastic block model.
 
     This function implements the approach described in M. E. J. Newman and G. Reinert. "Estimating the number of communities in a network". Phys. Rev. Lett. 117 (2016).
-    Whenever possible this function aims to use the original by M. E. J. Newman written in C on 6. April 2016 adapted to be integrated as a Python extension. If this fails, it will fall back to an essentially 1:1 translation of the original function in Python, for which the author does not claim any originality.
+    Whenever possible this function aims to use the original by M. E. J. Newman written in C on 6. April 2016 adapted to be integrated as a Python extension. If this fails, it will fall back to a NumPy implementation in Python. Both only compute the change of the terms of the log-probability that involve the two groups of a move, the native extension one candidate group at a time and the Python implementation for all candidate groups at once. The Python implementation seeds the Mersenne Twister and maps its outputs to doubles and integers as the GNU Scientific Library does, the same as the native extension, and draws the random numbers in the same order, so a given seed gives the same chain with either implementation up to rounding of the log-probabilities. The native extension is faster on graphs of any size (`python Modules/estimate.py`, 6 planted groups, K a third of the nodes): about 170 times on 120 nodes (12000 vs 71 sweeps/s), 23 times on 300 nodes (490 vs 21 sweeps/s) and 7 times on 900 nodes (15.5 vs 2.3 sweeps/s).
+
+    The graph is an undirected, unweighted networkx graph, its sparse adjacency matrix, or the output of `graph2CSR`; converting the graph once with `graph2CSR` avoids doing it again for every run on the same graph.
+
+    With `return_state` the state at the end of the run is returned as well, a dict with the group assignments `g` (in the order of `graph.nodes()`), the group sizes `n`, the edge counts `m`, the number of groups `k`, the state `rng` of the random number generator and the `backend` that produced it ('native' or 'python'). Passing it back as `state` continues the run where it stopped instead of starting from `K0` random groups; running 2 x N sweeps this way gives the same samples as a single run of 2N sweeps. A state continued with the other implementation gives a warning, the samples then only agree up to rounding.
     """
     
     ALWAYS_USE_NATIVE_IMPLEMENTATION = False;
     
 
-    assert type(graph) is nx.classes.graph.Graph, 'Argument `graph` is not of type networkx.classes.graph.Graph.'
+    NETWORK = graph if type(graph) is dict else graph2CSR(graph)
+    
+    try:
+        if ALWAYS_USE_NATIVE_IMPLEMENTATION:
+            raise(ImportError('ALWAYS_USE_NATIVE_IMPLEMENTATION'))
+        __estimate = __import_native()
+        backend = 'native'
+        
+    except ImportError:
+        from Modules.estimate_py import estimate as __estimate
+        backend = 'python'
+        
+        warnings.warn('Using the Python inference method, the native extension is not available. This is considerably slower.')
+    
+    # Draw a seed here if none was given, the native extension would otherwise
+    # seed from the clock and give identical chains within the same second
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), byteorder='little')
+    
+    if state is not None:
+        state = __check_state(state, NETWORK['nvertices'], K)
+        if state['backend'] is not None and state['backend'] != backend:
+            warnings.warn('Continuing a run of the {:s} implementation with the {:s} implementation, the samples only agree with those of an uninterrupted run up to rounding.'.format(state['backend'], backend))
+    
+    k, E, state = __estimate.estimate(NETWORK, K=K, K0=K0, MCsweeps=MCsweeps, seed=seed, verbose=verbose, state=state)
+    state['backend'] = backend
+    
+    if return_state:
+        return k, E, state
+    
+    return k, E
+
 
+def graph2CSR(graph):
 
-    def graph2NETWORK(graph):
+    """
+    Converts an undirected, unweighted graph, given as a networkx graph or as a SciPy sparse adjacency matrix, into the form both implementations of `estimate` take: a dict with the number of vertices `nvertices` and the compressed sparse row arrays `indptr` and `indices` (C ints) of its adjacency matrix. The vertices are numbered in the order of `graph.nodes()` or of the rows of the matrix.
+    """
 
-        assert type(graph) is nx.classes.graph.Graph, 'Argument `graph` is not of type networkx.classes.graph.Graph.'
+    if scipy.sparse.issparse(graph):
+        A = scipy.sparse.csr_array(graph)
+    elif isinstance(graph, nx.Graph):
+        A = nx.to_scipy_sparse_array(graph, weight=None, format='csr')
+    else:
+        raise TypeError('Argument `graph` is neither a networkx graph nor a sparse adjacency matrix.')
 
-        NETWORK = dict()
-        NETWORK['nvertices'] = graph.number_of_nodes()
-        NETWORK['vertex'] = list()
+    if A.shape[0] != A.shape[1]:
+        raise ValueError('The adjacency matrix of the graph is not square.')
 
-        __nodes = list(graph.nodes())
-        for v in graph.nodes():
+    # Only the structure is used, the edges are unweighted
+    A.sum_duplicates()
+    A.eliminate_zeros()
 
-            __id = __nodes.index(v)
-            __degree = graph.degree(v)
-            __label = str(v)
+    return {'nvertices': A.shape[0], 'indptr': np.ascontiguousarray(A.indptr, dtype=np.intc), 'indices': np.ascontiguousarray(A.indices, dtype=np.intc)}
 
-            __edge = list()
 
-            for u in graph.neighbors(v):
+def __check_state(state, nvertices, K):
 
-                __target = __nodes.index(u)
-                __weight = 1
+    # Both implementations expect plain lists of ints, the state might come
+    # back from a .mat-file as arrays
+    g = [int(_) for _ in state['g']]
+    k = int(state['k'])
+    if len(g) != nvertices:
+        raise ValueError('The state has {:d} group assignments but the graph has {:d} nodes.'.format(len(g), nvertices))
+    if not 0 < k <= K or min(g, default=0) < 0 or max(g, default=0) >= k:
+        raise ValueError('The state has invalid group assignments for k = {:d} and K = {:d}.'.format(k, K))
 
-                __edge.append({'target': __target, 'weight': __weight})
+    rng = state.get('rng')
+    if rng is not None:
+        rng = {'mt': [int(_) for _ in rng['mt']], 'mti': int(rng['mti'])}
+        if len(rng['mt']) != 624 or not 0 <= rng['mti'] <= 624:
+            raise ValueError('The state of the random number generator is invalid.')
 
-            NETWORK['vertex'].append({'id': __id, 'degree': __degree, 'label': __label, 'edge': __edge})
-      
-        return NETWORK
+    # States saved before the implementation was recorded don't have it
+    backend = state.get('backend')
+    if backend is not None:
+        backend = str(backend) or None
 
+    return {'g': g, 'k': k, 'rng': rng, 'backend': backend}
 
 
+def benchmark(nodes_per_group=50, groups=6, MCsweeps=50, seed=0):
 
+    # Same maximal number of groups as the SGC detection uses, a third of the
+    # number of nodes, starting halfway
+    graph = nx.planted_partition_graph(groups, nodes_per_group, 0.3, 0.02, seed=seed)
+    K = -(-graph.number_of_nodes() // 3)
+    NETWORK_opts = {'K': K, 'K0': K // 2, 'MCsweeps': MCsweeps, 'seed': seed, 'verbose': False}
 
-    NETWORK = graph2NETWORK(graph)
-    
+    print('Graph with {:d} nodes and {:d} edges, {:d} sweeps'.format(graph.number_of_nodes(), graph.number_of_edges(), MCsweeps), file=sys.stdout)
+
+    implementations = []
     try:
-        if ALWAYS_USE_NATIVE_IMPLEMENTATION:
-            raise(ImportError('ALWAYS_USE_NATIVE_IMPLEMENTATION'))
-        from Modules.estimate_py.c import estimate as __estimate
-        
+        implementations.append(('native', __import_native()))
     except ImportError:
-        from Modules.estimate_py import estimate as __estimate
-        
-        warnings.warn('Using the native Python inference method. This will significantly increase the runtime.')
-    
-    return __estimate.estimate(NETWORK, K=K, K0=K0, MCsweeps=MCsweeps, verbose=verbose)
+        print(' native: not available', file=sys.stdout)
+    from Modules.estimate_py import estimate as __estimate_py
+    implementations.append(('python', __estimate_py))
+
+    start = time.perf_counter()
+    NETWORK = graph2CSR(graph)
+    print(' conversion: {:.4f} s'.format(time.perf_counter() - start), file=sys.stdout)
+
+    for name, implementation in implementations:
+        start = time.perf_counter()
+        k, E, _ = implementation.estimate(NETWORK, **NETWORK_opts)
+        elapsed = time.perf_counter() - start
+        print(' {:s}: {:.2f} s, {:.1f} sweeps/s, final k = {:d}'.format(name, elapsed, MCsweeps / elapsed, int(k[-1])), file=sys.stdout)
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    benchmark()
@@ -0,0 +1,64 @@
+import os
+import sys
+import subprocess
+import sysconfig
+import tempfile
+
+# Builds the estimate extension next to this file with the compiler and the
+# headers of the running Python, the same as the Makefile does. Only a C
+# compiler is needed, the random number generator and the log-factorials no
+# longer depend on the GNU Scientific Library.
+
+C_PATH = os.path.dirname(os.path.abspath(__file__))
+SOURCE = os.path.join(C_PATH, 'src', 'estimate.c')
+
+def extension_path():
+    return os.path.join(C_PATH, 'estimate' + sysconfig.get_config_var('EXT_SUFFIX'))
+
+def outdated():
+    output = extension_path()
+    if not os.path.isfile(output):
+        return True
+    sources = [os.path.join(C_PATH, 'src', _) for _ in os.listdir(os.path.join(C_PATH, 'src'))]
+    return os.path.getmtime(output) < max(os.path.getmtime(_) for _ in sources)
+
+def build(verbose=True):
+    if sys.platform == 'win32':
+        if verbose:
+            print('Building the estimate extension is only supported on Linux and macOS.', file=sys.stderr)
+        return False
+
+    compiler = (sysconfig.get_config_var('CC') or 'cc').split()
+    cflags = ['-O3', '-fPIC', '-I' + sysconfig.get_paths()['include'], '-I' + os.path.join(C_PATH, 'src')]
+    if sys.platform == 'darwin':
+        ldflags = ['-bundle', '-undefined', 'dynamic_lookup', '-lm']
+    else:
+        ldflags = ['-shared', '-lm']
+
+    # Compile to a temporary file first, several processes may try to build
+    # at the same time and none of them should import a half written library
+    output = extension_path()
+    descriptor, temporary = tempfile.mkstemp(suffix=sysconfig.get_config_var('EXT_SUFFIX'), dir=C_PATH)
+    os.close(descriptor)
+    command = compiler + cflags + [SOURCE, '-o', temporary] + ldflags
+    if verbose:
+        print(' '.join(command), file=sys.stderr)
+    try:
+        result = subprocess.run(command, capture_output=True, text=True)
+    except OSError as error:
+        result = None
+        message = str(error)
+    else:
+        message = result.stderr
+    if result is None or result.returncode != 0:
+        os.remove(temporary)
+        if verbose:
+            print(f'Building the estimate extension failed:\n{message}', file=sys.stderr)
+        return False
+    os.replace(temporary, output)
+    if verbose:
+        print(f'Built {output}', file=sys.stderr)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if build() else 1)
@@ -26,17 +26,17 @@
 //#include <stdlib.h>
 #include <math.h>
 #include <time.h>
-#include <gsl/gsl_rng.h>
-#include <gsl/gsl_sf_gamma.h>
 
 #include <network.h>
+#include <mt19937.h>
 
 /* Program control */
 
 //#define VERBOSE
 int VERBOSE = 1;
 
-int RNG_SEED = 0;
+unsigned long RNG_SEED = 0;
+int RNG_RESTORED = 0; // Whether the generator state has been restored from a previous run
 
 /* Constants */
 
@@ -55,6 +55,7 @@ double *E__;
 /* Globals */
 
 NETWORK G; // Struct storing the network
+EDGE *EDGES = NULL; // Edges of all vertices, G.vertex[u].edge points into it
 int twom;  // Twice the number of edges
 double p;  // Average edge probability
 
@@ -62,11 +63,17 @@ int k;	 // Current value of k
 int *g;	 // Group assignments
 int *n;	 // Group sizes
 int **m; // Edge counts
+int *kappa; // Edge ends in each group
 
 double *lnfact; // Look-up table of log-factorials
+double *lnpair; // Look-up table of log(p * x + 1) for the products x of two group sizes
+long lnpair_length;
 double E;		// Log probability
 
-gsl_rng *rng; // Random number generator
+int *INITIAL_G = NULL; // Group assignments to continue from, NULL to draw them at random
+int INITIAL_K;		   // Value of k to continue from
+
+mt19937_state rng; // Random number generator, same as gsl_rng_mt19937
 
 // Make a lookup table of log-factorial values
 
@@ -78,7 +85,36 @@ void ___maketable()
 	length = twom + G.nvertices + 1;
 	lnfact = malloc(length * sizeof(double));
 	for (t = 0; t < length; t++)
-		lnfact[t] = gsl_sf_lnfact(t);
+		lnfact[t] = lgamma(t + 1.0);
+
+	// The product of two group sizes is at most ((n + 1) / 2)^2, the table is
+	// capped at 2^22 entries and larger products are computed directly
+
+	lnpair_length = ((long)G.nvertices + 2) / 2;
+	lnpair_length = lnpair_length * lnpair_length + 1;
+	if (lnpair_length > (1L << 22))
+		lnpair_length = 1L << 22;
+	lnpair = malloc(lnpair_length * sizeof(double));
+	for (t = 0; t < lnpair_length; t++)
+		lnpair[t] = log(p * t + 1);
+}
+
+// Terms of the log-probability that belong to a single group, given its size,
+// the number of edge ends in it and twice its internal edges
+
+static inline double ___groupterm(int nr, int kappar, int mrr)
+{
+	if (nr == 0)
+		return lnfact[0];
+	return lnfact[nr] + kappar * log(nr) + lnfact[nr - 1] - lnfact[kappar + nr - 1] + lnfact[mrr / 2] - (mrr / 2 + 1) * log(0.5 * p * nr * nr + 1);
+}
+
+// Terms of the log-probability that belong to a pair of groups, given the
+// edges between them and the product of their sizes; zero if either is empty
+
+static inline double ___pairterm(int mrs, long nrns)
+{
+	return lnfact[mrs] - (mrs + 1) * (nrns < lnpair_length ? lnpair[nrns] : log(p * nrns + 1));
 }
 
 // Log-probability function
@@ -115,11 +151,22 @@ void ___initgroups()
 	int i, u, v;
 	int r;
 
-	// Make the initial group assignments at random
+	// Make the initial group assignments at random, or continue from the
+	// given ones
 
-	g = malloc(G.nvertices * sizeof(int));
-	for (u = 0; u < G.nvertices; u++)
-		g[u] = gsl_rng_uniform_int(rng, K0);
+	if (INITIAL_G != NULL)
+	{
+		g = INITIAL_G;
+		INITIAL_G = NULL;
+		k = INITIAL_K;
+	}
+	else
+	{
+		g = malloc(G.nvertices * sizeof(int));
+		for (u = 0; u < G.nvertices; u++)
+			g[u] = mt19937_uniform_int(&rng, K0);
+		k = K0;
+	}
 
 	// Calculate the values of the n's
 
@@ -132,18 +179,19 @@ void ___initgroups()
 	m = malloc(K * sizeof(int *));
 	for (r = 0; r < K; r++)
 		m[r] = calloc(K, sizeof(int));
+	kappa = calloc(K, sizeof(int));
 	for (u = 0; u < G.nvertices; u++)
 	{
 		for (i = 0; i < G.vertex[u].degree; i++)
 		{
 			v = G.vertex[u].edge[i].target;
 			m[g[u]][g[v]]++;
+			kappa[g[u]]++;
 		}
 	}
 
-	// Initialize k and the log-probability
+	// Initialize the log-probability
 
-	k = K0;
 	E = ___logp(n, m);
 }
 
@@ -159,7 +207,7 @@ void ___changek()
 
 	// With probability 0.5, decrease k, otherwise increase it
 
-	if (gsl_rng_uniform(rng) < 0.5)
+	if (mt19937_uniform(&rng) < 0.5)
 	{
 
 		// Count the number of empty groups
@@ -179,7 +227,7 @@ void ___changek()
 
 			do
 			{
-				r = gsl_rng_uniform_int(rng, k);
+				r = mt19937_uniform_int(&rng, k);
 			} while (n[r] > 0);
 
 			// Decrease k by 1
@@ -194,9 +242,10 @@ void ___changek()
 					g[u] = r;
 			}
 
-			// Update n_r
+			// Update n_r and kappa_r
 
 			n[r] = n[k];
+			kappa[r] = kappa[k];
 
 			// Update m_rs
 
@@ -219,11 +268,12 @@ void ___changek()
 
 		// With probability k/(n+k) increase k by 1, adding an empty group
 
-		if ((G.nvertices + k) * gsl_rng_uniform(rng) < k)
+		if ((G.nvertices + k) * mt19937_uniform(&rng) < k)
 		{
 			if (k < K)
 			{
 				n[k] = 0;
+				kappa[k] = 0;
 				for (r = 0; r <= k; r++)
 					m[k][r] = m[r][k] = 0;
 				k = k + 1;
@@ -234,12 +284,14 @@ void ___changek()
 
 // Function to update n and m for a proposed move
 
-void ___nmupdate(int r, int s, int d[])
+void ___nmupdate(int r, int s, int d[], int du)
 {
 	int t;
 
 	n[r]--;
 	n[s]++;
+	kappa[r] -= du;
+	kappa[s] += du;
 	for (t = 0; t < k; t++)
 	{
 		m[r][t] -= d[t];
@@ -250,17 +302,18 @@ void ___nmupdate(int r, int s, int d[])
 }
 
 // Function that does one MCMC sweep (i.e., n individual moves) using the
-// heatbath algorithm
+// heatbath algorithm. A move from group r to group s only changes the terms
+// of the log-probability that involve r or s, so only the change of these
+// terms is computed for every candidate group instead of the whole logp
 
 double ___sweep()
 {
-	int i, j, u, v;
-	int r, s;
-	//int temp;
+	int i, j, t, u, v;
+	int r, s, du;
 	int accept = 0;
 	int d[K];
-	double x, Z, sum;
-	double newE[K];
+	double x, Z, sum, delta, delta_r, total_r;
+	double row_r[K];
 	double boltzmann[K];
 
 	for (i = 0; i < G.nvertices; i++)
@@ -268,13 +321,14 @@ double ___sweep()
 
 		// Optionally, perform a k-changing move
 
-		if ((G.nvertices + 1) * gsl_rng_uniform(rng) < 1.0)
+		if ((G.nvertices + 1) * mt19937_uniform(&rng) < 1.0)
 			___changek();
 
 		// Choose a random node
 
-		u = gsl_rng_uniform_int(rng, G.nvertices);
+		u = mt19937_uniform_int(&rng, G.nvertices);
 		r = g[u];
+		du = G.vertex[u].degree;
 
 		// Find the number of edges this node has to each group
 
@@ -286,6 +340,21 @@ double ___sweep()
 			d[g[v]]++;
 		}
 
+		// Change of the terms of group r, which loses the node, and of the
+		// pairs (r, t), the same for every candidate group
+
+		delta_r = ___groupterm(n[r] - 1, kappa[r] - du, m[r][r] - 2 * d[r]) - ___groupterm(n[r], kappa[r], m[r][r]);
+		total_r = 0.0;
+		for (t = 0; t < k; t++)
+		{
+			row_r[t] = 0.0;
+			if (t != r && n[t] > 0)
+			{
+				row_r[t] = ___pairterm(m[r][t] - d[t], (long)(n[r] - 1) * n[t]) - ___pairterm(m[r][t], (long)n[r] * n[t]);
+				total_r += row_r[t];
+			}
+		}
+
 		// Calculate the probabilities of moving it to each group in turn
 
 		Z = 0.0;
@@ -293,39 +362,53 @@ double ___sweep()
 		{
 			if (s == r)
 			{
-				newE[s] = E;
+				boltzmann[s] = 1.0;
 			}
 			else
 			{
-				___nmupdate(r, s, d);
-				newE[s] = ___logp(n, m);
-				___nmupdate(s, r, d);
+				// Group s gains the node, the pairs (r, t) and (s, t) for the
+				// other groups t and the pair (r, s) itself change
+
+				delta = delta_r + total_r - row_r[s];
+				delta += ___groupterm(n[s] + 1, kappa[s] + du, m[s][s] + 2 * d[s]) - ___groupterm(n[s], kappa[s], m[s][s]);
+				for (t = 0; t < k; t++)
+				{
+					if (t != r && t != s && n[t] > 0)
+						delta += ___pairterm(m[s][t] + d[t], (long)(n[s] + 1) * n[t]) - ___pairterm(m[s][t], (long)n[s] * n[t]);
+				}
+				delta += ___pairterm(m[r][s] + d[r] - d[s], (long)(n[r] - 1) * (n[s] + 1)) - ___pairterm(m[r][s], (long)n[r] * n[s]);
+				boltzmann[s] = exp(delta);
 			}
-			boltzmann[s] = exp(newE[s] - E);
 			Z += boltzmann[s];
 		}
 
 		// Choose which move to make based on these probabilities
 
-		x = Z * gsl_rng_uniform(rng);
+		x = Z * mt19937_uniform(&rng);
 		for (s = 0, sum = 0.0; s < k; s++)
 		{
 			sum += boltzmann[s];
 			if (sum > x)
 				break;
 		}
+		if (s == k)
+			s = k - 1;
 
 		// Make the move
 
 		if (s != r)
 		{
 			g[u] = s;
-			___nmupdate(r, s, d);
-			E = newE[s];
+			___nmupdate(r, s, d, du);
 			accept++;
 		}
 	}
 
+	// Evaluate the log-probability once per sweep, summing the changes would
+	// accumulate rounding errors
+
+	E = ___logp(n, m);
+
 	return (double)accept / G.nvertices;
 }
 
@@ -338,10 +421,11 @@ int ___main()
 	k__ = malloc(MCSWEEPS * sizeof(int));
 	E__ = malloc(MCSWEEPS * sizeof(double));
 
-	// Initialize the random number generator from the system clock
+	// Initialize the random number generator from the seed, unless its state
+	// has been restored
 
-	rng = gsl_rng_alloc(gsl_rng_mt19937);
-	gsl_rng_set(rng, RNG_SEED);
+	if (!RNG_RESTORED)
+		mt19937_set(&rng, RNG_SEED);
 
 	// Read the network from stdin
 
@@ -389,6 +473,28 @@ int ___main()
 	return 0;
 }
 
+// Free everything allocated by ___main and by the network conversion, so that
+// repeated calls from Python don't leak
+
+void ___free()
+{
+	int r, u;
+
+	free(lnfact);
+	free(lnpair);
+	free(g);
+	free(n);
+	free(kappa);
+	for (r = 0; r < K; r++)
+		free(m[r]);
+	free(m);
+	free(k__);
+	free(E__);
+	free(EDGES);
+	EDGES = NULL;
+	free(G.vertex);
+}
+
 // =============================================================================
 // END: estimate.c =============================================================
 // =============================================================================
@@ -398,14 +504,13 @@ int ___main()
 //	k__ = malloc(MCSWEEPS * sizeof(int));
 //	E__ = malloc(MCSWEEPS * sizeof(double));
 //
-//	rng = gsl_rng_alloc(gsl_rng_mt19937);
-//	gsl_rng_set(rng, RNG_SEED);
+//	mt19937_set(&rng, RNG_SEED);
 //
 //	int s;
 //	for (s = 0; s < MCSWEEPS; s++)
 //	{
-//		k__[s] = gsl_rng_uniform_int(rng, K);
-//		E__[s] = gsl_rng_uniform(rng);
+//		k__[s] = mt19937_uniform_int(&rng, K);
+//		E__[s] = mt19937_uniform(&rng);
 //	}
 //
 //	return 0;
@@ -417,17 +522,18 @@ int ___main()
 
 static PyObject* estimate_func(PyObject *self, PyObject *args, PyObject *kwargs)
 {
-	static char* argnames[] = {"graph", "_", "K", "K0", "MCsweeps", "seed", "verbose", NULL};
+	static char* argnames[] = {"graph", "_", "K", "K0", "MCsweeps", "seed", "verbose", "state", NULL};
 
 	PyObject* arg_graphGMLdict;
 	int arg__ = 0;
     int arg_K = 40;
 	int arg_K0 = 40;
 	int arg_MCSWEEPS = 10000;
-	int arg_seed = time(NULL);
+	unsigned long arg_seed = time(NULL);
 	bool arg_verbose = true;
+	PyObject* arg_state = Py_None;
 
-    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "O!|iiiiip", argnames, &PyDict_Type, &arg_graphGMLdict, &arg__, &arg_K, &arg_K0, &arg_MCSWEEPS, &arg_seed, &arg_verbose))
+    if(!PyArg_ParseTupleAndKeywords(args, kwargs, "O!|iiiikpO", argnames, &PyDict_Type, &arg_graphGMLdict, &arg__, &arg_K, &arg_K0, &arg_MCSWEEPS, &arg_seed, &arg_verbose, &arg_state))
 	{
         return NULL;
 	}
@@ -442,43 +548,121 @@ static PyObject* estimate_func(PyObject *self, PyObject *args, PyObject *kwargs)
 	RNG_SEED = arg_seed;
 
 
-	PyObject *py_G_nvertices = PyDict_GetItemWithError(arg_graphGMLdict, PyUnicode_FromString("nvertices"));
+	PyObject *py_G_nvertices = PyDict_GetItemString(arg_graphGMLdict, "nvertices");
 
 	G.nvertices = (int)PyLong_AsLong(py_G_nvertices);
-	G.vertex = calloc(G.nvertices, sizeof(VERTEX));
-
-	PyObject *py_G_vertex = PyDict_GetItemWithError(arg_graphGMLdict, PyUnicode_FromString("vertex"));
 
 	int i, j;
 
-	for(i = 0; i < G.nvertices; i++)
+	// State of a previous run to continue from: the group assignments, k and
+	// optionally the state of the random number generator
+
+	RNG_RESTORED = 0;
+	if (arg_state != Py_None)
 	{
-		PyObject *py_G_vertex_i = PyList_GetItem(py_G_vertex, i);
+		PyObject *py_state_g = PyDict_Check(arg_state) ? PyDict_GetItemString(arg_state, "g") : NULL;
+		PyObject *py_state_k = PyDict_Check(arg_state) ? PyDict_GetItemString(arg_state, "k") : NULL;
+		PyObject *py_state_rng = PyDict_Check(arg_state) ? PyDict_GetItemString(arg_state, "rng") : NULL;
 
-		PyObject *py_G_vertex_i_id = PyDict_GetItemWithError(py_G_vertex_i, PyUnicode_FromString("id"));
-		PyObject *py_G_vertex_i_degree = PyDict_GetItemWithError(py_G_vertex_i, PyUnicode_FromString("degree"));
-		PyObject *py_G_vertex_i_label = PyDict_GetItemWithError(py_G_vertex_i, PyUnicode_FromString("label"));
+		if (py_state_g == NULL || py_state_k == NULL || !PyList_Check(py_state_g) || PyList_GET_SIZE(py_state_g) != G.nvertices)
+		{
+			PyErr_SetString(PyExc_ValueError, "`state` must be a dict with a list `g` of one group per vertex and `k`.");
+			return NULL;
+		}
 
-		G.vertex[i].id = (int)PyLong_AsLong(py_G_vertex_i_id);
-		G.vertex[i].degree = (int)PyLong_AsLong(py_G_vertex_i_degree);
-		G.vertex[i].label = NULL;
+		INITIAL_K = (int)PyLong_AsLong(py_state_k);
+		INITIAL_G = malloc(G.nvertices * sizeof(int));
+		for (i = 0; i < G.nvertices; i++)
+			INITIAL_G[i] = (int)PyLong_AsLong(PyList_GET_ITEM(py_state_g, i));
+
+		if (py_state_rng != NULL && py_state_rng != Py_None)
+		{
+			PyObject *py_state_mt = PyDict_Check(py_state_rng) ? PyDict_GetItemString(py_state_rng, "mt") : NULL;
+			PyObject *py_state_mti = PyDict_Check(py_state_rng) ? PyDict_GetItemString(py_state_rng, "mti") : NULL;
+
+			if (py_state_mt == NULL || py_state_mti == NULL || !PyList_Check(py_state_mt) || PyList_GET_SIZE(py_state_mt) != MT_N)
+			{
+				free(INITIAL_G);
+				INITIAL_G = NULL;
+				PyErr_SetString(PyExc_ValueError, "`state['rng']` must be a dict with a list `mt` of 624 words and `mti`.");
+				return NULL;
+			}
 
-		G.vertex[i].edge = calloc(G.vertex[i].degree, sizeof(EDGE));
-		
-		PyObject *py_G_vertex_i_edge = PyDict_GetItemWithError(py_G_vertex_i, PyUnicode_FromString("edge"));
+			for (i = 0; i < MT_N; i++)
+				rng.mt[i] = PyLong_AsUnsignedLongMask(PyList_GET_ITEM(py_state_mt, i)) & 0xffffffffUL;
+			rng.mti = (int)PyLong_AsLong(py_state_mti);
+			RNG_RESTORED = 1;
+		}
 
-		for(j = 0; j < G.vertex[i].degree; j++)
+		if (PyErr_Occurred())
 		{
-			PyObject *py_G_vertex_i_edge_j = PyList_GetItem(py_G_vertex_i_edge, j);
+			free(INITIAL_G);
+			INITIAL_G = NULL;
+			return NULL;
+		}
+	}
+
+	// The network as the compressed sparse row arrays of its adjacency
+	// matrix, the neighbours of vertex i are indices[indptr[i]:indptr[i+1]]
+
+	Py_buffer indptr, indices;
+	PyObject *py_G_indptr = PyDict_GetItemString(arg_graphGMLdict, "indptr");
+	PyObject *py_G_indices = PyDict_GetItemString(arg_graphGMLdict, "indices");
+
+	if (py_G_indptr == NULL || py_G_indices == NULL)
+	{
+		free(INITIAL_G);
+		INITIAL_G = NULL;
+		PyErr_SetString(PyExc_ValueError, "`graph` must be a dict with `nvertices` and the arrays `indptr` and `indices`.");
+		return NULL;
+	}
+	if (PyObject_GetBuffer(py_G_indptr, &indptr, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0)
+	{
+		free(INITIAL_G);
+		INITIAL_G = NULL;
+		return NULL;
+	}
+	if (PyObject_GetBuffer(py_G_indices, &indices, PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) != 0)
+	{
+		PyBuffer_Release(&indptr);
+		free(INITIAL_G);
+		INITIAL_G = NULL;
+		return NULL;
+	}
+
+	int *G_indptr = (int *)indptr.buf;
+	int *G_indices = (int *)indices.buf;
 
-			PyObject *py_G_vertex_i_edge_j_target = PyDict_GetItemWithError(py_G_vertex_i_edge_j, PyUnicode_FromString("target"));
-			PyObject *py_G_vertex_i_edge_j_weight = PyDict_GetItemWithError(py_G_vertex_i_edge_j, PyUnicode_FromString("weight"));
+	if (indptr.itemsize != sizeof(int) || indices.itemsize != sizeof(int) || strcmp(indptr.format, "i") != 0 || strcmp(indices.format, "i") != 0 || indptr.len / indptr.itemsize != G.nvertices + 1 || G_indptr[0] != 0 || G_indptr[G.nvertices] != indices.len / indices.itemsize)
+	{
+		PyBuffer_Release(&indptr);
+		PyBuffer_Release(&indices);
+		free(INITIAL_G);
+		INITIAL_G = NULL;
+		PyErr_SetString(PyExc_ValueError, "`indptr` and `indices` must be C int arrays of a compressed sparse row matrix with `nvertices` rows.");
+		return NULL;
+	}
+
+	G.vertex = calloc(G.nvertices, sizeof(VERTEX));
+	EDGES = calloc(G_indptr[G.nvertices] > 0 ? G_indptr[G.nvertices] : 1, sizeof(EDGE));
+
+	for (i = 0; i < G.nvertices; i++)
+	{
+		G.vertex[i].id = i;
+		G.vertex[i].degree = G_indptr[i + 1] - G_indptr[i];
+		G.vertex[i].label = NULL;
+		G.vertex[i].edge = EDGES + G_indptr[i];
 
-			G.vertex[i].edge[j].target = (int)PyLong_AsLong(py_G_vertex_i_edge_j_target);
-			G.vertex[i].edge[j].weight = (int)PyLong_AsLong(py_G_vertex_i_edge_j_weight);
+		for (j = 0; j < G.vertex[i].degree; j++)
+		{
+			G.vertex[i].edge[j].target = G_indices[G_indptr[i] + j];
+			G.vertex[i].edge[j].weight = 1;
 		}
 	}
 
+	PyBuffer_Release(&indptr);
+	PyBuffer_Release(&indices);
+
 
 	___main();
 
@@ -492,15 +676,41 @@ static PyObject* estimate_func(PyObject *self, PyObject *args, PyObject *kwargs)
 		PyList_SetItem(py_E, s, PyFloat_FromDouble(E__[s]));
 	}
 
-	PyObject *py_out = PyTuple_New(2);
+	// State at the end of the run, to continue it later
+
+	PyObject *py_state_g = PyList_New(G.nvertices);
+	for (i = 0; i < G.nvertices; i++)
+		PyList_SetItem(py_state_g, i, PyLong_FromLong(g[i]));
+
+	PyObject *py_state_n = PyList_New(k);
+	PyObject *py_state_m = PyList_New(k);
+	for (i = 0; i < k; i++)
+	{
+		PyList_SetItem(py_state_n, i, PyLong_FromLong(n[i]));
+		PyObject *py_state_m_i = PyList_New(k);
+		for (j = 0; j < k; j++)
+			PyList_SetItem(py_state_m_i, j, PyLong_FromLong(m[i][j]));
+		PyList_SetItem(py_state_m, i, py_state_m_i);
+	}
+
+	PyObject *py_state_mt = PyList_New(MT_N);
+	for (i = 0; i < MT_N; i++)
+		PyList_SetItem(py_state_mt, i, PyLong_FromUnsignedLong(rng.mt[i]));
+
+	PyObject *py_state = Py_BuildValue("{s:N,s:N,s:N,s:i,s:{s:N,s:i}}", "g", py_state_g, "n", py_state_n, "m", py_state_m, "k", k, "rng", "mt", py_state_mt, "mti", rng.mti);
+
+	___free();
+
+	PyObject *py_out = PyTuple_New(3);
 	PyTuple_SetItem(py_out, 0, py_k);
 	PyTuple_SetItem(py_out, 1, py_E);
+	PyTuple_SetItem(py_out, 2, py_state);
 
 	return py_out;
 }
 
 static PyMethodDef estimateMethods[] = {
-	{"estimate", estimate_func, METH_VARARGS | METH_KEYWORDS, "<estimate.__doc__>"},
+	{"estimate", (PyCFunction)(void (*)(void))estimate_func, METH_VARARGS | METH_KEYWORDS, "<estimate.__doc__>"},
 	{NULL, NULL, 0, NULL}
 };
 
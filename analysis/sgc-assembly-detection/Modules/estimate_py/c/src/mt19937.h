@@ -0,0 +1,99 @@
+// Mersenne Twister MT19937 random number generator
+//
+// Same seeding and output as gsl_rng_mt19937, gsl_rng_uniform and
+// gsl_rng_uniform_int, so that the extension can be built without the GNU
+// Scientific Library and still produce the same chains for a given seed.
+
+#ifndef _MT19937_H
+#define _MT19937_H
+
+#define MT_N 624
+#define MT_M 397
+#define MT_UPPER_MASK 0x80000000UL
+#define MT_LOWER_MASK 0x7fffffffUL
+
+typedef struct {
+  unsigned long mt[MT_N];
+  int mti;
+} mt19937_state;
+
+static void mt19937_set(mt19937_state *state, unsigned long s)
+{
+  int i;
+
+  if (s == 0)
+    s = 4357; // the default seed is 4357
+
+  state->mt[0] = s & 0xffffffffUL;
+  for (i = 1; i < MT_N; i++)
+  {
+    state->mt[i] = (1812433253UL * (state->mt[i - 1] ^ (state->mt[i - 1] >> 30)) + i);
+    state->mt[i] &= 0xffffffffUL;
+  }
+  state->mti = MT_N;
+}
+
+static unsigned long mt19937_get(mt19937_state *state)
+{
+  unsigned long k;
+  unsigned long *const mt = state->mt;
+
+#define MAGIC(y) (((y) & 0x1) ? 0x9908b0dfUL : 0)
+
+  if (state->mti >= MT_N)
+  {
+    int kk;
+
+    for (kk = 0; kk < MT_N - MT_M; kk++)
+    {
+      unsigned long y = (mt[kk] & MT_UPPER_MASK) | (mt[kk + 1] & MT_LOWER_MASK);
+      mt[kk] = mt[kk + MT_M] ^ (y >> 1) ^ MAGIC(y);
+    }
+    for (; kk < MT_N - 1; kk++)
+    {
+      unsigned long y = (mt[kk] & MT_UPPER_MASK) | (mt[kk + 1] & MT_LOWER_MASK);
+      mt[kk] = mt[kk + (MT_M - MT_N)] ^ (y >> 1) ^ MAGIC(y);
+    }
+
+    {
+      unsigned long y = (mt[MT_N - 1] & MT_UPPER_MASK) | (mt[0] & MT_LOWER_MASK);
+      mt[MT_N - 1] = mt[MT_M - 1] ^ (y >> 1) ^ MAGIC(y);
+    }
+
+    state->mti = 0;
+  }
+
+#undef MAGIC
+
+  k = mt[state->mti];
+  k ^= (k >> 11);
+  k ^= (k << 7) & 0x9d2c5680UL;
+  k ^= (k << 15) & 0xefc60000UL;
+  k ^= (k >> 18);
+
+  state->mti++;
+
+  return k;
+}
+
+// Uniform double in [0, 1)
+static double mt19937_uniform(mt19937_state *state)
+{
+  return mt19937_get(state) / 4294967296.0;
+}
+
+// Uniform integer in [0, n-1]
+static unsigned long mt19937_uniform_int(mt19937_state *state, unsigned long n)
+{
+  unsigned long scale = 0xffffffffUL / n;
+  unsigned long k;
+
+  do
+  {
+    k = mt19937_get(state) / scale;
+  } while (k >= n);
+
+  return k;
+}
+
+#endif
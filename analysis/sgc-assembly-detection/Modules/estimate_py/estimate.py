@@ -1,11 +1,11 @@
-import networkx
 import random
+import time
 
 import numpy
 
 import sys
 
-from math import exp, log, floor
+from math import log
 from scipy.special import gammaln
 
 #/* Program to calculate the number of communities in a network using the
@@ -16,6 +16,27 @@ from scipy.special import gammaln
 # * Written by Mark Newman  6 APR 2016
 # */
 
+# The state is kept in NumPy arrays. A move of a node from group r to group s
+# only changes the terms of the log-probability that involve r or s, so
+# instead of evaluating logp for every candidate group the change of these
+# terms is computed for all candidate groups at once. The random numbers are
+# those of the C version: the Mersenne Twister is seeded as gsl_rng_mt19937
+# does and the 32-bit outputs are mapped to doubles and integers as
+# gsl_rng_uniform and gsl_rng_uniform_int do, and they are drawn in the same
+# order, so a given seed produces the same chain up to rounding of the
+# log-probabilities. The state of the generator is returned and restored in
+# the same form (the 624 words and the position) as by the C version.
+
+#// Seeding of gsl_rng_mt19937, returns the 624 words and the position
+
+def mt19937_set(seed):
+    seed %= 1 << 64
+    if seed == 0: seed = 4357                                           #// The default seed is 4357
+    mt = [seed & 0xffffffff]
+    for i in range(1, 624):
+        mt.append((1812433253 * (mt[-1] ^ (mt[-1] >> 30)) + i) & 0xffffffff)
+    return mt, 624
+
 def estimate(graph, **kwargs):
 
     if not 'K' in kwargs: kwargs['K'] = 40
@@ -23,315 +44,295 @@ def estimate(graph, **kwargs):
     if not 'MCsweeps' in kwargs: kwargs['MCsweeps'] = 10000
     if not 'seed' in kwargs: kwargs['seed'] = None
     if not 'verbose' in kwargs: kwargs['verbose'] = True
+    if not 'state' in kwargs: kwargs['state'] = None
 
     if kwargs['K0'] > kwargs['K']: kwargs['K0'] = kwargs['K']
 
     #/* Program control */
 
     VERBOSE = kwargs['verbose']
-    
+
     #/* Constants */
 
     K = kwargs['K']                                                     #// Maximum number of groups
     K0 = kwargs['K0']                                                   #
+    STATE = kwargs['state']                                             #// State of a previous run to continue from
     MCSWEEPS = kwargs['MCsweeps']                                       #// Number of Monte Carlo sweeps
     SAMPLE = 10                                                         #// Interval at which to print out results, in sweeps
 
-    #/* Globals */
+    #// Initialize the random number generator
 
-    G = None                                                            #// Struct storing the network
-    twom = 0                                                            #// Twice the number of edges
-    p = 0.                                                              #// Average edge probability
+    if STATE is not None and STATE.get('rng') is not None:
+        mt, mti = STATE['rng']['mt'], STATE['rng']['mti']
+    else:
+        seed = kwargs['seed'] if kwargs['seed'] is not None else int(time.time())
+        mt, mti = mt19937_set(seed)
+    rng = random.Random()
+    rng.setstate((3, tuple(mt) + (mti,), None))
+    getrandbits = rng.getrandbits
 
-    global k; k = 0                                                     #// Current value of k
-    global g; g = None                                                  #// Group assignments
-    global n; n = None                                                  #// Group sizes
-    global m; m = None                                                  #// Edge counts
+    def uniform():                                                      #// Same as gsl_rng_uniform
+        return getrandbits(32) / 4294967296.0
 
-    global lnfact; lnfact = None                                        #// Look-up table of log-factorials
-    global E; E = None                                                  #// Log probability
+    def randrange(n):                                                   #// Same as gsl_rng_uniform_int
+        scale = 0xffffffff // n
+        while True:
+            r = getrandbits(32) // scale
+            if r < n: return r
 
+    #// Read the network
 
-    __k__ = numpy.empty(MCSWEEPS, dtype=numpy.uint8)
-    #__g__ = list()
-    __E__ = numpy.empty(MCSWEEPS, dtype=numpy.float64)
+    if VERBOSE:
+        print('Reading network...', end='\n', file=sys.stderr)
 
+    #// The network is given as the compressed sparse row arrays of its
+    #// adjacency matrix, the neighbours of u are indices[indptr[u]:indptr[u+1]]
 
+    nvertices = graph['nvertices']
+    indptr = numpy.asarray(graph['indptr'], dtype=numpy.int64)
+    indices = numpy.asarray(graph['indices'], dtype=numpy.int64)
+    neighbours = numpy.split(indices, indptr[1:-1])
+    degree = numpy.diff(indptr).tolist()
+    twom = sum(degree)                                                  #// Twice the number of edges
+    p = twom / ( nvertices * nvertices )                                #// Average edge probability
 
-    #// Make a lookup table of log-factorial values
-
-    def maketable():
-        global lnfact
+    if VERBOSE:
+        print('Read network with {:d} nodes and {:d} edges'.format(nvertices , int(twom/2)), end='\n', file=sys.stderr)
 
-        t = 0
-        length = 0
+    #// Make a lookup table of log-factorial values
 
-        length = twom + G['nvertices'] + 1
-        lnfact = numpy.empty(length)
-        for t in range(length):
-            lnfact[t] = gammaln(t + 1)
+    lnfact = gammaln(numpy.arange(twom + nvertices + 1) + 1)
 
-    #// Log-probability function
+    #// Terms of the log-probability that belong to a single group, given its
+    #// size, the number of edge ends in it and twice its internal edges
 
-    def logp(n, m):
-        r, s = 0, 0
-        kappa = 0
-        res = 0.
+    def group_terms(n, kappa, mrr):
+        occupied = n > 0
+        n1 = numpy.maximum(n, 1)
+        return lnfact[n] + numpy.where(occupied,
+            kappa * numpy.log(n1) + lnfact[n1 - 1] - lnfact[kappa + n1 - 1]
+            + lnfact[mrr // 2] - (mrr // 2 + 1) * numpy.log(0.5 * p * n1 * n1 + 1), 0.)
 
-        for r in range(k):
-            res += lnfact[n[r]]
+    #// Terms of the log-probability that belong to a pair of groups, given the
+    #// edges between them and the product of their sizes; zero if either is empty
 
-            if n[r] > 0:
-                kappa = 0
-                for s in range(k):
-                    kappa += m[r][s]
-                res += kappa * log(n[r]) + lnfact[n[r] - 1] - lnfact[kappa + n[r] - 1]
-                res += lnfact[m[r][r] // 2] - (m[r][r] // 2 + 1) * log(0.5 * p * n[r] * n[r] + 1)
-                for s in range(r + 1, k):
-                    res += lnfact[m[r][s]] - (m[r][s] + 1) * log(p * n[r] * n[s] + 1)
-        
-        return res
-    
-    #// Initial group assignment
+    def pair_terms(mrs, nrns):
+        return lnfact[mrs] - (mrs + 1) * numpy.log(p * nrns + 1)
 
-    def initgroups():
-        global g
-        global n
-        global m
+    #// Scalar version of group_terms for the group a node is moved out of
 
-        global k
-        global E
+    def group_term(n, kappa, mrr):
+        if n == 0:
+            return 0.
+        return lnfact[n] + kappa * log(n) + lnfact[n - 1] - lnfact[kappa + n - 1] + lnfact[mrr // 2] - (mrr // 2 + 1) * log(0.5 * p * n * n + 1)
 
-        i, u, v = 0, 0, 0
-        r = 0
+    #// Log-probability function
 
-        #// Make the initial group assignments at random
+    def logp(k):
+        nk = n[:k]
+        mk = m[:k, :k]
+        upper = numpy.triu_indices(k, 1)
+        return group_terms(nk, kappa[:k], numpy.diagonal(mk)).sum() + pair_terms(mk[upper], numpy.outer(nk, nk)[upper]).sum()
 
-        g = numpy.empty(G['nvertices'], dtype=numpy.uint16)
-        for u in range(G['nvertices']):
-            g[u] = random.randrange(K0)
+    #// Initial group assignment: make the initial group assignments at random,
+    #// or continue from the given ones
 
-        #// Calculate the values of the n's
+    if STATE is not None:
+        g = numpy.array(STATE['g'], dtype=numpy.int64)                  #// Group assignments
+        k = STATE['k']                                                  #// Current value of k
+    else:
+        g = numpy.array([randrange(K0) for u in range(nvertices)], dtype=numpy.int64)
+        k = K0
 
-        n = numpy.zeros(K, dtype=numpy.uint16)
-        for u in range(G['nvertices']):
-            n[g[u]] += 1
+    #// Calculate the values of the n's
 
-        #// Calcalate the values of the m's
+    n = numpy.bincount(g, minlength=K).astype(numpy.int64)              #// Group sizes
 
-        m = numpy.zeros((K,K), dtype=numpy.uint16)
-        for u in range(G['nvertices']):
-            for i in range(G['vertex'][u]['degree']):
-                v = G['vertex'][u]['edge'][i]['target']
-                m[g[u]][g[v]] += 1
+    #// Calcalate the values of the m's
 
-        #// Initialize k and the log-probability
+    m = numpy.zeros((K, K), dtype=numpy.int64)                          #// Edge counts
+    ends = numpy.repeat(numpy.arange(nvertices), degree)
+    numpy.add.at(m, (g[ends], g[indices]), 1)
+    kappa = m.sum(axis=1)                                               #// Edge ends in each group
 
-        k = K0
-        E = logp(n, m)
+    #// Keep the group and pair terms of the current state, they only change
+    #// for the two groups involved in a move
 
-    #// Function to update value of k
+    A = group_terms(n, kappa, numpy.diagonal(m).copy())                 #// Group terms
+    B = pair_terms(m, numpy.outer(n, n))                                #// Pair terms
 
-    def changek():
-        global g
-        global n
-        global m
+    def termsupdate(groups, k):
+        A[groups] = group_terms(n[groups], kappa[groups], m[groups, groups])
+        B[groups, :k] = pair_terms(m[groups, :k], numpy.outer(n[groups], n[:k]))
+        B[:k, groups] = B[groups, :k].T
 
-        global k
+    #// Function to update value of k, returns the new k
 
-        r, s, u = 0, 0, 0
-        kp = 0
-        empty = 0
-        # map = numpy.empty(K)
-        sum = 0
+    def changek(k):
 
         #// With probability 0.5, decrease k, otherwise increase it
 
-        if random.random() < 0.5:
+        if uniform() < 0.5:
 
             #// Count the number of empty groups
 
-            for r in range(k):
-                if n[r] == 0:
-                    empty += 1
+            empty = numpy.count_nonzero(n[:k] == 0)
 
             #// If there are any empty groups, remove one of them, or otherwise do nothing
-            
+
             if empty > 0:
 
                 #// If there is more than one empty group, choose at random which one to remove
 
                 while True:
-                    r = random.randrange(k)
+                    r = randrange(k)
                     if not n[r] > 0: break
 
-
                 #// Decrease k by 1
 
                 k -= 1
 
                 #// Update the group labels
 
-                for u in range(G['nvertices']):
-                    if g[u] == k:
-                        g[u] = r
+                g[g == k] = r
 
-                #// Update n_r
+                #// Update n_r and kappa_r
 
                 n[r] = n[k]
+                kappa[r] = kappa[k]
+                A[r] = A[k]
 
                 #// Update m_rs
 
-                for s in range(k):
-                    if r == s:
-                        m[r][r] = m[k][k]
-                    else:
-                        m[r][s] = m[k][s]
-                        m[s][r] = m[s][k]
-        
+                for x in (m, B):
+                    x[r, :k] = x[k, :k]
+                    x[:k, r] = x[:k, k]
+                    x[r, r] = x[k, k]
+
         else:
 
             #// With probability k/(n+k) increase k by 1, adding an empty group
 
-            if (G['nvertices'] + k) * random.random() < k:
+            if (nvertices + k) * uniform() < k:
                 if k < K:
                     n[k] = 0
-                    for r in range(k + 1):
-                        m[k][r] = m[r][k] = 0
+                    kappa[k] = 0
+                    A[k] = 0.
+                    for x in (m, B):
+                        x[k, :k + 1] = 0
+                        x[:k + 1, k] = 0
                     k += 1
 
-    #// Function to update n and m for a proposed move
+        return k
 
-    def nmupdate(r, s, d):
-        global n
-        global m
-
-        t = 0
+    #// Function to update n and m for a move from r to s
 
+    def nmupdate(r, s, d, du, k):
         n[r] -= 1
         n[s] += 1
-        for t in range(k):
-            m[r][t] -= d[t]
-            m[t][r] -= d[t]
-            m[s][t] += d[t]
-            m[t][s] += d[t]
-
-    # Function that does one MCMC sweep (i.e., n individual moves) using the heatbath algorithm
+        kappa[r] -= du
+        kappa[s] += du
+        m[r, :k] -= d
+        m[:k, r] -= d
+        m[s, :k] += d
+        m[:k, s] += d
 
-    def sweep():
-        global g
+    #// Function that does one MCMC sweep (i.e., n individual moves) using the heatbath algorithm
 
-        global E
-
-        i, j, u, v = 0, 0, 0, 0
-        r, s = 0, 0
-        #temp = 0
+    def sweep(k):
         accept = 0
-        d = numpy.empty(K)
-        x, Z, sum = 0., 0., 0.
-        newE = numpy.empty(K)
-        boltzmann = numpy.empty(K)
 
-        for i in range(G['nvertices']):
+        for i in range(nvertices):
 
             #// Optionally, perform a k-changing move
 
-            if (G['nvertices'] + 1) * random.random() < 1.0:
-                changek()
+            if (nvertices + 1) * uniform() < 1.0:
+                k = changek(k)
 
             #// Choose a random node
 
-            u = random.randrange(G['nvertices'])
+            u = randrange(nvertices)
             r = g[u]
+            du = degree[u]
 
             #// Find the number of edges this node has to each group
 
-            for s in range(k):
-                d[s] = 0
-            for j in range(G['vertex'][u]['degree']):
-                v = G['vertex'][u]['edge'][j]['target']
-                d[g[v]] += 1
-            
-            #// Calculate the probabilities of moving it to each group in turn
-
-            Z = 0.
-            for s in range(k):
-                if s == r:
-                    newE[s] = E
-                else:
-                    nmupdate(r, s, d)
-                    newE[s] = logp(n, m)
-                    nmupdate(s, r, d)
-                boltzmann[s] = exp(newE[s] - E)
-                Z += boltzmann[s]
-            
-            #// Choose which move to make based on these probabilities
+            d = numpy.bincount(g[neighbours[u]], minlength=k)
 
-            x = Z * random.random()
-            sum = 0.
-            for s in range(k):
-                sum += boltzmann[s]
-                if sum > x:
-                    break
+            #// Calculate the change of the log-probability for moving it to
+            #// each group s in turn; only the terms of r and s change
 
-            #// Make the move
+            nk = n[:k]
+            mk = m[:k, :k]
+            mr = mk[r]
+            nr = nk[r]
+            Br = B[r, :k]
 
-            if s != r:
-                g[u] = s
-                nmupdate(r, s, d)
-                E = newE[s]
-                accept += 1
-        
-        return accept / G['nvertices']
+            #// Group r loses the node, group s gains it
 
-    #====================================================================
+            delta = group_terms(nk + 1, kappa[:k] + du, numpy.diagonal(mk) + 2 * d) - A[:k]
+            delta += group_term(nr - 1, kappa[r] - du, mr[r] - 2 * d[r]) - A[r]
 
-    #/* main() */
+            #// Pairs (r, t) and (s, t) for the other groups t
 
-    u, r, s = 0, 0, 0
+            row_r = pair_terms(mr - d, (nr - 1) * nk) - Br
+            row_s = pair_terms(mk + d, numpy.outer(nk + 1, nk)) - B[:k, :k]
+            delta += row_r.sum() - row_r[r] - row_r + row_s.sum(axis=1) - row_s[:, r] - numpy.diagonal(row_s)
 
-    #// Initialize the random number generator from the system clock
-    
-    random.seed(kwargs['seed'])
+            #// The pair (r, s) itself
 
-    #// Read the network from stdin
+            delta += pair_terms(mr - d + d[r], (nr - 1) * (nk + 1)) - Br
 
-    if VERBOSE:
-        print('Reading network...', end='\n', file=sys.stderr)
+            delta[r] = 0.
+            boltzmann = numpy.exp(delta)
 
-    G = graph
-    twom = 0
-    for u in range(G['nvertices']):
-        twom += G['vertex'][u]['degree']
-    p = twom / ( G['nvertices'] * G['nvertices'] )
+            #// Choose which move to make based on these probabilities
 
-    if VERBOSE:
-        print('Read network with {:d} nodes and {:d} edges'.format(G['nvertices'] , int(twom/2)), end='\n', file=sys.stderr)
+            total = numpy.cumsum(boltzmann)
+            x = total[-1] * uniform()
+            s = min(int(numpy.searchsorted(total, x, side='right')), k - 1)
 
-    #// Make the lookup table
+            #// Make the move
 
-    maketable()
+            if s != r:
+                g[u] = s
+                nmupdate(r, s, d, du, k)
+                termsupdate([r, s], k)
+                accept += 1
 
-    #// Initialize the group assignment
+        #// Evaluate the log-probability once per sweep, summing the changes
+        #// would accumulate rounding errors
 
-    initgroups()
+        return k, logp(k), accept / nvertices
 
     #// Perform the Monte Carlo
 
+    __k__ = [0] * MCSWEEPS
+    __E__ = [0.] * MCSWEEPS
+
     for s in range(MCSWEEPS):
 
-        sweep()
+        k, E, _ = sweep(k)
 
         __k__[s] = k
-        #__g__[s,:] = g
         __E__[s] = E
 
         if s % SAMPLE == 0:
-            #print('{:d} {:d} {:f}'.format(s, k, E), end='\n', file=sys.stdout)
             if VERBOSE:
                 print('Sweep {:d}...'.format(s), end='\r', file=sys.stderr)
 
     if VERBOSE:
         print('', end='\n', file=sys.stderr)
 
-    return list(__k__), list(__E__)
+    #// State at the end of the run, to continue it later
+
+    internalstate = rng.getstate()[1]
+    state = {
+        'g': g.tolist(),
+        'n': n[:k].tolist(),
+        'm': m[:k, :k].tolist(),
+        'k': k,
+        'rng': {'mt': list(internalstate[:-1]), 'mti': internalstate[-1]}
+    }
+
+    return __k__, __E__, state
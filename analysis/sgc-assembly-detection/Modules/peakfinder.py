@@ -80,6 +80,10 @@ def peakfinder(x0, sel=None, thresh=None, extrema=1, includeEndpoints=True, inte
 	
 	   Note: If repeated values are found the first is identified as the peak
 	
+	   The candidate extrema are found with array operations, only the
+	   selection among them runs sequentially; see PeakFinder to find the
+	   peaks of a long trace chunk by chunk.
+	
 	Example 1:
 	t = np.linspace(0,10,100000+1);
 	x = 12*np.sin(10*2*np.pi*t)-3*np.sin(.1*2*np.pi*t)+np.random.normal(size=len(t));
@@ -105,38 +109,34 @@ def peakfinder(x0, sel=None, thresh=None, extrema=1, includeEndpoints=True, inte
 	Original MATLAB implementation:
 	 Copyright Nathanael C. Yoder 2015 (nyoder@gmail.com)
 	"""
-	
-	# s = x0.shape
-	# if len(s) > 1:
-	# 	flipData = s[0] < s[1]
-	# else:
-	# 	flipData = False
+
 	len0 = len(x0);
 	if not x0.shape == (len0,):
 		raise ValueError('PEAKFINDER:Input : The input data must be a vector')
 	elif len0 == 0:
-		return [np.array([]), np.array([])];
+		return [np.array([], dtype=int), np.array([])];
 	
 	if not(np.all(np.isreal(x0))):
 		warnings.warn('PEAKFINDER:NotReal : Absolute value of data will be used')
 		x0 = np.abs(x0);
+	x0 = np.asarray(x0, dtype=float);
 	
 	if sel is None:
 		sel = (x0.max() - x0.min())/4;
 	elif not(isnumeric(sel)) or not(np.isreal(sel)):
 		sel = (x0.max() - x0.min())/4;
-		warning('PEAKFINDER:InvalidSel : The selectivity must be a real scalar.  A selectivity of {:.3f} will be used'.format(sel))
+		warnings.warn('PEAKFINDER:InvalidSel : The selectivity must be a real scalar.  A selectivity of {:.3f} will be used'.format(sel))
 	elif isinstance(sel, (list, np.ndarray)) and len(sel) > 1:
-		warning('PEAKFINDER:InvalidSel : The selectivity must be a scalar.  The first selectivity value in the vector will be used.')
+		warnings.warn('PEAKFINDER:InvalidSel : The selectivity must be a scalar.  The first selectivity value in the vector will be used.')
 		sel = sel[0];
 		
 	if thresh is None:
 		pass
 	elif not(isnumeric(thresh)) or not(np.isreal(thresh)):
 		thresh = None;
-		warning('PEAKFINDER:InvalidThreshold : The threshold must be a real scalar. No threshold will be used.')
+		warnings.warn('PEAKFINDER:InvalidThreshold : The threshold must be a real scalar. No threshold will be used.')
 	elif isinstance(thresh, (list, np.ndarray)) and len(thresh) > 1:
-		warning('PEAKFINDER:InvalidThreshold : The threshold must be a scalar.  The first threshold value in the vector will be used.')
+		warnings.warn('PEAKFINDER:InvalidThreshold : The threshold must be a scalar.  The first threshold value in the vector will be used.')
 		thresh = thresh[0];
 		
 	if extrema is None:
@@ -154,136 +154,33 @@ def peakfinder(x0, sel=None, thresh=None, extrema=1, includeEndpoints=True, inte
 		interpolate = False;
 		
 		
-		
-	x0 = extrema*x0; # Make it so we are finding maxima regardless
-	if thresh is not None:
-		thresh = thresh*extrema; # Adjust threshold according to extrema.
-	dx0 = np.diff(x0); # Find derivative
-	dx0[dx0 == 0] = -np.finfo(np.float32).eps; # This is so we find the first of repeated values
-	ind = np.where(dx0[:-1]*dx0[1:] < 0)[0]+1; # Find where the derivative changes sign
 	
-	# Include endpoints in potential peaks and valleys as desired
+	# The smallest of the extrema (and endpoints) the selection starts from
+	ind = _extrema(extrema*x0);
 	if includeEndpoints:
-		x = np.concatenate([np.array([x0[0]]),x0[ind],np.array([x0[-1]])]);
-		ind = np.concatenate([np.array([0]),ind,np.array([len0])]);
-		minMag = x.min();
-		leftMin = minMag;
+		minMag = min(extrema*x0[0], extrema*x0[-1], (extrema*x0[ind]).min(initial=np.inf));
+	elif len(ind) > 0:
+		minMag = (extrema*x0[ind]).min();
 	else:
-		x = x0[ind];
-		minMag = x.min();
-		leftMin = min([x[0], x0[0]]);
+		minMag = None;
 	
-	# x only has the peaks, valleys, and possibly endpoints
-	len_ = len(x);
-	
-	if len_ > 2: # Function with peaks and valleys
-		# Set initial parameters for loop
-		tempMag = minMag;
-		foundPeak = False;
-		
-		if includeEndpoints:
-			# Deal with first point a little differently since tacked it on
-			# Calculate the sign of the derivative since we tacked the first
-			#  point on it does not neccessarily alternate like the rest.
-			signDx = sign(np.diff(x[0:3]));
-			if signDx[0] <= 0: # The first point is larger or equal to the second
-				if signDx[0] == signDx[1]: # Want alternating signs
-					x = np.delete(x, 1);
-					ind = np.delete(ind, 1);
-					len_ = len_-1;
-			else: # First point is smaller than the second
-				if signDx[0] == signDx[1]: # Want alternating signs
-					x = np.delete(x, 0);
-					ind = np.delete(ind, 0);
-					len_ = len_-1;
-		
-		# Skip the first point if it is smaller so we always start on a
-		#   maxima
-		if x[0] >= x[1]:
-			ii = -1;
-		else:
-			ii = 0;
-		
-		# Preallocate max number of maxima
-		maxPeaks = math.ceil(len_/2);
-		peakLoc = np.zeros(maxPeaks, dtype=int);
-		peakMag = np.zeros(maxPeaks, dtype=float);
-		cInd = 0;
-		# Loop through extrema which should be peaks and then valleys
-		while ii < len_-1:
-			ii = ii+1; # This is a peak
-			# Reset peak finding if we had a peak and the next peak is bigger
-			#   than the last or the left min was small enough to reset.
-			if foundPeak:
-				tempMag = minMag;
-				foundPeak = False;
-			
-			# Found new peak that was lager than temp mag and selectivity larger
-			#   than the minimum to its left.
-			if x[ii] > tempMag and x[ii] > leftMin + sel:
-				tempLoc = ii;
-				tempMag = x[ii];
-			
-			# Make sure we don't iterate past the length of our vector
-			if ii == len_-1:
-				break; # We assign the last point differently out of the loop
-			
-			ii = ii+1; # Move onto the valley
-			# Come down at least sel from peak
-			if not(foundPeak) and tempMag > sel + x[ii]:
-				foundPeak = True; # We have found a peak
-				leftMin = x[ii];
-				peakLoc[cInd] = tempLoc; # Add peak to index
-				peakMag[cInd] = tempMag;
-				cInd = cInd+1;
-			elif x[ii] < leftMin: # New left minima
-				leftMin = x[ii];
-		
-		# Check end point
-		if includeEndpoints:
-			if x[-1] > tempMag and x[-1] > leftMin + sel:
-				peakLoc[cInd] = len_;
-				peakMag[cInd] = x[-1];
-				cInd = cInd + 1;
-			elif not(foundPeak) and tempMag > minMag: # Check if we still need to add the last point
-				peakLoc[cInd] = tempLoc;
-				peakMag[cInd] = tempMag;
-				cInd = cInd + 1;
-		elif not(foundPeak):
-			if x[-1] > tempMag and x[-1] > leftMin + sel:
-				peakLoc[cInd] = len_;
-				peakMag[cInd] = x[-1];
-				cInd = cInd + 1;
-			elif tempMag > min([x0[-1], x[-1]]) + sel:
-				peakLoc[cInd] = tempLoc;
-				peakMag[cInd] = tempMag;
-				cInd = cInd + 1;
-		
-		# Create output
-		if cInd > 0:
-			peakInds = ind[peakLoc[:cInd]];
-			peakMags = peakMag[:cInd];
-		else:
-			peakInds = np.array([]);
-			peakMags = np.array([]);
-	else: # This is a monotone function where an endpoint is the only peak
-		peakMags, xInd = np.max(x), np.argmax(x);
-		if includeEndpoints and peakMags > minMag + sel:
-			peakInds = ind[xInd];
-		else:
-			peakMags = np.array([]);
-			peakInds = np.array([]);
+	if minMag is not None:
+		finder = PeakFinder(sel, thresh, extrema, includeEndpoints, minimum=extrema*minMag);
+		peakInds, peakMags = finder.update(x0);
+		peakInds_, peakMags_ = finder.finish();
+		peakInds = np.concatenate([peakInds, peakInds_]);
+		peakMags = np.concatenate([peakMags, peakMags_]);
+	else:
+		peakInds = np.array([], dtype=int);
+		peakMags = np.array([]);
 	
-	# Apply threshold value.  Since always finding maxima it will always be
-	#   larger than the thresh.
-	if thresh is not None:
-		m = peakMags>thresh;
-		peakInds = peakInds[m];
-		peakMags = peakMags[m];
+	x0 = extrema*x0; # Make it so we are finding maxima regardless
+	peakMags = extrema*peakMags;
 	
 	if interpolate and len(peakMags) > 0:
-		middleMask = np.logical_and(peakInds > 1, peakInds < len0);
-		noEnds = peakInds[middleMask];
+		peakInds = peakInds.astype(float);
+		middleMask = np.logical_and(peakInds > 0, peakInds < len0 - 1);
+		noEnds = peakInds[middleMask].astype(int);
 		
 		magDiff = x0[noEnds + 1] - x0[noEnds - 1];
 		magSum = x0[noEnds - 1] + x0[noEnds + 1]  - 2 * x0[noEnds];
@@ -292,11 +189,6 @@ def peakfinder(x0, sel=None, thresh=None, extrema=1, includeEndpoints=True, inte
 		peakInds[middleMask] = peakInds[middleMask] - magRatio/2;
 		peakMags[middleMask] = peakMags[middleMask] - magRatio * magDiff/8;
 	
-	# Rotate data if needed
-	# if flipData:
-	# 	peakMags = peakMags.T;
-	# 	peakInds = peakInds.T;
-	
 	# Change sign of data if was finding minima
 	if extrema < 0:
 		peakMags = -peakMags;
@@ -315,3 +207,270 @@ def peakfinder(x0, sel=None, thresh=None, extrema=1, includeEndpoints=True, inte
 		pass
 	
 	return peakInds, peakMags;
+
+
+def _extrema(x0):
+	"""
+	Indices at which the derivative of x0 changes its sign, i.e. its local
+	maxima and minima apart from the endpoints.
+	"""
+	
+	dx0 = np.diff(x0); # Find derivative
+	dx0[dx0 == 0] = -np.finfo(np.float32).eps; # This is so we find the first of repeated values
+	return np.where(dx0[:-1]*dx0[1:] < 0)[0]+1; # Find where the derivative changes sign
+
+
+class PeakFinder(object):
+	"""
+	PEAKFINDER(sel, thresh=None, extrema=1, includeEndpoints=True,
+	minimum=None) Finds the peaks of a trace that is given chunk by chunk,
+	e.g. the coactivity of a recording that is too long to keep in memory.
+	
+	   update(x) takes the next chunk and returns the indices (within the
+	   whole trace) and magnitudes of the peaks that are certain after it;
+	   finish() returns the remaining ones once the trace has ended. Together
+	   they give the same peaks as peakfinder(x0, sel, thresh, extrema,
+	   includeEndpoints) for the whole trace x0.
+	
+	   peakfinder measures the first peak and the end of the trace against
+	   the smallest (largest for minima) of the extrema and endpoints of the
+	   whole trace. Unless that minimum is given, the smallest value so far
+	   is carried across the chunks: the first peak is only taken once it is
+	   certain for any smaller minimum still to come, and the end of the
+	   trace is checked in finish(), when the minimum is known. This holds
+	   for a selectivity sel >= 0; with a negative sel the minimum has to be
+	   given for the peaks to be the same.
+	
+	Example:
+	finder = PeakFinder(0.05, 0.2);
+	peaks = [finder.update(x[i:i+10000])[0] for i in range(0, len(x), 10000)];
+	peaks = np.concatenate(peaks + [finder.finish()[0]]);
+	"""
+	
+	def __init__(self, sel, thresh=None, extrema=1, includeEndpoints=True, minimum=None):
+		
+		if extrema == 0:
+			raise ValueError('PEAKFINDER:ZeroMaxima : Either 1 (for maxima) or -1 (for minima) must be input for extrema')
+		
+		self.sel = sel;
+		self.extrema = sign(extrema);
+		self.thresh = None if thresh is None else thresh*self.extrema; # Adjust threshold according to extrema.
+		self.includeEndpoints = bool(includeEndpoints);
+		self.minMag = None if minimum is None else minimum*self.extrema;
+		self.fixedMin = minimum is not None; # Otherwise the smallest extremum so far
+		
+		self.length = 0; # Number of samples so far
+		self.first = None; # First sample
+		self.last = None; # Last sample
+		self.lastDx = None; # Derivative before the last sample
+		
+		# The first three extrema are held back to decide how to start
+		self.x = [];
+		self.ind = [];
+		self.started = False;
+		self.finished = False;
+		
+		# State of the selection
+		self.isPeak = True; # Whether the next extremum is a peak or a valley
+		self.tempMag = None; # None stands for minMag, which may still change
+		self.tempLoc = None;
+		self.leftMin = None; # None stands for minMag until the first peak
+		self.foundPeak = False;
+		self.lastMag = None; # Last extremum
+		self.lastLoc = None;
+		
+		self.peakLoc = [];
+		self.peakMag = [];
+	
+	def update(self, x0):
+		
+		if self.finished:
+			raise RuntimeError('PEAKFINDER:Finished : No data can be added after finish()')
+		
+		x0 = self.extrema*np.asarray(x0, dtype=float).ravel(); # Make it so we are finding maxima regardless
+		if len(x0) == 0:
+			return self.__output();
+		
+		# Find where the derivative changes sign, continuing the previous
+		# chunk: its last sample is only now known to be an extremum or not
+		if self.last is None:
+			self.first = x0[0];
+			if self.includeEndpoints:
+				self.x.append(x0[0]);
+				self.ind.append(0);
+			xx = x0;
+		else:
+			xx = np.concatenate([[self.last], x0]);
+		offset = self.length - len(xx) + len(x0);
+		
+		dx = np.diff(xx);
+		dx[dx == 0] = -np.finfo(np.float32).eps;
+		if self.lastDx is None:
+			k = np.where(dx[:-1]*dx[1:] < 0)[0]+1;
+		else:
+			d = np.concatenate([[self.lastDx], dx]);
+			k = np.where(d[:-1]*d[1:] < 0)[0];
+		
+		if len(dx) > 0:
+			self.lastDx = dx[-1];
+		self.last = x0[-1];
+		self.length += len(x0);
+		
+		# Smallest of the extrema (and endpoints) so far
+		if not self.fixedMin:
+			candidates = xx[k].tolist();
+			if self.includeEndpoints and offset == 0:
+				candidates.append(x0[0]);
+			if self.minMag is not None:
+				candidates.append(self.minMag);
+			if len(candidates) > 0:
+				self.minMag = min(candidates);
+		
+		self.__select(xx[k].tolist(), (k + offset).tolist());
+		
+		return self.__output();
+	
+	def finish(self):
+		
+		if self.finished or self.last is None:
+			self.finished = True;
+			return self.__output();
+		self.finished = True;
+		
+		if self.includeEndpoints:
+			if not self.fixedMin:
+				self.minMag = min(self.last, self.minMag);
+			self.__select([self.last], [self.length - 1]);
+		
+		if not self.started:
+			if len(self.x) > 2:
+				self.__start();
+			else: # This is a monotone function where an endpoint is the only peak
+				if self.includeEndpoints and len(self.x) > 0 and self.minMag is not None:
+					xInd = int(np.argmax(self.x));
+					if self.x[xInd] > self.minMag + self.sel:
+						self.__peak(self.ind[xInd], self.x[xInd]);
+				return self.__output();
+		
+		# The minimum is known now, resolve what was left open
+		if self.leftMin is None: # No peak so far, only those sel above the minimum count
+			self.leftMin = self.minMag;
+			if self.tempMag is not None and not self.tempMag > self.minMag + self.sel:
+				self.tempLoc, self.tempMag = None, None;
+		tempMag = self.minMag if self.tempMag is None else self.tempMag;
+		
+		# Check end point
+		if self.includeEndpoints:
+			if self.lastMag > tempMag and self.lastMag > self.leftMin + self.sel:
+				self.__peak(self.lastLoc, self.lastMag);
+			elif not(self.foundPeak) and tempMag > self.minMag: # Check if we still need to add the last point
+				self.__peak(self.tempLoc, tempMag);
+		elif not(self.foundPeak):
+			if self.lastMag > tempMag and self.lastMag > self.leftMin + self.sel:
+				self.__peak(self.lastLoc, self.lastMag);
+			elif tempMag > min([self.last, self.lastMag]) + self.sel and self.tempLoc is not None:
+				self.__peak(self.tempLoc, tempMag);
+		
+		return self.__output();
+	
+	def __output(self):
+		
+		peakLoc = np.array(self.peakLoc, dtype=int);
+		peakMag = self.extrema*np.array(self.peakMag, dtype=float);
+		self.peakLoc = [];
+		self.peakMag = [];
+		return peakLoc, peakMag
+	
+	def __peak(self, loc, mag):
+		
+		# Apply threshold value.  Since always finding maxima it will always be
+		#   larger than the thresh.
+		if self.thresh is None or mag > self.thresh:
+			self.peakLoc.append(loc);
+			self.peakMag.append(mag);
+	
+	def __start(self):
+		
+		x, ind = self.x, self.ind;
+		
+		if self.includeEndpoints:
+			# Deal with first point a little differently since tacked it on
+			# Calculate the sign of the derivative since we tacked the first
+			#  point on it does not neccessarily alternate like the rest.
+			signDx = [sign(x[1] - x[0]), sign(x[2] - x[1])];
+			if signDx[0] <= 0: # The first point is larger or equal to the second
+				if signDx[0] == signDx[1]: # Want alternating signs
+					del x[1], ind[1];
+			else: # First point is smaller than the second
+				if signDx[0] == signDx[1]: # Want alternating signs
+					del x[0], ind[0];
+			# Until the first peak the minimum to its left is the minimum of
+			# the whole trace, which is not known yet
+			self.leftMin = None if self.sel >= 0 else self.minMag;
+		else:
+			self.leftMin = min([x[0], self.first]);
+		
+		self.tempMag = None;
+		self.started = True;
+		
+		# Skip the first point if it is smaller so we always start on a
+		#   maxima
+		if x[0] >= x[1]:
+			self.__select(x, ind);
+		else:
+			self.__select(x[1:], ind[1:]);
+		
+		self.x, self.ind = None, None;
+	
+	def __select(self, x, ind):
+		
+		if not self.started:
+			self.x.extend(x);
+			self.ind.extend(ind);
+			if len(self.x) > 2 and not self.finished:
+				self.__start();
+			return;
+		
+		if len(x) == 0:
+			return;
+		
+		sel = self.sel;
+		minMag = self.minMag;
+		isPeak = self.isPeak;
+		tempMag, tempLoc, leftMin, foundPeak = self.tempMag, self.tempLoc, self.leftMin, self.foundPeak;
+		
+		# Loop through extrema which should be peaks and then valleys. A
+		#   tempMag of None stands for minMag. Before the first peak (leftMin
+		#   None) the largest peak is kept: it comes down sel to a valley,
+		#   which is never below the minimum, only if it is also sel above
+		#   the minimum, whatever the minimum turns out to be.
+		for xi, ii in zip(x, ind):
+			if isPeak:
+				# Reset peak finding if we had a peak and the next peak is bigger
+				#   than the last or the left min was small enough to reset.
+				if foundPeak:
+					tempMag = None;
+					foundPeak = False;
+				
+				# Found new peak that was lager than temp mag and selectivity larger
+				#   than the minimum to its left.
+				if leftMin is None:
+					if tempMag is None or xi > tempMag:
+						tempLoc = ii;
+						tempMag = xi;
+				elif xi > (minMag if tempMag is None else tempMag) and xi > leftMin + sel:
+					tempLoc = ii;
+					tempMag = xi;
+			else:
+				# Come down at least sel from peak
+				if not(foundPeak) and (minMag if tempMag is None else tempMag) > sel + xi:
+					foundPeak = True; # We have found a peak
+					leftMin = xi;
+					self.__peak(tempLoc, minMag if tempMag is None else tempMag); # Add peak to index
+				elif leftMin is not None and xi < leftMin: # New left minima
+					leftMin = xi;
+			isPeak = not isPeak;
+		
+		self.isPeak = isPeak;
+		self.tempMag, self.tempLoc, self.leftMin, self.foundPeak = tempMag, tempLoc, leftMin, foundPeak;
+		self.lastMag, self.lastLoc = x[-1], ind[-1];
@@ -9,26 +9,42 @@ __all__ = [
     'save_SGC_ASSEMBLIES_mat',
     'calcium_fluorescence_preprocessing',
     'assembly_detection',
+    'calcium_fluorescence_preprocessing_array',
+    'activity_raster_preprocessing_array',
+    'assembly_detection_array',
+    'batch_processing',
 ]
 
 
 import os
 import sys
+import glob
 
 import time
 
 import math
 import random
+import copy
+import csv
+import json
+import hashlib
+import traceback
+import multiprocessing
+import concurrent.futures
 
 import numpy as np
 import scipy.io
+import scipy.sparse
+import scipy.sparse.linalg
+import scipy.stats
 
 import networkx as nx
 
 import sklearn.cluster
+import threadpoolctl
 
 from Modules.peakfinder import peakfinder
-from Modules.estimate import estimate
+from Modules.estimate import estimate, graph2CSR
 
 
 SCRIPT_END_INDICATOR = False
@@ -41,14 +57,26 @@ PREPROCESSING_PARAMETERS = {
     'standard_deviations_threshold': 2,
     'shuffling_rounds': 1000,
     'coactivity_significance_level': 0.05,
+    'shuffling_seed': None,
+    'shuffling_processes': None,
 }
 
 DETECTION_PARAMETERS = {
     'montecarlo_rounds': 5,
     'montecarlo_steps': 50000,
+    'montecarlo_seed': None,
+    'montecarlo_processes': None,
+    'montecarlo_continue': False,
+    'montecarlo_tolerance': 0.05,
+    'montecarlo_check_interval': 2000,
+    'clustering_replicates': 100,
+    'clustering_threads': None,
     'affinity_threshold': 0.2,
 }
 
+BATCH_SUMMARY_FILE = 'SGC-BATCH.tsv'
+BATCH_SUMMARY_FIELDS = ['file', 'step', 'status', 'runtime', 'input_sha256', 'parameters_sha256', 'output_file', 'output_sha256', 'activity_patterns', 'assemblies']
+
 
 class runtimer(object):
     
@@ -232,58 +260,196 @@ def findSignificantDF_FCoactivity(dF_F):
 
     ## FIND SIGNIFICANT PEAKS IN THE THE COACTIVITY
 
+    sig_dF_F_coactivity_threshold, sig_dF_F_coactivity_peaks = findSignificantActivityRasterCoactivity(sig_dF_F_activity);
+
+    ## END
+
+    return sig_dF_F_activity, sig_dF_F_coactivity_threshold, sig_dF_F_coactivity_peaks
+
+def findSignificantActivityRasterCoactivity(activity_raster):
+    """
+    FINDSIGNIFICANTACTIVITYRASTERCOACTIVITY(activity_raster)
+
+       PARAMETERS:
+       activity_raster [TxN ndarray]: binary activity for N units in T time
+       steps
+
+    """
+
+    CONST = {}
+
     CONST['SHUFFLE_ROUNDS'] = PREPROCESSING_PARAMETERS['shuffling_rounds']; #= 1000;
     # \_ CONST['SHUFFLE_ROUNDS']: rounds of shuffling for coactivity null model
     CONST['SIGNIFICANCE_P'] = PREPROCESSING_PARAMETERS['coactivity_significance_level']; #= 0.05;
     # \_ CONST['SIGNIFICANCE_P']: significance level for the dF/F-coactivity
 
-    sig_dF_F_coactivity_threshold, _ = findSignificantCoactivity(sig_dF_F_activity, **{'shuffle_rounds': CONST['SHUFFLE_ROUNDS'], 'significance_p': CONST['SIGNIFICANCE_P']});
+    sig_dF_F_coactivity_threshold, _ = findSignificantCoactivity(activity_raster, **{'shuffle_rounds': CONST['SHUFFLE_ROUNDS'], 'significance_p': CONST['SIGNIFICANCE_P'], 'seed': PREPROCESSING_PARAMETERS['shuffling_seed'], 'processes': PREPROCESSING_PARAMETERS['shuffling_processes']});
     # \_ sig_dF_F_coactivity_threshold: significance threshold for the
     # dF/F-coactivity
 
-    normalised_sig_dF_F_coactivity = sig_dF_F_activity.sum(axis=1) / sig_dF_F_activity.sum(axis=1).max();
-    normalised_sig_dF_F_coactivity_threshold = sig_dF_F_coactivity_threshold / sig_dF_F_activity.sum(axis=1).max();
+    normalised_sig_dF_F_coactivity = activity_raster.sum(axis=1) / activity_raster.sum(axis=1).max();
+    normalised_sig_dF_F_coactivity_threshold = sig_dF_F_coactivity_threshold / activity_raster.sum(axis=1).max();
     # \_ normalised_sig_dF_F_coactivity: normalised dF/F-coactivity
     # \_ normalised_sig_dF_F_coactivity_threshold: normalised significance
     # threshold for the normalised dF/F-coactivity
 
     sig_dF_F_coactivity_peaks, _ = peakfinder(normalised_sig_dF_F_coactivity, 0.05, normalised_sig_dF_F_coactivity_threshold, 1, True, False);
+    sig_dF_F_coactivity_peaks = np.asarray(sig_dF_F_coactivity_peaks).astype('int');
     # \_ sig_dF_F_coactivity_peaks: peak times of the
     # dF/F-coactivity
 
-    ## END
-
-    return sig_dF_F_activity, sig_dF_F_coactivity_threshold, sig_dF_F_coactivity_peaks
+    return sig_dF_F_coactivity_threshold, sig_dF_F_coactivity_peaks
 
-def findSignificantCoactivity(X, shuffle_rounds, significance_p=0.05):
+def findSignificantCoactivity(X, shuffle_rounds, significance_p=0.05, seed=None, processes=None):
     """
-    FINDSIGNIFICANTCOACTIVITY(X, shuffle_rounds, significance_p=0.05)
+    FINDSIGNIFICANTCOACTIVITY(X, shuffle_rounds, significance_p=0.05,
+    seed=None, processes=None)
+
+       INPUT:
+       X [TxN ndarray]: binary activity for N units in T time steps
+       shuffle_rounds [int]: number of shufflings of the activity
+       significance_p [float]: (optional) significance level
+       seed [int]: (optional) seed of the shufflings
+       processes [int]: (optional) number of processes to run the shufflings
+       in; one per batch of rounds up to the number of CPUs if not given
+
+       OUTPUT:
+       sig_coactivity [float]: significant coactivity threshold
+       shuff_coactivity [ndarray]: number of time steps with a coactivity of
+       0, 1, 2, ... units over all shuffling rounds
 
     """
 
-    T, _ = X.shape;
+    T, N = X.shape;
     
-    def shuffle(A, axis):
-        _A = A.copy()
-        np.apply_along_axis(np.random.shuffle, axis=axis, arr=_A)
-        return _A
-    # \_ shuffle(X, d): shuffle X along its d-th dimension, i.e. every slice
-    # of X along its d-th dimension is shuffled independently
-    # in particular, np.allclose(shuffle(X, d).sum(axis=d), X.sum(axis=d)) holds
-    # true
+    # Every unit is shuffled independently along the time axis, so in
+    # particular its number of active time steps is unchanged. Only the
+    # histogram of the shuffled coactivity is needed for the threshold, the
+    # coactivity of the single time steps is never stored
     
-    shuff_coactivity = np.zeros((shuffle_rounds, T));
-    # \_ shuff_coactivity [opts.shuffle_rounds x T matrix]:
+    SHUFFLE_BATCH = 100;
+    seeds = np.random.SeedSequence(seed).spawn(math.ceil(shuffle_rounds / SHUFFLE_BATCH));
+    batches = [(min(SHUFFLE_BATCH, shuffle_rounds - SHUFFLE_BATCH * b), seeds[b]) for b in range(len(seeds))];
     
-    for s in range(shuffle_rounds):
-        shuff_coactivity[s,:] = shuffle(X, 0).sum(axis=1);
+    binary = np.all((X == 0) | (X == 1));
+    if binary:
+        arguments = [(X.sum(axis=0).astype('int'), T, rounds, seed_sequence) for rounds, seed_sequence in batches];
+        batch_function = shuffledActivityCoactivityHistogram;
+    else:
+        arguments = [(X, rounds, seed_sequence) for rounds, seed_sequence in batches];
+        batch_function = shuffledCoactivity;
+    
+    if processes is None:
+        processes = min(len(batches), os.cpu_count() or 1);
+    
+    if processes > 1 and len(batches) > 1:
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn');
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            results = list(executor.map(batch_function, *zip(*arguments)));
+    else:
+        results = [batch_function(*_) for _ in arguments];
     
-    sig_coactivity = np.percentile(shuff_coactivity.flatten(), q=(1 - significance_p) * 100);
+    if binary:
+        shuff_coactivity = np.sum(results, axis=0);
+        sig_coactivity = histogramPercentile(shuff_coactivity, q=(1 - significance_p) * 100);
+    else:
+        shuff_coactivity = np.concatenate(results, axis=0);
+        sig_coactivity = np.percentile(shuff_coactivity.flatten(), q=(1 - significance_p) * 100);
     # \_ sig_coactivity: significant coactivity threshold estimated as the
     # (1-opts.significance_p)-percentile from shuffled coactiviy levels
     
     return sig_coactivity, shuff_coactivity
 
+def shuffledActivityCoactivityHistogram(activity_counts, T, shuffle_rounds, seed=None):
+    """
+    SHUFFLEDACTIVITYCOACTIVITYHISTOGRAM(activity_counts, T, shuffle_rounds,
+    seed=None) Returns the histogram of the coactivity of a binary activity
+    raster over shuffle_rounds independent shufflings of every unit.
+
+       Shuffling a unit with a active time steps makes these a random subset
+       of the T time steps. Given the histogram of the coactivity of the
+       units added so far, all time steps with the same coactivity are
+       equivalent, so the number of the a time steps that fall on each
+       coactivity level follows a multivariate hypergeometric distribution.
+       Adding the units one by one this way gives the same distribution as
+       shuffling the whole raster, in N draws per level instead of T x N.
+
+       INPUT:
+       activity_counts [N ndarray]: number of active time steps of N units
+       T [int]: number of time steps
+       shuffle_rounds [int]: number of shufflings
+       seed [int/SeedSequence]: (optional) seed
+
+       OUTPUT:
+       output_args [ndarray]: number of time steps with a coactivity of 0, 1,
+       2, ... units over all shuffling rounds
+
+    """
+
+    rng = np.random.default_rng(seed);
+    
+    H = np.zeros((shuffle_rounds, len(activity_counts) + 1), dtype='int64');
+    H[:,0] = T;
+    # \_ H: histogram of the coactivity in every shuffling round
+    
+    lo, hi = 0, 1;
+    # \_ lo, hi: range of the occupied coactivity levels
+    
+    for a in activity_counts:
+        if a == 0:
+            continue;
+        
+        sample = np.full(shuffle_rounds, a, dtype='int64');
+        rest = np.full(shuffle_rounds, T, dtype='int64');
+        draws = np.zeros((shuffle_rounds, hi - lo), dtype='int64');
+        for c in range(hi - lo):
+            level = H[:,lo+c];
+            draws[:,c] = rng.hypergeometric(level, rest - level, sample);
+            sample -= draws[:,c];
+            rest -= level;
+            if not sample.any():
+                break;
+        
+        H[:,lo:hi] -= draws;
+        H[:,lo+1:hi+1] += draws;
+        hi += 1;
+        while not H[:,lo].any():
+            lo += 1;
+    
+    return H.sum(axis=0)
+
+def shuffledCoactivity(X, shuffle_rounds, seed=None):
+    """
+    SHUFFLEDCOACTIVITY(X, shuffle_rounds, seed=None) Returns the coactivity
+    of shuffle_rounds independent shufflings of every unit of X along its
+    time axis, for activity that is not binary.
+
+    """
+
+    rng = np.random.default_rng(seed);
+    
+    OUT = np.zeros((shuffle_rounds, X.shape[0]));
+    for s in range(shuffle_rounds):
+        OUT[s,:] = rng.permuted(X, axis=0).sum(axis=1);
+    
+    return OUT
+
+def histogramPercentile(histogram, q):
+    """
+    HISTOGRAMPERCENTILE(histogram, q) Returns the q-th percentile of the
+    values 0, 1, 2, ... occurring histogram[0], histogram[1], ... times; the
+    same as np.percentile of all these values (with linear interpolation).
+
+    """
+
+    cumulative = np.cumsum(histogram);
+    position = q / 100 * (cumulative[-1] - 1);
+    
+    lower = np.searchsorted(cumulative, math.floor(position), side='right');
+    upper = np.searchsorted(cumulative, math.ceil(position), side='right');
+    
+    return lower + (position - math.floor(position)) * (upper - lower)
+
 def findAssemblyPatterns(activityPatterns):
     """
     FINDASSEMBLYPATTERNS(activityPatterns)
@@ -319,7 +485,7 @@ def findAssemblyPatterns(activityPatterns):
     N_ITERATIONS = DETECTION_PARAMETERS['montecarlo_rounds'];# = 5;
     N_MONTECARLOSTEPS = DETECTION_PARAMETERS['montecarlo_steps'];# = 50000;
         
-    patternSimilarityAnalysis = analyseGraphCommunityStructure(patternSimilarityGraph, {'Iterations': N_ITERATIONS, 'MonteCarloSteps': N_MONTECARLOSTEPS, 'initialK': None});
+    patternSimilarityAnalysis = analyseGraphCommunityStructure(patternSimilarityGraph, {'Iterations': N_ITERATIONS, 'MonteCarloSteps': N_MONTECARLOSTEPS, 'initialK': None, 'RNGSeed': DETECTION_PARAMETERS['montecarlo_seed'], 'Processes': DETECTION_PARAMETERS['montecarlo_processes'], 'Tolerance': DETECTION_PARAMETERS['montecarlo_tolerance'], 'CheckInterval': DETECTION_PARAMETERS['montecarlo_check_interval']});
     OUT['patternSimilarityAnalysis'] = patternSimilarityAnalysis;
     
     
@@ -351,21 +517,38 @@ def inferAssemblyPatterns(activityPatterns, patternSimilarityAnalysis):
 
     ACTIVITY_THRESHOLD = DETECTION_PARAMETERS['affinity_threshold'];
 
+    X = np.asarray(activityPatterns, dtype='float');
+    X_norm = np.sqrt(np.einsum('ij,ij->i', X, X));
+    # \_ X: all activity patterns in a single matrix, one pattern per row
+
     def discriminateSize():
 
-        minSize = max(0, (lambda h : h.mean() - STD_DEVIATIONS * h.std(ddof=1))(np.array([(gAssignment == _).sum() for _ in np.unique(gAssignment) if not np.isnan(_)])));
+        labels, sizes = np.unique(gAssignment[~np.isnan(gAssignment)], return_counts=True);
+        
+        minSize = max(0, (lambda h : h.mean() - STD_DEVIATIONS * h.std(ddof=1))(sizes));
         minSize = max(MINIMUM_SIZE, minSize);
     
-        for r_ in [_ for _ in np.unique(gAssignment) if not np.isnan(_)]:
-            if (gAssignment == r_).sum() < minSize:
-                gAssignment[gAssignment == r_] = np.nan;
+        gAssignment[np.isin(gAssignment, labels[sizes < minSize])] = np.nan;
 
+    def groupMeanPatterns(R):
+        
+        # Sums of the activity patterns of every group 0, ..., R-1 as one
+        # product with the sparse group membership matrix
+        i = np.where((gAssignment >= 0) & (gAssignment < R))[0];
+        M = scipy.sparse.csr_array((np.ones(len(i)), (gAssignment[i].astype('int'), i)), shape=(R, len(gAssignment)));
+        
+        counts = np.bincount(gAssignment[i].astype('int'), minlength=R);
+        with np.errstate(divide='ignore', invalid='ignore'):
+            OUT = (M @ X) / counts[:,None];
+        OUT = OUT * (OUT > ACTIVITY_THRESHOLD);
+        OUT[counts == 0,:] = 0;
+        
+        return OUT, counts
 
-    cosineDistance = lambda x_1, x_2 : ( 1 - np.dot(x_1, x_2) / (np.linalg.norm(x_1) * np.linalg.norm(x_2)) );
 
     ## PERFORM SPECTRAL CLUSTERING ON THE SIMILARITY GRAPH
 
-    gAssignment = spectralclustering(nx.from_numpy_array(patternSimilarityAnalysis['graph']), [patternSimilarityAnalysis['communityStructure']['count']], 'normalised')[0];
+    gAssignment = spectralclustering(scipy.sparse.csr_array(patternSimilarityAnalysis['graph']), [patternSimilarityAnalysis['communityStructure']['count']], 'normalised', {'Replicates': DETECTION_PARAMETERS['clustering_replicates'], 'Threads': DETECTION_PARAMETERS['clustering_threads'], 'RNGSeed': DETECTION_PARAMETERS['montecarlo_seed']})[0];
 
     ## DISREGARD COMMUNITIES CONSISTING OF TOO FEW ACTIVITY PATTERNS
 
@@ -373,52 +556,51 @@ def inferAssemblyPatterns(activityPatterns, patternSimilarityAnalysis):
 
     ## DEFINE PRELIMINARY CORE ASSEMBLY PATTERNS
 
-    prelimAssemblyPatterns = [None] * (int(np.nanmax(gAssignment)) + 1);
-
-    for r in range(len(prelimAssemblyPatterns)):
-        if np.any(gAssignment == r):
-            prelimAssemblyPatterns[r] = meanActivityPattern(list(np.array(activityPatterns)[gAssignment == r,:]), ACTIVITY_THRESHOLD);
-            prelimAssemblyPatterns[r] = (prelimAssemblyPatterns[r] != 0).astype('float');
-        else:
-            prelimAssemblyPatterns[r] = np.zeros(len(activityPatterns[0]));
+    prelimAssemblyPatterns = (groupMeanPatterns(int(np.nanmax(gAssignment)) + 1)[0] != 0).astype('float');
 
     ## COMBINE SIMILAR PRELIMINARY CORE ASSEMBLY PATTERNS
 
     p = 2/3;
 
-    prelimAssemblyPatternsSimilarity = cross_evaluation( lambda x, y: ( min( np.dot(x,y) / np.linalg.norm(y)**2 , np.dot(y,x) / np.linalg.norm(x)**2 ) > p ), prelimAssemblyPatterns).astype('bool');
+    overlap = prelimAssemblyPatterns @ prelimAssemblyPatterns.T;
+    squaredNorm = np.sqrt(np.diagonal(overlap))**2;
+    with np.errstate(divide='ignore', invalid='ignore'):
+        prelimAssemblyPatternsSimilarity = np.minimum(overlap / squaredNorm[None,:], overlap / squaredNorm[:,None]) > p;
 
     R, S = np.where(np.triu(prelimAssemblyPatternsSimilarity, 1))
     
-    for i in range(np.triu(prelimAssemblyPatternsSimilarity, 1).sum()):
-        gAssignment[gAssignment == S[i]] = R[i];
+    # The reassignments are applied to the labels of the groups, and only
+    # once to the patterns
+    relabel = np.arange(len(prelimAssemblyPatterns), dtype='float');
+    for i in range(len(R)):
+        relabel[relabel == S[i]] = R[i];
         
         # CHANGE THE REASSIGNMENT RECURSIVELY
         R[i + np.where(R[(i+1):] == S[i])[0]] = R[i];
     
+    assigned = ~np.isnan(gAssignment);
+    gAssignment[assigned] = relabel[gAssignment[assigned].astype('int')];
+    
     # RE-DEFINE PRELIMINARY CORE ASSEMBLY PATTERNS FROM THE CHANGED GROUP ASSIGNMENT
 
-    for r in range(len(prelimAssemblyPatterns)):
-        if np.any(gAssignment == r):
-            prelimAssemblyPatterns[r] = meanActivityPattern(list(np.array(activityPatterns)[gAssignment == r,:]), ACTIVITY_THRESHOLD);
-            prelimAssemblyPatterns[r] = (prelimAssemblyPatterns[r] != 0).astype('float');
-        else:
-            prelimAssemblyPatterns[r] = np.zeros(len(activityPatterns[0]));
+    prelimAssemblyPatterns = (groupMeanPatterns(len(prelimAssemblyPatterns))[0] != 0).astype('float');
     
     ## ASSIGN EVERY ACTIVITY TO A GROUP DEFINED BY A PRELIMINARY CORE ASSEMBLY PATTERN
     # IF THE PATTERNS DO NOT EXCEED A CERTAIN LEVEL OF SIMILARITY THEY WILL BE DISREGARDED
     
     p = 1/2;
     
-    for j in range(len(gAssignment)):
-        x = activityPatterns[j];
-        r = np.argmin(np.array([cosineDistance(a,x) if not np.allclose(a, 0) else np.inf for a in prelimAssemblyPatterns]))
-                   
-        if r is not None:
-            gAssignment[j] = iif( (np.dot(prelimAssemblyPatterns[r], x) > p * np.linalg.norm(prelimAssemblyPatterns[r])**2) and (np.linalg.norm(x)**2 > p * np.linalg.norm(prelimAssemblyPatterns[r])**2), r, -1);
+    overlap = X @ prelimAssemblyPatterns.T;
+    prelimNorm = np.sqrt(np.einsum('ij,ij->i', prelimAssemblyPatterns, prelimAssemblyPatterns));
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cosineDistance = 1 - overlap / (prelimNorm[None,:] * X_norm[:,None]);
+    cosineDistance[:,prelimNorm == 0] = np.inf;
     
-        else:
-            gAssignment[j] = -1;
+    r = np.argmin(cosineDistance, axis=1);
+    overlap = overlap[np.arange(len(r)), r];
+    squaredNorm = prelimNorm[r]**2;
+    
+    gAssignment[:] = np.where((overlap > p * squaredNorm) & (X_norm**2 > p * squaredNorm), r, -1);
 
     ## DISREGARD COMMUNITIES CONSISTING OF TOO FEW ACTIVITY PATTERNS
     
@@ -426,17 +608,16 @@ def inferAssemblyPatterns(activityPatterns, patternSimilarityAnalysis):
     
     ## DEFINE CORE ASSEMBLY PATTERNS
     
-    assemblyPatterns = [None] * (int(np.nanmax(gAssignment))+1);
-    iAssemblyPatterns = [None] * (int(np.nanmax(gAssignment))+1);
+    means, counts = groupMeanPatterns(int(np.nanmax(gAssignment))+1);
     
-    for r in range(len(assemblyPatterns)):
-        if np.any(gAssignment == r):
-            iAssemblyPatterns[r] = np.where(gAssignment == r)[0];
-            assemblyPatterns[r] = meanActivityPattern([activityPatterns[_] for _ in iAssemblyPatterns[r]], ACTIVITY_THRESHOLD);
-
-
-    assemblyPatterns = [_ for _ in assemblyPatterns if _ is not None];
-    iAssemblyPatterns = [_ for _ in iAssemblyPatterns if _ is not None];
+    # Indices of the patterns of every group, in increasing order; the
+    # disregarded patterns (-1) come first and the unassigned ones (nan) last
+    order = np.argsort(gAssignment, kind='stable');
+    start = (gAssignment == -1).sum();
+    groups = np.split(order[start:start+counts.sum()], np.cumsum(counts)[:-1]);
+    
+    assemblyPatterns = [means[r] for r in range(len(counts)) if counts[r] > 0];
+    iAssemblyPatterns = [groups[r] for r in range(len(counts)) if counts[r] > 0];
 
 
     return assemblyPatterns, iAssemblyPatterns
@@ -475,93 +656,183 @@ def refreshAssemblyPatterns(assembly_pattern_output):
 
     return OUT
 
-def buildPatternSimilarityGraph(X):
+def continueAssemblyPatterns(assembly_pattern_output):
     """
-    BUILDPATTERNSIMILARITYGRAPH(X) Returns a k-nearest-neighbour graph
-    according to the consine distance from the pattern data in X.
+    CONTINUEASSEMBLYPATTERNS(assembly_pattern_output) Continues every MCMC run
+    of a previous assembly pattern detection for another montecarlo_steps
+    steps, starts new runs up to montecarlo_rounds and infers the assembly
+    patterns from all samples collected so far.
 
        INPUT:
-       X [list]: list of binary activity patterns
+       input_args [dict]: findAssemblyPattern output
 
     """
 
-    def k_nearestneighbours(X, k, d):
+    OUT = assembly_pattern_output;
+    
+    chain_states = OUT['patternSimilarityAnalysis']['communityStructure'].get('markovChainMonteCarloStates');
+    if chain_states is None:
+        raise ValueError('The assembly pattern detection has been saved without the state of its MCMC runs and cannot be continued.');
+    
+    ## > CONTINUE ANALYSIS OF COMMUNITY STRUCTURE IN SIMILARITY GRAPH
+    printConsoleSection('CONTINUE ANALYSIS OF COMMUNITY STRUCTURE IN SIMILARITY GRAPH');
+    
+    patternSimilarityGraph = scipy.sparse.csr_array(OUT['patternSimilarityAnalysis']['graph']);
+    
+    N_ITERATIONS = DETECTION_PARAMETERS['montecarlo_rounds'];
+    N_MONTECARLOSTEPS = DETECTION_PARAMETERS['montecarlo_steps'];
+    
+    OUT['patternSimilarityAnalysis'] = analyseGraphCommunityStructure(patternSimilarityGraph, {'Iterations': N_ITERATIONS, 'MonteCarloSteps': N_MONTECARLOSTEPS, 'initialK': None, 'RNGSeed': DETECTION_PARAMETERS['montecarlo_seed'], 'Processes': DETECTION_PARAMETERS['montecarlo_processes'], 'Tolerance': DETECTION_PARAMETERS['montecarlo_tolerance'], 'CheckInterval': DETECTION_PARAMETERS['montecarlo_check_interval'], 'ChainStates': chain_states, 'ChainSamples': OUT['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloSamples']});
+    
+    
+    ## > INFER ASSEMBLY PATTERNS
+    printConsoleSection('INFER ASSEMBLY PATTERNS');
+    
+    assemblyPatterns, iAssemblyPatterns = inferAssemblyPatterns(OUT['activityPatterns'], OUT['patternSimilarityAnalysis']);
+    
+    OUT['assemblyActivityPatterns'] = assemblyPatterns;
+    OUT['assemblyIActivityPatterns'] = iAssemblyPatterns;
+    
+    print('   {:d} assembly patterns'.format(len(assemblyPatterns)), file=sys.stdout);
+    print('', file=sys.stdout);
 
-        OUT = [None] * len(X);
+    return OUT
 
-        dist = cross_evaluation(d, X) + np.diag(np.nan * np.ones(len(X)));
+def buildPatternSimilarityGraph(X):
+    """
+    BUILDPATTERNSIMILARITYGRAPH(X) Returns the adjacency matrix of the
+    k-nearest-neighbour graph according to the consine distance from the
+    pattern data in X, for the smallest k (starting from ceil(log(n))) for
+    which the graph is connected.
 
-        for i in range(len(X)):
-            s = np.sort(dist[i,:]);
+       INPUT:
+       X [list]: list of binary activity patterns
 
-            OUT[i] = np.where(dist[i,:] <= s[k-1])[0];
+       OUTPUT:
+       output_args [csr_array]: sparse adjacency matrix
 
-        return OUT
-    
+    """
 
-    cosineDistance = lambda x,y : 1 - ( np.dot(x,y) / (np.linalg.norm(x) * np.linalg.norm(y)) );
     # miDistance = lambda x,y : 1 - 2 * np.dot(x,y) / ( x.sum() + x.sum() );
 
-    for k in list(range(math.ceil(math.log(len(X))), len(X)+1)):
-    
-        knn = k_nearestneighbours(X, k, cosineDistance);
+    X = np.asarray(X, dtype='float');
+    n = X.shape[0];
+    
+    # Cosine distances of all pairs at once, computed as dot(x,y) / (|x| |y|)
+    # so that ties come out exactly as with the pairwise formula
+    norms = np.sqrt(np.einsum('ij,ij->i', X, X));
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dist = 1 - (X @ X.T) / np.outer(norms, norms);
+    np.fill_diagonal(dist, np.nan);
+    
+    # Neighbours of every pattern ordered by distance. We select the k nearest
+    # neighbours, however in case of a tie, when there are multiple data point
+    # with the same distance from a single node, we include all of them: for k
+    # these are the first count[i, k-1] neighbours in the order
+    order = np.argsort(dist, axis=1, kind='stable');
+    dist = np.take_along_axis(dist, order, axis=1);
+    
+    count = np.where(np.concatenate([dist[:,1:] != dist[:,:-1], np.ones((n, 1), dtype='bool')], axis=1), np.arange(1, n+1), n);
+    count = np.minimum.accumulate(count[:,::-1], axis=1)[:,::-1];
+    count[np.isnan(dist)] = 0;
+    del dist;
+    
+    # Add the edges for increasing k until the graph is connected, keeping
+    # track of the connected components with a union-find structure
+    parent = list(range(n));
+    
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]];
+            x = parent[x];
+        return x
+    
+    components = n;
+    included = np.zeros(n, dtype='int');
+    rows = [];
+    cols = [];
+    for k in range(math.ceil(math.log(n)), n+1):
         
-        # We select the k nearest neighbours, however in case of a tie, when there
-        # are multiple data point with the same distance from a single node, we
-        # include all of them:
+        # The neighbours that are new for k, order[i, included[i]:k_count[i]]
+        k_count = count[:,k-1] if k > 0 else np.zeros(n, dtype='int');
+        added = np.maximum(k_count - included, 0);
+        i_new = np.repeat(np.arange(n), added);
+        offset = np.arange(len(i_new)) - np.repeat(np.cumsum(added) - added, added);
+        j_new = order[i_new, included[i_new] + offset];
+        included = np.maximum(included, k_count);
         
-        A = np.zeros((len(knn), len(knn)));
-        for x in range(len(knn)):
-            n = knn[x][knn[x] != x];
-            
-            A[x, n] = 1;
-            A[n, x] = 1;
+        rows.append(i_new);
+        cols.append(j_new);
         
-        OUT = nx.from_numpy_array(A);
+        for i, j in zip(i_new.tolist(), j_new.tolist()):
+            ri = find(i);
+            rj = find(j);
+            if ri != rj:
+                parent[ri] = rj;
+                components -= 1;
         
-        if nx.is_connected(OUT):
+        if components == 1:
             break;
+    else:
+        # Never connected, the last graph (k = n) has no edges
+        rows = [];
+        cols = [];
+    
+    rows = np.concatenate(rows + [np.array([], dtype='int')]);
+    cols = np.concatenate(cols + [np.array([], dtype='int')]);
+    
+    OUT = scipy.sparse.csr_array((np.ones(2 * len(rows)), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n, n));
+    OUT.sum_duplicates();
+    OUT.data[:] = 1;
 
     return OUT
 
-def spectralclustering(G, K, normalisation=None):
+def spectralclustering(G, K, normalisation=None, opts=None):
     """
-    SPECTRALCLUSTERING(G, K, normalisation=None) Performs spectral clustering
-    on the graph G into k clusters.
+    SPECTRALCLUSTERING(G, K, normalisation=None, opts=None) Performs spectral
+    clustering on the graph G into k clusters.
 
        INPUT:
-       G [graph]: input graph
+       G [graph]: input graph, or its sparse adjacency matrix
        K [list]: number of clusters
        normalisation [str]: (optional) spectral clustering normalisation
        ('unnormalised','symmetric','randomwalk'/'normalised')
+       opts [dict]: (optional) parameters of the k-means clustering
+           .Replicates [int]: number of k-means runs with different
+           centroid seeds (default: 100)
+           .MaxIterations [int]: maximal number of iterations of a single
+           k-means run (default: 300)
+           .Threads [int]: number of threads the k-means runs use (default:
+           None, all CPUs)
+           .RNGSeed [int]: seed of the k-means initialisation (default: None)
 
     """
 
-    def graphlaplacian(G, normalisation=None):
+    def graphlaplacian(A, normalisation=None):
 
         if normalisation is None:
             normalisation = '';
 
-        A = nx.adjacency_matrix(G).A;
-        D = np.array([k for _, k in G.degree()]);
+        D = np.asarray(A.sum(axis=1)).ravel();
 
-        J = np.eye(len(G));
+        J = scipy.sparse.eye_array(A.shape[0], format='csr');
 
+        # The random walk Laplacian J - D^-1 A is not symmetric, but it has
+        # the same eigenvalues as the symmetric one J - D^-1/2 A D^-1/2 whose
+        # eigenvectors u give the ones of the former by D^-1/2 u. So both
+        # normalised forms are solved as a sparse symmetric problem.
         if normalisation == '' or normalisation == 'unnormalised':
             d = D;
-            OUT = np.diag(d) - A;
-        elif normalisation == 'symmetric':
+            OUT = scipy.sparse.diags_array(d) - A;
+        elif normalisation in ['symmetric', 'randomwalk', 'normalised']:
             d = 1 / np.sqrt(D);
-            OUT = J - np.diag(d) @ A @ np.diag(d);
-        elif normalisation == 'randomwalk' or normalisation == 'normalised':
-            d = 1 / D;
-            OUT = J - np.diag(d) @ A;
+            OUT = J - scipy.sparse.diags_array(d) @ A @ scipy.sparse.diags_array(d);
 
-        return OUT
+        return scipy.sparse.csr_array(OUT), d
 
-    def assignmentvector(G, c):
+    def assignmentvector(n, c):
 
-        OUT = np.zeros(len(G));
+        OUT = np.zeros(n);
 
         for j in range(len(c)):
             OUT[c[j]] = j;
@@ -575,42 +846,66 @@ def spectralclustering(G, K, normalisation=None):
     if normalisation is None:
         normalisation = '';
         
+    if opts is None:
+        opts = {};
+    
+    STD_OPTS = {'Replicates': 100, 'MaxIterations': 300, 'Threads': None, 'RNGSeed': None};
+    opts = dict(STD_OPTS, **{_: opts[_] for _ in opts if _ in STD_OPTS});
+        
     optimisation = False;
 
     # =========================================================================
 
+    if scipy.sparse.issparse(G):
+        A = scipy.sparse.csr_array(G, dtype='float');
+    else:
+        A = nx.to_scipy_sparse_array(G, dtype='float', format='csr');
+    n = A.shape[0];
+
     z = 1;
-    H = graphlaplacian(G, normalisation) + z * np.eye(len(G));
+    L, d = graphlaplacian(A, normalisation);
+    H = L + z * scipy.sparse.eye_array(n, format='csr');
     # In H the spectrum was shifted by an amount z away from 0 in order for the
     # matrix to be non-singular so that the computation of eigenvectors tends
     # to be more stable.
 
-    e_, U_ = np.linalg.eig(H)
+    # Only the eigenvectors of the largest number of clusters asked for are
+    # computed. With shift-invert around 0 the eigenvalues of H closest to z
+    # converge first; for small graphs the dense solver is used instead.
+    k_max = min(max([int(_) for _ in K] + [1]), n);
+    if k_max < n - 1 and n > 100:
+        v0 = np.random.default_rng(0).random(n);
+        e_, U_ = scipy.sparse.linalg.eigsh(H, k=k_max, sigma=0, which='LM', v0=v0);
+    else:
+        e_, U_ = np.linalg.eigh(H.toarray());
     iex = np.argsort(e_)
     e_ = e_[iex]
+    U_ = U_[:,iex]
 
-    OUT = np.nan * np.ones((len(K), len(G)));
+    OUT = np.nan * np.ones((len(K), n));
 
     for j in range(len(K)):
         k = int(K[j]);
         
         e = e_[:k];
-        U = U_[:,iex[:k]];
+        U = U_[:,:k];
         
         # =========================================================================
         
-        if np.all(U == np.real(U)) and np.abs(H @ U - U @ np.diag(e)).max() < 1e-10:
+        if np.abs(H @ U - U * e).max() < 1e-10:
             
             if normalisation in ['' , 'unnormalised']:
                 pass
             elif normalisation == 'symmetric':
                 U = U / np.linalg.norm(U, axis=1, keepdims=True)
             elif normalisation in ['randomwalk', 'normalised']:
-                pass
+                U = d[:,None] * U
+                U = U / np.linalg.norm(U, axis=0, keepdims=True)
             
-            V = np.array(range(len(G)));
+            V = np.array(range(n));
 
-            idx = sklearn.cluster.KMeans(n_clusters=k, n_init=100, max_iter=300).fit(np.real(U)).labels_
+            with threadpoolctl.threadpool_limits(limits=opts['Threads'], user_api='openmp'):
+                idx = sklearn.cluster.KMeans(n_clusters=k, n_init=opts['Replicates'], max_iter=opts['MaxIterations'], random_state=opts['RNGSeed']).fit(U).labels_
             idx = normalisePatternEnumeration(idx);
 
             OUT_k = [None] * k;
@@ -625,12 +920,12 @@ def spectralclustering(G, K, normalisation=None):
             iO = np.argsort([len(_) for _ in OUT_k])[::-1];
             OUT_k = [OUT_k[_] for _ in iO];
             
-            OUT[j,:] = assignmentvector(G, OUT_k);
+            OUT[j,:] = assignmentvector(n, OUT_k);
             
         else:
             print(' ! Spectral clustering failed.', file=sys.stdout);
             print('! Spectral clustering failed.', file=sys.stderr);
-            OUT[j,:] = np.zeros(len(G));
+            OUT[j,:] = np.zeros(n);
     
 
     return OUT
@@ -645,16 +940,34 @@ def analyseGraphCommunityStructure(graph , opts=None):
        in a network". Phys. Rev. Lett. 117 (2016).
 
        INPUT:
-       graph [graph]: undirected, unweigted graph
+       graph [graph]: undirected, unweigted graph, or its sparse adjacency
+                      matrix
        opts [dict]: (optional) parameters of the algorithm
            .Iterations [int]: number of independent MCMC runs (default: 1)
            .MonteCarloSteps [int]: number of steps in every MCMC run (default: 10000)
-           .RNGSeed [int]: seed for the random number generator (default: None)
+           .RNGSeed [int]: master seed from which the seeds of the individual
+           MCMC runs are derived (default: None)
            .initialK [int]: initial guess for the number of communities (default: None)
+           .Processes [int]: number of processes to run the MCMC runs in
+           parallel (default: None, one per run up to the number of CPUs)
+           .ChainStates [list]: states of previous MCMC runs to continue for
+           another MonteCarloSteps steps each; further runs up to Iterations
+           are started anew (default: None)
+           .ChainSamples [list]: samples of the previous MCMC runs, the new
+           samples are appended to them (default: None)
+           .Tolerance [float]: stop the MCMC runs before MonteCarloSteps once
+           the rank-normalized split-R-hat of the number of communities in
+           the second half of every run is at most 1 + Tolerance and its
+           effective sample size at least MinimumEffectiveSampleSize (see
+           CHECKGRAPHCOMMUNITYSTRUCTURECONVERGENCE); None to always run all
+           steps (default: None)
+           .MinimumEffectiveSampleSize [float]: see Tolerance (default: 100)
+           .CheckInterval [int]: number of steps between convergence checks
+           (default: 1000)
 
        OUTPUT:
        output_args [dict]: results
-           .graph [graph]: undirected, unweigted graph (same as
+           .graph [NxN ndarray]: adjacency matrix of the graph (same as
            input)
            .communityStructure.count [int]: most likely number of
            communities
@@ -664,6 +977,13 @@ def analyseGraphCommunityStructure(graph , opts=None):
            structure given the most likely number of communities
            .communityStructure.markovChainMonteCarloSamples [list]: MCMC
            samples
+           .communityStructure.markovChainMonteCarloStates [list]: state of
+           every MCMC run at its end, to continue it later
+           .communityStructure.convergence [dict]: steps, largest
+           potentialScaleReduction (R-hat) and smallest effectiveSampleSize
+           of a run and betweenRunScaleReduction at every check,
+           whether the runs converged and the number of sweeps every run
+           actually made; None without Tolerance
 
        EXAMPLES:
        analyseGraphCommunityStructure(ZacharyKarateClub , {'Iterations': 1, 'MonteCarloSteps': 10000, 'initialK': 3})
@@ -683,24 +1003,48 @@ def analyseGraphCommunityStructure(graph , opts=None):
             opts_['RNGSeed'] = opts['RNGSeed'];
         elif opt == 'initialK':
             opts_['initialK'] = opts['initialK'];
+        elif opt == 'Processes':
+            opts_['Processes'] = opts['Processes'];
+        elif opt == 'ChainStates':
+            opts_['ChainStates'] = opts['ChainStates'];
+        elif opt == 'ChainSamples':
+            opts_['ChainSamples'] = opts['ChainSamples'];
+        elif opt == 'Tolerance':
+            opts_['Tolerance'] = opts['Tolerance'];
+        elif opt == 'MinimumEffectiveSampleSize':
+            opts_['MinimumEffectiveSampleSize'] = opts['MinimumEffectiveSampleSize'];
+        elif opt == 'CheckInterval':
+            opts_['CheckInterval'] = opts['CheckInterval'];
             
     
     if not 'Iterations' in opts.keys():
         opts['Iterations'] = 1;
     
-    STD_OPTS = {'MonteCarloSteps': 10000, 'RNGSeed': None, 'maximalK': math.ceil(len(graph)/3), 'initialK': None, 'showBanner': False};
+    # The graph is converted once into the arrays the estimation takes, and
+    # handed to every MCMC run in this form
+    timer = runtimer();
+    timer.tic();
+    network = graph2CSR(graph);
+    conversion_time = timer.toc();
+    
+    nvertices = network['nvertices'];
+    selfloops = np.count_nonzero(network['indices'] == np.repeat(np.arange(nvertices), np.diff(network['indptr'])));
+    nedges = (len(network['indices']) + selfloops) // 2;
+    
+    STD_OPTS = {'MonteCarloSteps': 10000, 'RNGSeed': None, 'maximalK': math.ceil(nvertices/3), 'initialK': None, 'showBanner': False, 'Processes': None, 'ChainStates': None, 'ChainSamples': None, 'Tolerance': None, 'MinimumEffectiveSampleSize': 100, 'CheckInterval': 1000};
     for opt in STD_OPTS.keys():
         if not opt in opts_.keys():
             opts_[opt] = STD_OPTS[opt];
 
     
-    if len(graph) > 0:
+    if nvertices > 0:
         print('Initialising graph community structure estimation ...', file=sys.stdout);
         
-        print(' Number of vertices: {:d}'.format(graph.number_of_nodes()), file=sys.stdout);
-        print(' Number of edges: {:d}'.format(graph.number_of_edges()), file=sys.stdout);
+        print(' Number of vertices: {:d}'.format(nvertices), file=sys.stdout);
+        print(' Number of edges: {:d}'.format(nedges), file=sys.stdout);
+        print(' Graph conversion: {:s}'.format(print_timeinterval(conversion_time)), file=sys.stdout);
         
-        if graph.number_of_nodes() < 20:
+        if nvertices < 20:
             print('', file=sys.stdout);
             print(' ==> The graph is very small and results may be inaccurate.', file=sys.stdout)
         
@@ -709,24 +1053,124 @@ def analyseGraphCommunityStructure(graph , opts=None):
         if opts_['RNGSeed'] is None:
             opts_['RNGSeed'] = seed_devrandom();
         
+        chain_states = list(opts_['ChainStates'] or []);
+        chain_samples = list(opts_['ChainSamples'] or []);
+        opts['Iterations'] = max(opts['Iterations'], len(chain_states));
+        
+        if len(chain_states) > 0:
+            print('Continuing {:d} and starting {:d} MCMC runs ...'.format(len(chain_states), opts['Iterations'] - len(chain_states)), file=sys.stdout);
+            print('', file=sys.stdout);
+        
+        # Every iteration runs its own chain with a seed and, if not given, an
+        # initial number of communities derived from the master seed, so the
+        # results do not depend on the order in which the iterations finish
+        iteration_opts = [None] * opts['Iterations'];
+        for i, seed_sequence in enumerate(np.random.SeedSequence(opts_['RNGSeed']).spawn(opts['Iterations'])):
+            seed, initialK = seed_sequence.generate_state(2);
+            iteration_opts[i] = {**opts_, 'RNGSeed': int(seed)};
+            if opts_['initialK'] is None:
+                iteration_opts[i]['initialK'] = 1 + int(initialK) % opts_['maximalK'];
+            if i < len(chain_states):
+                iteration_opts[i]['chainState'] = chain_states[i];
+        
+        processes = opts_['Processes'];
+        if processes is None:
+            processes = min(opts['Iterations'], os.cpu_count() or 1);
+        
         if opts['Iterations'] > 1:
-            print('Running graph community structure estimation ({:d} iterations) ...'.format(opts['Iterations']), file=sys.stdout);
+            print('Running graph community structure estimation ({:d} iterations, {:d} processes) ...'.format(opts['Iterations'], processes), file=sys.stdout);
         else:
             print('Running graph community structure estimation ...', file=sys.stdout);
         
+        # Without a tolerance all steps are run at once, otherwise the runs are
+        # continued in blocks of CheckInterval steps until the runs agree on
+        # the distribution of the number of communities
+        if opts_['Tolerance']:
+            block = min(opts_['CheckInterval'], opts_['MonteCarloSteps']);
+            print(' Checking convergence every {:d} steps (R-hat at most {:g} and effective sample size at least {:g} in every run)'.format(block, 1 + opts_['Tolerance'], opts_['MinimumEffectiveSampleSize']), file=sys.stdout);
+        else:
+            block = opts_['MonteCarloSteps'];
+        
         print('', file=sys.stdout);
         
+        def append_samples(samples, new_samples):
+            if samples is None:
+                return new_samples;
+            dtype = [('k', np.promote_types(samples['k'].dtype, new_samples['k'].dtype)), ('g', 'object'), ('E', 'float32')];
+            return np.concatenate([samples.astype(dtype), new_samples.astype(dtype)]);
+        
+        def run_iterations(block_opts, report):
+            samples = [None] * opts['Iterations'];
+            states = [None] * opts['Iterations'];
+            if executor is not None:
+                start = time.time();
+                futures = {executor.submit(estimateGraphCommunityStructure, network, {**block_opts[i], 'verbose': False}): i for i in range(opts['Iterations'])};
+                for future in concurrent.futures.as_completed(futures):
+                    i = futures[future];
+                    samples[i], states[i] = future.result();
+                    if report:
+                        print(' Iteration {:d} completed: {:s}'.format(i+1, print_timeinterval(time.time() - start)), file=sys.stdout);
+            else:
+                for i in range(opts['Iterations']):
+                    timer = runtimer();
+                    timer.tic();
+                    samples[i], states[i] = estimateGraphCommunityStructure(network, block_opts[i]);
+                    
+                    if report and opts['Iterations'] > 1:
+                        print(' Iteration {:d} completed: {:s}'.format(i+1, print_timeinterval(timer.toc())), file=sys.stdout);
+                        #print(estimation_samples[i]['E'][-1])
+            return samples, states;
+        
         # estimation_samples = estimateGraphCommunityStructure( graph , opts_ );
         #try:
-        estimation_samples = [None] * opts['Iterations'];
-        for i in range(opts['Iterations']):
+        # Continued runs keep the samples they already collected
+        estimation_samples = (chain_samples + [None] * opts['Iterations'])[:opts['Iterations']];
+        estimation_states = [iteration_opts[i].get('chainState') for i in range(opts['Iterations'])];
+        convergence = None;
+        if opts_['Tolerance']:
+            convergence = {'steps': [], 'potentialScaleReduction': [], 'effectiveSampleSize': [], 'betweenRunScaleReduction': [], 'converged': False, 'sweeps': 0};
+        
+        executor = None;
+        if processes > 1 and opts['Iterations'] > 1:
+            # forkserver or spawn instead of fork, the caller might have other
+            # threads running (e.g. the GUI)
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn');
+            executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context);
+        
+        try:
+            steps = 0;
             timer = runtimer();
             timer.tic();
-            estimation_samples[i] = estimateGraphCommunityStructure(graph, opts_);
-            
-            if opts['Iterations'] > 1:
-                print(' Iteration {:d} completed: {:s}'.format(i+1, print_timeinterval(timer.toc())), file=sys.stdout);
-                #print(estimation_samples[i]['E'][-1])
+            while steps < opts_['MonteCarloSteps']:
+                block_steps = min(block, opts_['MonteCarloSteps'] - steps);
+                block_samples, estimation_states = run_iterations([{**iteration_opts[i], 'MonteCarloSteps': block_steps, 'chainState': estimation_states[i]} for i in range(opts['Iterations'])], convergence is None);
+                estimation_samples = [append_samples(*_) for _ in zip(estimation_samples, block_samples)];
+                steps += block_steps;
+                
+                if convergence is not None:
+                    rhat, ess, between_rhat = checkGraphCommunityStructureConvergence(estimation_samples);
+                    convergence['steps'].append(steps);
+                    convergence['potentialScaleReduction'].append(rhat);
+                    convergence['effectiveSampleSize'].append(ess);
+                    convergence['betweenRunScaleReduction'].append(between_rhat);
+                    convergence['sweeps'] = steps;
+                    print(' {:d} steps: R-hat {:.4f}, effective sample size {:.0f}, R-hat between runs {:.4f}'.format(steps, rhat, ess, between_rhat), file=sys.stdout);
+                    
+                    if rhat <= 1 + opts_['Tolerance'] and ess >= opts_['MinimumEffectiveSampleSize']:
+                        convergence['converged'] = True;
+                        break;
+        finally:
+            if executor is not None:
+                executor.shutdown();
+        
+        if convergence is not None:
+            print('', file=sys.stdout);
+            if convergence['converged']:
+                print(' Converged after {:d} of {:d} sweeps per run: {:s}'.format(steps, opts_['MonteCarloSteps'], print_timeinterval(timer.toc())), file=sys.stdout);
+                if convergence['betweenRunScaleReduction'][-1] > 1 + opts_['Tolerance']:
+                    print(' ==> The runs settled on different numbers of communities (R-hat between runs {:.4f}).'.format(convergence['betweenRunScaleReduction'][-1]), file=sys.stdout);
+            else:
+                print(' Not converged within {:d} sweeps per run: {:s}'.format(steps, print_timeinterval(timer.toc())), file=sys.stdout);
         
         print('', file=sys.stdout);
         print('Graph community structure estimation completed.', file=sys.stdout);
@@ -746,17 +1190,21 @@ def analyseGraphCommunityStructure(graph , opts=None):
                 'count': None,
                 'countDistribution': None,
                 'assignment': None,
-                'markovChainMonteCarloSamples': None
+                'markovChainMonteCarloSamples': None,
+                'markovChainMonteCarloStates': None,
+                'convergence': None
             }
 
         }
         
-        OUT['graph'] = nx.to_numpy_array(graph);
+        OUT['graph'] = scipy.sparse.csr_array((np.ones(len(network['indices'])), network['indices'], network['indptr']), shape=(nvertices, nvertices)).toarray();
         OUT['communityStructure']['count'] = k;
         OUT['communityStructure']['countDistribution'] = k_distribution;
         OUT['communityStructure']['assignment'] = [np.where(g == r)[0] for r in np.unique(g)];
         
         OUT['communityStructure']['markovChainMonteCarloSamples'] = estimation_samples;
+        OUT['communityStructure']['markovChainMonteCarloStates'] = estimation_states;
+        OUT['communityStructure']['convergence'] = convergence;
     
     return OUT
 
@@ -767,26 +1215,31 @@ def estimateGraphCommunityStructure(graph, opts=None):
     estimating community structure.
 
        INPUT:
-       graph [graph]: undirected, unweigted graph
+       graph [graph]: undirected, unweigted graph, its sparse adjacency
+                      matrix, or its graph2CSR conversion
        opts [dict]: (optional) parameters of the algorithm
            .MonteCarloSteps [int]: number of steps in every MCMC run (default: 10000)
            .RNGSeed [int]: seed for the random number generator (default: None)
            .maximalK [int]: maximal number of communities (default: 40)
            .initialK [int]: initial guess for the number of communities (default: None)
            .showBanner [bool]: show banner (default: False)
+           .verbose [bool]: show the progress of the MCMC run (default: True)
+           .chainState [dict]: state of a previous MCMC run to continue
+           instead of starting from initialK random communities (default: None)
 
        OUTPUT:
        output_args [recarray]: results
            .k [int]: number of communities
            .g [1x? ndarray]: community assignment
            .E [float]: log-likelihood
+       chain_state [dict]: state of the MCMC run at its end (see estimate)
 
        EXAMPLES:
        estimateGraphCommunityStructure(ZacharyKarateClub, {})
 
     """
 
-    if type(graph) is not nx.classes.graph.Graph:
+    if type(graph) is not dict and type(graph) is not nx.classes.graph.Graph and not scipy.sparse.issparse(graph):
         raise(TypeError('graph'));
         
     if opts is None:
@@ -804,10 +1257,14 @@ def estimateGraphCommunityStructure(graph, opts=None):
             opts_['K'] = opts['maximalK'];
         elif opt == 'initialK':
             opts_['K0'] = opts['initialK'];
+        elif opt == 'verbose':
+            opts_['verbose'] = opts['verbose'];
+        elif opt == 'chainState':
+            opts_['state'] = opts['chainState'];
         else:
             pass
     
-    STD_OPTS = {'K': 40, 'K0': None, 'seed': None, 'MCsweeps': 10000, 'verbose': True};
+    STD_OPTS = {'K': 40, 'K0': None, 'seed': None, 'MCsweeps': 10000, 'verbose': True, 'state': None};
     for opt in STD_OPTS.keys():
         if not opt in opts_.keys():
             opts_[opt] = STD_OPTS[opt];
@@ -832,12 +1289,12 @@ def estimateGraphCommunityStructure(graph, opts=None):
             print('', file=sys.stdout);
     
     
-    k, E = estimate(graph, **opts_);
+    k, E, chain_state = estimate(graph, return_state=True, **opts_);
     
     
     k_dtype = 'uint{:d}'.format(2 ** (2 + np.where(np.log2(k).max() <= 2**(2+np.array([1,2,3,4])))[0][0] + 1))
 
-    return np.array([(_[0], np.array([], dtype=k_dtype), _[1]) for _ in zip(k, E)], dtype=[('k', k_dtype), ('g', 'object'), ('E', 'float32')])
+    return np.array([(_[0], np.array([], dtype=k_dtype), _[1]) for _ in zip(k, E)], dtype=[('k', k_dtype), ('g', 'object'), ('E', 'float32')]), chain_state
 
 def computeGraphCommunityStructureMarginals(estimate_output):
     """
@@ -889,6 +1346,98 @@ def computeGraphCommunityStructureMarginals(estimate_output):
     
     return k_ , k_distibution , np.array([])
 
+def checkGraphCommunityStructureConvergence(estimate_output):
+    """
+    CHECKGRAPHCOMMUNITYSTRUCTURECONVERGENCE(estimate_output) Measures how far
+    (several rounds of) Markov-Chain-Monte-Carlo sampling are from having
+    converged, based on the number of communities in the second half of every
+    run.
+
+       These functions implement the rank-normalized split-R-hat and the bulk
+       effective sample size described in A. Vehtari, A. Gelman, D. Simpson,
+       B. Carpenter and P.-C. Buerkner. "Rank-normalization, folding, and
+       localization: An improved R-hat for assessing convergence of MCMC".
+       Bayesian Analysis 16 (2021), which take the autocorrelation of the
+       chains into account. The second half of every run is split in two, so
+       that a run that is still drifting is detected on its own; the runs
+       often settle in different modes of the number of communities they do
+       not leave within any practical number of steps, which the R-hat of
+       all runs together shows.
+
+       INPUT:
+       estimate_output [list]: estimate-MCMC samples from
+       ESTIMATEGRAPHCOMMUNITYSTRUCTURE.
+
+       OUTPUT:
+       rhat [float]: largest split-R-hat of a single run; 1 if the number of
+       communities never changed, inf if the runs are too short
+       ess [float]: smallest effective sample size of a single run
+       between_rhat [float]: split-R-hat of all runs together
+
+    """
+
+    # Rank-normalization, ties (the number of communities is discrete) get
+    # their average rank
+    def normalize(x):
+        r = scipy.stats.rankdata(x, method='average').reshape(x.shape);
+        return scipy.stats.norm.ppf((r - 0.375) / (x.size + 0.25));
+
+    def split_rhat(z):
+        N = z.shape[1];
+        W = z.var(axis=1, ddof=1).mean();
+        B = z.mean(axis=1).var(ddof=1);
+        if W == 0:
+            return 1. if B == 0 else math.inf
+        return math.sqrt(((N - 1) / N * W + B) / W)
+
+    # R-hat (the largest of the one of the samples and the one of the
+    # folded samples) and bulk effective sample size of the given chains
+    def diagnostics(chains):
+        M, N = chains.shape;
+        if np.all(chains == chains[0, 0]):
+            return 1., float(M * N)
+
+        z = normalize(chains);
+        rhat = max(split_rhat(z), split_rhat(normalize(np.abs(chains - np.median(chains)))));
+
+        # Autocorrelations of all chains combined as in Stan, truncated with
+        # Geyer's initial monotone sequence
+        acov = np.fft.irfft(np.abs(np.fft.rfft(z - z.mean(axis=1, keepdims=True), n=2*N, axis=1)) ** 2, n=2*N, axis=1)[:, :N] / N;
+        W = (acov[:, 0] * N / (N - 1)).mean();
+        if W == 0:
+            return rhat, float(M)
+        var_plus = W * (N - 1) / N + z.mean(axis=1).var(ddof=1);
+        rho = 1 - (W - acov.mean(axis=0)) / var_plus;
+        rho[0] = 1.;
+
+        tau = -1.;
+        previous = math.inf;
+        for t in range(0, N - 1, 2):
+            pair = rho[t] + rho[t + 1];
+            if pair <= 0:
+                break
+            previous = min(pair, previous);
+            tau += 2 * previous;
+
+        return rhat, min(M * N / tau, M * N * math.log10(M * N))
+
+    runs = [];
+    for i in range(len(estimate_output)):
+        K_ = np.asarray(estimate_output[i]['k'], dtype='float')[math.floor(len(estimate_output[i])/2):];
+        half = len(K_) // 2;
+        runs.append(np.array([K_[:half], K_[len(K_)-half:]]));
+
+    N = min(_.shape[1] for _ in runs);
+    if N < 4:
+        return math.inf, 0., math.inf
+
+    run_diagnostics = [diagnostics(_[:, :N]) for _ in runs];
+    rhat = max(_[0] for _ in run_diagnostics);
+    ess = min(_[1] for _ in run_diagnostics);
+    between_rhat = diagnostics(np.concatenate([_[:, :N] for _ in runs]))[0];
+
+    return rhat, ess, between_rhat
+
 def meanActivityPattern(activityPatterns, activityThreshold):
     """
     MEANACTIVITYPATTERN(activityPatterns, activityThreshold)
@@ -1128,12 +1677,39 @@ def load_SGC_ASSEMBLIES_mat(filename):
     else:
         __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['graph'] = SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.graph
     
+    # With a single MCMC run the list of runs is squeezed away
+    __markovChainMonteCarloSamples = SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.markovChainMonteCarloSamples
+    if isinstance(np.atleast_1d(__markovChainMonteCarloSamples)[0], scipy.io.matlab.mat_struct):
+        __markovChainMonteCarloSamples = [__markovChainMonteCarloSamples]
+    
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure'] = {
         'count': SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.count,
         'countDistribution': SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.countDistribution,
         'assignment': list(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.assignment),
-        'markovChainMonteCarloSamples': [np.array([(_.k, _.g, _.E) for _ in _], dtype=[('k', 'uint8'), ('g', 'object'), ('E', 'float32')]) for _ in SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.markovChainMonteCarloSamples]
+        'markovChainMonteCarloSamples': [np.array([(_.k, _.g, _.E) for _ in np.atleast_1d(_)], dtype=[('k', 'uint8'), ('g', 'object'), ('E', 'float32')]) for _ in __markovChainMonteCarloSamples],
+        'markovChainMonteCarloStates': None,
+        'convergence': None
     }
+    
+    if hasattr(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure, 'convergence'):
+        __convergence = SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.convergence
+        __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['convergence'] = {
+            'steps': np.atleast_1d(__convergence.steps).astype('int'),
+            **{field: np.atleast_1d(getattr(__convergence, field)).astype('float') for field in ['potentialScaleReduction', 'effectiveSampleSize', 'betweenRunScaleReduction', 'withinRunDistance', 'betweenRunDistance'] if hasattr(__convergence, field)},
+            'converged': bool(__convergence.converged),
+            'sweeps': int(getattr(__convergence, 'sweeps', np.atleast_1d(__convergence.steps)[-1]))
+        }
+    
+    # Files written before the state of the MCMC runs was saved don't have it
+    if hasattr(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure, 'markovChainMonteCarloStates'):
+        __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloStates'] = [{
+            'g': np.atleast_1d(_.g).astype('int'),
+            'n': np.atleast_1d(_.n).astype('int'),
+            'm': np.reshape(_.m, (int(_.k), int(_.k))).astype('int'),
+            'k': int(_.k),
+            'rng': {'mt': np.atleast_1d(_.rng.mt).astype('uint32'), 'mti': int(_.rng.mti)},
+            'backend': _.backend if isinstance(getattr(_, 'backend', None), str) and _.backend else None
+        } for _ in np.atleast_1d(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].patternSimilarityAnalysis.communityStructure.markovChainMonteCarloStates)]
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyActivityPatterns'] = list(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].assemblyActivityPatterns)
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyIActivityPatterns'] = list(SGC_ASSEMBLIES_mat['assembly_pattern_detection'].assemblyIActivityPatterns)
     __SGC_ASSEMBLIES_mat['assemblies'] = list(SGC_ASSEMBLIES_mat['assemblies'])
@@ -1179,6 +1755,21 @@ def save_SGC_ASSEMBLIES_mat(filename, SGC_ASSEMBLIES_mat):
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['assignment'] = as_objectarray(__SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['assignment'])[np.newaxis,:]
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloSamples'] = as_objectarray(__SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloSamples'])[:,np.newaxis]
     
+    if __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure'].get('convergence') is None:
+        __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure'].pop('convergence', None)
+    
+    if __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure'].get('markovChainMonteCarloStates') is None:
+        __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure'].pop('markovChainMonteCarloStates', None)
+    else:
+        __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloStates'] = as_objectarray([{
+            'g': np.array(_['g'], dtype='int32'),
+            'n': np.array(_['n'], dtype='int32'),
+            'm': np.array(_['m'], dtype='int32'),
+            'k': int(_['k']),
+            'rng': {'mt': np.array(_['rng']['mt'], dtype='uint32'), 'mti': int(_['rng']['mti'])},
+            'backend': _.get('backend') or ''
+        } for _ in __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['patternSimilarityAnalysis']['communityStructure']['markovChainMonteCarloStates']])[:,np.newaxis]
+    
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyActivityPatterns'] = as_objectarray(__SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyActivityPatterns'])[:,np.newaxis]
     __SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyIActivityPatterns'] = as_objectarray(__SGC_ASSEMBLIES_mat['assembly_pattern_detection']['assemblyIActivityPatterns'])[:,np.newaxis]
     
@@ -1203,18 +1794,13 @@ def CALCIUM_FLUORESCENCE_PROCESSING(CALCIUM_FLUORESCENCE_file):
 
             timer = runtimer();
             timer.tic();
-            sig_dF_F_activity, sig_dF_F_coactivity_threshold, sig_dF_F_coactivity_peaks = findSignificantDF_FCoactivity(CALCIUM_FLUORESCENCE_mat['calcium_fluorescence']['dF_F']);
-
-            OUT['activity_raster'] = sig_dF_F_activity;
-            OUT['activity_raster_peak_threshold'] = sig_dF_F_coactivity_threshold;
-            OUT['activity_raster_peaks'] = sig_dF_F_coactivity_peaks;
-            
+            OUT = ACTIVITY_RASTER_PREPROCESSING(dF_F=CALCIUM_FLUORESCENCE_mat['calcium_fluorescence']['dF_F']);
 
             directory, name = os.path.split(CALCIUM_FLUORESCENCE_file);
             name, _ = os.path.splitext(name);
 
             OUTPUT_PATH = os.path.join(directory, name.replace('_CALCIUM-FLUORESCENCE', '_ACTIVITY-RASTER') + '.mat');
-            save_ACTIVITY_RASTER_mat(OUTPUT_PATH, OUT);
+            save_ACTIVITY_RASTER_mat(OUTPUT_PATH, copy.deepcopy(OUT));
             #os.chmod(OUTPUT_PATH, os.stat(OUTPUT_PATH).st_mode | stat.S_IWGRP);
 
             timer.toc();
@@ -1245,11 +1831,7 @@ def SGC_ASSEMBLY_DETECTION(ACTIVITY_RASTER_file):
             
             ACTIVITY_RASTER_mat = load_ACTIVITY_RASTER_mat(ACTIVITY_RASTER_file)
             
-            activity_patters = list(ACTIVITY_RASTER_mat['activity_raster'][ACTIVITY_RASTER_mat['activity_raster_peaks'].flatten(),:])
-            
-            printConsoleSection('RUN ASSEMBLY PATTERN DETECTION');
-            
-            OUT['assembly_pattern_detection'] = findAssemblyPatterns(activity_patters);
+            OUT = ASSEMBLY_PATTERN_DETECTION(ACTIVITY_RASTER_mat);
             
         else:
             
@@ -1257,12 +1839,16 @@ def SGC_ASSEMBLY_DETECTION(ACTIVITY_RASTER_file):
             
             OUT = load_SGC_ASSEMBLIES_mat(ACTIVITY_RASTER_file.replace('_ACTIVITY-RASTER', '_SGC-ASSEMBLIES'));
             
-            printConsoleSection('REDO ASSEMBLY PATTERN DETECTION');
-            
-            OUT['assembly_pattern_detection'] = refreshAssemblyPatterns(OUT['assembly_pattern_detection']);
+            if DETECTION_PARAMETERS['montecarlo_continue']:
+                printConsoleSection('CONTINUE ASSEMBLY PATTERN DETECTION');
+                
+                OUT['assembly_pattern_detection'] = continueAssemblyPatterns(OUT['assembly_pattern_detection']);
+            else:
+                printConsoleSection('REDO ASSEMBLY PATTERN DETECTION');
+                
+                OUT['assembly_pattern_detection'] = refreshAssemblyPatterns(OUT['assembly_pattern_detection']);
             
-      
-        OUT['assemblies'] = [np.where(_ > 0)[0] for _ in OUT['assembly_pattern_detection']['assemblyActivityPatterns']];
+            OUT['assemblies'] = [np.where(_ > 0)[0] for _ in OUT['assembly_pattern_detection']['assemblyActivityPatterns']];
         
         
         printConsoleSection('SAVE RESULTS');
@@ -1271,7 +1857,7 @@ def SGC_ASSEMBLY_DETECTION(ACTIVITY_RASTER_file):
         name, _ = os.path.splitext(name)
 
         OUTPUT_PATH = os.path.join(directory, name.replace('_ACTIVITY-RASTER', '_SGC-ASSEMBLIES') + '.mat')
-        save_SGC_ASSEMBLIES_mat(OUTPUT_PATH, OUT);
+        save_SGC_ASSEMBLIES_mat(OUTPUT_PATH, copy.deepcopy(OUT));
         #os.chmod(OUTPUT_PATH, os.stat(OUTPUT_PATH).st_mode | stat.S_IWGRP);
 
         if SCRIPT_END_INDICATOR:
@@ -1288,20 +1874,427 @@ def SGC_ASSEMBLY_DETECTION(ACTIVITY_RASTER_file):
             print('>> END PROGRAM', file=sys.stderr);
 
 
-def calcium_fluorescence_preprocessing(CALCIUM_FLUORESCENCE_file, standard_deviations_threshold=PREPROCESSING_PARAMETERS['standard_deviations_threshold'], shuffling_rounds=PREPROCESSING_PARAMETERS['shuffling_rounds'], coactivity_significance_level=PREPROCESSING_PARAMETERS['coactivity_significance_level']):
+def ACTIVITY_RASTER_PREPROCESSING(dF_F=None, activity_raster=None):
+
+    OUT = {}
+
+    if activity_raster is None:
+        activity_raster, activity_raster_peak_threshold, activity_raster_peaks = findSignificantDF_FCoactivity(dF_F);
+    else:
+        activity_raster = (np.asarray(activity_raster) > 0).astype('float');
+        activity_raster_peak_threshold, activity_raster_peaks = findSignificantActivityRasterCoactivity(activity_raster);
+
+    OUT['activity_raster'] = activity_raster;
+    OUT['activity_raster_peak_threshold'] = activity_raster_peak_threshold;
+    OUT['activity_raster_peaks'] = activity_raster_peaks;
+
+    return OUT
+
+def ASSEMBLY_PATTERN_DETECTION(ACTIVITY_RASTER):
+
+    OUT = {}
+
+    activity_patters = list(ACTIVITY_RASTER['activity_raster'][ACTIVITY_RASTER['activity_raster_peaks'].flatten(),:])
+
+    printConsoleSection('RUN ASSEMBLY PATTERN DETECTION');
+
+    OUT['assembly_pattern_detection'] = findAssemblyPatterns(activity_patters);
+
+    if OUT['assembly_pattern_detection'] is None:
+        OUT['assemblies'] = [];
+    else:
+        OUT['assemblies'] = [np.where(_ > 0)[0] for _ in OUT['assembly_pattern_detection']['assemblyActivityPatterns']];
+
+    return OUT
+
+
+def calcium_fluorescence_preprocessing(CALCIUM_FLUORESCENCE_file, standard_deviations_threshold=PREPROCESSING_PARAMETERS['standard_deviations_threshold'], shuffling_rounds=PREPROCESSING_PARAMETERS['shuffling_rounds'], coactivity_significance_level=PREPROCESSING_PARAMETERS['coactivity_significance_level'], shuffling_seed=PREPROCESSING_PARAMETERS['shuffling_seed'], shuffling_processes=PREPROCESSING_PARAMETERS['shuffling_processes']):
     PREPROCESSING_PARAMETERS['standard_deviations_threshold'] = standard_deviations_threshold
     PREPROCESSING_PARAMETERS['shuffling_rounds'] = shuffling_rounds
     PREPROCESSING_PARAMETERS['coactivity_significance_level'] = coactivity_significance_level
+    PREPROCESSING_PARAMETERS['shuffling_seed'] = shuffling_seed
+    PREPROCESSING_PARAMETERS['shuffling_processes'] = shuffling_processes
 
     CALCIUM_FLUORESCENCE_PROCESSING(CALCIUM_FLUORESCENCE_file)
 
-def assembly_detection(ACTIVITY_RASTER_file, montecarlo_rounds=DETECTION_PARAMETERS['montecarlo_rounds'], montecarlo_steps=DETECTION_PARAMETERS['montecarlo_steps'], affinity_threshold=DETECTION_PARAMETERS['affinity_threshold']):
+def assembly_detection(ACTIVITY_RASTER_file, montecarlo_rounds=DETECTION_PARAMETERS['montecarlo_rounds'], montecarlo_steps=DETECTION_PARAMETERS['montecarlo_steps'], affinity_threshold=DETECTION_PARAMETERS['affinity_threshold'], montecarlo_seed=DETECTION_PARAMETERS['montecarlo_seed'], montecarlo_processes=DETECTION_PARAMETERS['montecarlo_processes'], montecarlo_continue=DETECTION_PARAMETERS['montecarlo_continue'], montecarlo_tolerance=DETECTION_PARAMETERS['montecarlo_tolerance'], montecarlo_check_interval=DETECTION_PARAMETERS['montecarlo_check_interval'], clustering_replicates=DETECTION_PARAMETERS['clustering_replicates'], clustering_threads=DETECTION_PARAMETERS['clustering_threads']):
     DETECTION_PARAMETERS['montecarlo_rounds'] = montecarlo_rounds
     DETECTION_PARAMETERS['montecarlo_steps'] = montecarlo_steps
+    DETECTION_PARAMETERS['montecarlo_seed'] = montecarlo_seed
+    DETECTION_PARAMETERS['montecarlo_processes'] = montecarlo_processes
+    DETECTION_PARAMETERS['montecarlo_continue'] = montecarlo_continue
+    DETECTION_PARAMETERS['montecarlo_tolerance'] = montecarlo_tolerance
+    DETECTION_PARAMETERS['montecarlo_check_interval'] = montecarlo_check_interval
+    DETECTION_PARAMETERS['clustering_replicates'] = clustering_replicates
+    DETECTION_PARAMETERS['clustering_threads'] = clustering_threads
     DETECTION_PARAMETERS['affinity_threshold'] = affinity_threshold
 
     SGC_ASSEMBLY_DETECTION(ACTIVITY_RASTER_file)
 
+def calcium_fluorescence_preprocessing_array(dF_F, standard_deviations_threshold=PREPROCESSING_PARAMETERS['standard_deviations_threshold'], shuffling_rounds=PREPROCESSING_PARAMETERS['shuffling_rounds'], coactivity_significance_level=PREPROCESSING_PARAMETERS['coactivity_significance_level'], shuffling_seed=PREPROCESSING_PARAMETERS['shuffling_seed'], shuffling_processes=PREPROCESSING_PARAMETERS['shuffling_processes'], output_file=None):
+    """
+    CALCIUM_FLUORESCENCE_PREPROCESSING_ARRAY(dF_F, ..., output_file=None)
+    Transforms the dF/F-signal into a raster of binary activity patterns
+    without going through any file.
+
+       INPUT:
+       dF_F [TxN ndarray]: dF/F-signal for N units in T time steps
+       output_file [str]: (optional) `*_ACTIVITY-RASTER.mat`-file to save the
+       results to
+
+       OUTPUT:
+       output_args [dict]: activity_raster, activity_raster_peak_threshold
+       and activity_raster_peaks
+
+    """
+
+    PREPROCESSING_PARAMETERS['standard_deviations_threshold'] = standard_deviations_threshold
+    PREPROCESSING_PARAMETERS['shuffling_rounds'] = shuffling_rounds
+    PREPROCESSING_PARAMETERS['coactivity_significance_level'] = coactivity_significance_level
+    PREPROCESSING_PARAMETERS['shuffling_seed'] = shuffling_seed
+    PREPROCESSING_PARAMETERS['shuffling_processes'] = shuffling_processes
+
+    OUT = ACTIVITY_RASTER_PREPROCESSING(dF_F=np.asarray(dF_F, dtype='float'))
+
+    if output_file is not None:
+        save_ACTIVITY_RASTER_mat(output_file, copy.deepcopy(OUT))
+
+    return OUT
+
+def activity_raster_preprocessing_array(activity_raster, shuffling_rounds=PREPROCESSING_PARAMETERS['shuffling_rounds'], coactivity_significance_level=PREPROCESSING_PARAMETERS['coactivity_significance_level'], shuffling_seed=PREPROCESSING_PARAMETERS['shuffling_seed'], shuffling_processes=PREPROCESSING_PARAMETERS['shuffling_processes'], output_file=None):
+    """
+    ACTIVITY_RASTER_PREPROCESSING_ARRAY(activity_raster, ..., output_file=None)
+    Finds the significant coactivity peaks of an already binary raster.
+
+       INPUT:
+       activity_raster [TxN ndarray]: binary activity for N units in T time
+       steps
+       output_file [str]: (optional) `*_ACTIVITY-RASTER.mat`-file to save the
+       results to
+
+       OUTPUT:
+       output_args [dict]: activity_raster, activity_raster_peak_threshold
+       and activity_raster_peaks
+
+    """
+
+    PREPROCESSING_PARAMETERS['shuffling_rounds'] = shuffling_rounds
+    PREPROCESSING_PARAMETERS['coactivity_significance_level'] = coactivity_significance_level
+    PREPROCESSING_PARAMETERS['shuffling_seed'] = shuffling_seed
+    PREPROCESSING_PARAMETERS['shuffling_processes'] = shuffling_processes
+
+    OUT = ACTIVITY_RASTER_PREPROCESSING(activity_raster=activity_raster)
+
+    if output_file is not None:
+        save_ACTIVITY_RASTER_mat(output_file, copy.deepcopy(OUT))
+
+    return OUT
+
+def assembly_detection_array(ACTIVITY_RASTER, montecarlo_rounds=DETECTION_PARAMETERS['montecarlo_rounds'], montecarlo_steps=DETECTION_PARAMETERS['montecarlo_steps'], affinity_threshold=DETECTION_PARAMETERS['affinity_threshold'], montecarlo_seed=DETECTION_PARAMETERS['montecarlo_seed'], montecarlo_processes=DETECTION_PARAMETERS['montecarlo_processes'], montecarlo_tolerance=DETECTION_PARAMETERS['montecarlo_tolerance'], montecarlo_check_interval=DETECTION_PARAMETERS['montecarlo_check_interval'], clustering_replicates=DETECTION_PARAMETERS['clustering_replicates'], clustering_threads=DETECTION_PARAMETERS['clustering_threads'], output_file=None):
+    """
+    ASSEMBLY_DETECTION_ARRAY(ACTIVITY_RASTER, ..., output_file=None) Runs the
+    assembly detection on the output of the preprocessing without going
+    through any file.
+
+       INPUT:
+       ACTIVITY_RASTER [dict]: output of
+       CALCIUM_FLUORESCENCE_PREPROCESSING_ARRAY or
+       ACTIVITY_RASTER_PREPROCESSING_ARRAY
+       output_file [str]: (optional) `*_SGC-ASSEMBLIES.mat`-file to save the
+       results to
+
+       OUTPUT:
+       output_args [dict]: assembly_pattern_detection and assemblies, the
+       assembly_pattern_detection is None if there are no activity patterns
+
+    """
+
+    DETECTION_PARAMETERS['montecarlo_rounds'] = montecarlo_rounds
+    DETECTION_PARAMETERS['montecarlo_steps'] = montecarlo_steps
+    DETECTION_PARAMETERS['affinity_threshold'] = affinity_threshold
+    DETECTION_PARAMETERS['montecarlo_seed'] = montecarlo_seed
+    DETECTION_PARAMETERS['montecarlo_processes'] = montecarlo_processes
+    DETECTION_PARAMETERS['montecarlo_tolerance'] = montecarlo_tolerance
+    DETECTION_PARAMETERS['montecarlo_check_interval'] = montecarlo_check_interval
+    DETECTION_PARAMETERS['clustering_replicates'] = clustering_replicates
+    DETECTION_PARAMETERS['clustering_threads'] = clustering_threads
+
+    OUT = ASSEMBLY_PATTERN_DETECTION(ACTIVITY_RASTER)
+
+    if output_file is not None and OUT['assembly_pattern_detection'] is not None:
+        save_SGC_ASSEMBLIES_mat(output_file, copy.deepcopy(OUT))
+
+    return OUT
+
+
+# ********************************************************************************
+# Batch processing
+
+def fileContentHash(filename):
+    """
+    FILECONTENTHASH(filename) SHA-256 digest of the content of a file.
+
+       INPUT:
+       filename [str]: path of the file
+
+       OUTPUT:
+       output_args [str]: hexadecimal digest
+
+    """
+
+    __hash = hashlib.sha256();
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            __hash.update(block);
+
+    return __hash.hexdigest()
+
+def parametersHash(parameters):
+    """
+    PARAMETERSHASH(parameters) SHA-256 digest of the parameters of a step that
+    change its result, i.e. not of the number of processes or threads.
+
+       INPUT:
+       parameters [dict]: PREPROCESSING_PARAMETERS or DETECTION_PARAMETERS
+
+       OUTPUT:
+       output_args [str]: hexadecimal digest
+
+    """
+
+    __parameters = {key: value for key, value in parameters.items() if key not in ('shuffling_processes', 'montecarlo_processes', 'montecarlo_continue', 'clustering_threads')};
+
+    return hashlib.sha256(json.dumps(__parameters, sort_keys=True).encode()).hexdigest()
+
+def findBatchInputFiles(input_paths):
+    """
+    FINDBATCHINPUTFILES(input_paths) Collects the `*_CALCIUM-FLUORESCENCE.mat`-
+    and `*_ACTIVITY-RASTER.mat`-files of a batch.
+
+       INPUT:
+       input_paths [list]: files, directories (searched recursively) or glob
+       patterns
+
+       OUTPUT:
+       input_files [list]: sorted absolute paths; an `*_ACTIVITY-RASTER.mat`-
+       file is left out if its `*_CALCIUM-FLUORESCENCE.mat`-file is part of
+       the batch, since the preprocessing of the latter produces it
+
+    """
+
+    __files = [];
+    for path in input_paths:
+        matches = sorted(glob.glob(path, recursive=True)) if glob.has_magic(path) else [path];
+        if len(matches) == 0:
+            print('No files match {:s}'.format(path), file=sys.stderr);
+
+        for match in matches:
+            if os.path.isdir(match):
+                for directory, _, names in os.walk(match):
+                    __files += [os.path.join(directory, name) for name in names if name.endswith(('_CALCIUM-FLUORESCENCE.mat', '_ACTIVITY-RASTER.mat'))];
+            elif match.endswith(('_CALCIUM-FLUORESCENCE.mat', '_ACTIVITY-RASTER.mat')):
+                __files.append(match);
+            else:
+                print('Skip {:s}, neither a `*_CALCIUM-FLUORESCENCE.mat`- nor an `*_ACTIVITY-RASTER.mat`-file'.format(match), file=sys.stderr);
+
+    input_files = set(os.path.abspath(_) for _ in __files);
+    input_files = sorted(_ for _ in input_files if not (_.endswith('_ACTIVITY-RASTER.mat') and _.replace('_ACTIVITY-RASTER.mat', '_CALCIUM-FLUORESCENCE.mat') in input_files));
+
+    return input_files
+
+def runBatchFile(input_file, preprocessing_parameters, detection_parameters, previous_records=None):
+    """
+    RUNBATCHFILE(input_file, preprocessing_parameters, detection_parameters,
+    previous_records=None) Runs the preprocessing of an
+    `*_CALCIUM-FLUORESCENCE.mat`-file and the assembly detection of the
+    resulting (or a given) `*_ACTIVITY-RASTER.mat`-file. A step is skipped if
+    its previous record has the same input content and parameters and its
+    output file has not changed since.
+
+       INPUT:
+       input_file [str]: `*_CALCIUM-FLUORESCENCE.mat`- or
+       `*_ACTIVITY-RASTER.mat`-file
+       preprocessing_parameters [dict]: PREPROCESSING_PARAMETERS to use
+       detection_parameters [dict]: DETECTION_PARAMETERS to use
+       previous_records [dict]: (optional) summary records of the previous
+       batch for this file by step
+
+       OUTPUT:
+       records [list]: summary records of the steps; a failed step ends the
+       list and its record holds the traceback as 'error'
+
+    """
+
+    PREPROCESSING_PARAMETERS.update(preprocessing_parameters);
+    DETECTION_PARAMETERS.update(detection_parameters);
+
+    if previous_records is None:
+        previous_records = {};
+
+    steps = [];
+    if input_file.endswith('_CALCIUM-FLUORESCENCE.mat'):
+        ACTIVITY_RASTER_file = input_file.replace('_CALCIUM-FLUORESCENCE.mat', '_ACTIVITY-RASTER.mat');
+        steps.append(('preprocessing', input_file, ACTIVITY_RASTER_file, PREPROCESSING_PARAMETERS));
+    else:
+        ACTIVITY_RASTER_file = input_file;
+    steps.append(('detection', ACTIVITY_RASTER_file, ACTIVITY_RASTER_file.replace('_ACTIVITY-RASTER.mat', '_SGC-ASSEMBLIES.mat'), DETECTION_PARAMETERS));
+
+    records = [];
+    for step, step_input_file, step_output_file, parameters in steps:
+
+        record = dict.fromkeys(BATCH_SUMMARY_FIELDS, '');
+        record.update({'file': input_file, 'step': step, 'output_file': step_output_file});
+
+        timer = runtimer();
+        timer.tic();
+        try:
+            record['input_sha256'] = fileContentHash(step_input_file);
+            record['parameters_sha256'] = parametersHash(parameters);
+
+            # \_ Skip the step if neither its input nor its output changed
+            previous = previous_records.get(step);
+            if previous is not None and previous['status'] in ('done', 'skipped') and previous['input_sha256'] == record['input_sha256'] and previous['parameters_sha256'] == record['parameters_sha256']:
+                if previous['output_sha256'] == '' or (os.path.isfile(step_output_file) and fileContentHash(step_output_file) == previous['output_sha256']):
+                    timer.toc();
+                    records.append(dict(previous, status='skipped'));
+                    continue;
+
+            if step == 'preprocessing':
+                CALCIUM_FLUORESCENCE_mat = load_CALCIUM_FLUORESCENCE_mat(step_input_file);
+                OUT = ACTIVITY_RASTER_PREPROCESSING(dF_F=CALCIUM_FLUORESCENCE_mat['calcium_fluorescence']['dF_F']);
+                record['activity_patterns'] = len(OUT['activity_raster_peaks']);
+
+                save_ACTIVITY_RASTER_mat(step_output_file, copy.deepcopy(OUT));
+                record['output_sha256'] = fileContentHash(step_output_file);
+            else:
+                ACTIVITY_RASTER_mat = load_ACTIVITY_RASTER_mat(step_input_file);
+                record['activity_patterns'] = np.size(ACTIVITY_RASTER_mat['activity_raster_peaks']);
+                OUT = ASSEMBLY_PATTERN_DETECTION(ACTIVITY_RASTER_mat);
+                record['assemblies'] = len(OUT['assemblies']);
+
+                # \_ Without any activity patterns there is nothing to save
+                if OUT['assembly_pattern_detection'] is not None:
+                    save_SGC_ASSEMBLIES_mat(step_output_file, copy.deepcopy(OUT));
+                    record['output_sha256'] = fileContentHash(step_output_file);
+
+            record['status'] = 'done';
+            record['runtime'] = timer.toc();
+            records.append(record);
+
+        except Exception:
+            record['status'] = 'failed';
+            record['runtime'] = timer.toc();
+            record['error'] = traceback.format_exc();
+            records.append(record);
+            break;
+
+    return records
+
+def load_SGC_BATCH_summary(filename):
+
+    with open(filename, 'r', newline='') as f:
+        records = list(csv.DictReader(f, delimiter='\t'));
+
+    return {(_['file'], _['step']): _ for _ in records}
+
+def save_SGC_BATCH_summary(filename, SGC_BATCH_summary):
+
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=BATCH_SUMMARY_FIELDS, delimiter='\t', extrasaction='ignore');
+        writer.writeheader();
+        for key in sorted(SGC_BATCH_summary):
+            record = dict(SGC_BATCH_summary[key]);
+            if isinstance(record['runtime'], float):
+                record['runtime'] = '{:.3f}'.format(record['runtime']);
+            writer.writerow(record);
+
+def SGC_BATCH_PROCESSING(input_paths, processes=None, summary_file=BATCH_SUMMARY_FILE):
+
+    printConsoleSection('BATCH PROCESSING');
+
+    input_files = findBatchInputFiles(input_paths);
+    summary = load_SGC_BATCH_summary(summary_file) if os.path.isfile(summary_file) else {};
+
+    if processes is None:
+        processes = os.cpu_count() or 1;
+    processes = max(1, min(processes, len(input_files)));
+
+    print('Process {:d} files in {:d} processes ...'.format(len(input_files), processes), file=sys.stdout);
+    print('', file=sys.stdout);
+
+    # \_ The files already run in parallel, so unless they are given each file
+    # runs its shuffling, Monte Carlo rounds and k-means in a single process
+    preprocessing_parameters = dict(PREPROCESSING_PARAMETERS);
+    detection_parameters = dict(DETECTION_PARAMETERS);
+    if processes > 1:
+        for parameters, key in [(preprocessing_parameters, 'shuffling_processes'), (detection_parameters, 'montecarlo_processes'), (detection_parameters, 'clustering_threads')]:
+            if parameters[key] is None:
+                parameters[key] = 1;
+
+    def previous_records(input_file):
+        return {step: summary[(input_file, step)] for step in ['preprocessing', 'detection'] if (input_file, step) in summary};
+
+    def collect(records):
+        for record in records:
+            summary[(record['file'], record['step'])] = record;
+            print(' {:s} [{:s}]: {:s}{:s}'.format(record['file'], record['step'], record['status'], '' if record['status'] == 'skipped' else ' ' + print_timeinterval(float(record['runtime']))), file=sys.stdout);
+            if record['status'] == 'failed':
+                print(record['error'], file=sys.stderr);
+        save_SGC_BATCH_summary(summary_file, summary);
+        return records;
+
+    timer = runtimer();
+    timer.tic();
+
+    records = [];
+    if processes == 1:
+        for input_file in input_files:
+            records += collect(runBatchFile(input_file, preprocessing_parameters, detection_parameters, previous_records(input_file)));
+    else:
+        context = multiprocessing.get_context('forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn');
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=context) as executor:
+            futures = {executor.submit(runBatchFile, input_file, preprocessing_parameters, detection_parameters, previous_records(input_file)): input_file for input_file in input_files};
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    __records = future.result();
+                except Exception:
+                    __records = [dict(dict.fromkeys(BATCH_SUMMARY_FIELDS, ''), file=futures[future], step='', status='failed', runtime=0., error=traceback.format_exc())];
+                records += collect(__records);
+
+    print('', file=sys.stdout);
+    print('Batch processing completed: {:d} done, {:d} skipped, {:d} failed in {:s}'.format(*[sum(_['status'] == status for _ in records) for status in ['done', 'skipped', 'failed']], print_timeinterval(timer.toc())), file=sys.stdout);
+    print('Summary written to {:s}'.format(summary_file), file=sys.stdout);
+
+    return records
+
+def batch_processing(input_paths, processes=None, summary_file=BATCH_SUMMARY_FILE):
+    """
+    BATCH_PROCESSING(input_paths, processes=None, summary_file='SGC-BATCH.tsv')
+    Runs the preprocessing and the assembly detection of many files in a pool
+    of processes, with the current PREPROCESSING_PARAMETERS and
+    DETECTION_PARAMETERS. Steps whose input, parameters and output did not
+    change since the last batch with the same summary file are skipped.
+
+       INPUT:
+       input_paths [list]: `*_CALCIUM-FLUORESCENCE.mat`- or
+       `*_ACTIVITY-RASTER.mat`-files, directories (searched recursively) or
+       glob patterns
+       processes [int]: (optional) number of files processed in parallel; up
+       to the number of CPUs if not given
+       summary_file [str]: (optional) tab-separated table of the runtimes,
+       number of activity patterns and assemblies and content hashes of every
+       step
+
+       OUTPUT:
+       records [list]: summary records of the steps of this batch
+
+    """
+
+    if isinstance(input_paths, str):
+        input_paths = [input_paths];
+
+    return SGC_BATCH_PROCESSING(input_paths, processes=processes, summary_file=summary_file)
+
 
 if __name__ == "__main__":
     # ********************************************************************************
@@ -1327,12 +2320,18 @@ if __name__ == "__main__":
         description='Assembly detection interface of the Similarity-Graph-Clustering (SGC) algorithm. Successfully running the detection requires having performed some preprocessing.',
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
+    __subparser['batch'] = __subparsers.add_parser('batch',
+        description='Batch interface of the Similarity-Graph-Clustering (SGC) algorithm that runs the preprocessing of every `*_CALCIUM-FLUORESCENCE.mat`-file and the assembly detection of every resulting or given `*_ACTIVITY-RASTER.mat`-file in a pool of processes. Steps whose input, parameters and output did not change since the last batch are skipped, and a table of the runtimes and number of assemblies is written.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
 
     # *** 'preprocessing' ***
 
     __subparser['preprocessing'].add_argument('input-file', type=str, metavar='<file name>', help='`*_CALCIUM-FLUORESCENCE.mat`-file')
     __subparser['preprocessing'].add_argument('-S', '--standard-deviations-threshold', dest='standard_deviations_threshold', type=float, default=PREPROCESSING_PARAMETERS['standard_deviations_threshold'], metavar='<float>', help='standard deviation threshold for activity')
     __subparser['preprocessing'].add_argument('-r', '--shuffling-rounds', dest='shuffling_rounds', type=int, default=PREPROCESSING_PARAMETERS['shuffling_rounds'], metavar='<int>', help='number of shuffling round to generate a coactivity null model')
+    __subparser['preprocessing'].add_argument('--shuffling-seed', dest='shuffling_seed', type=int, default=PREPROCESSING_PARAMETERS['shuffling_seed'], metavar='<int>', help='seed of the shuffling rounds; random if not given')
+    __subparser['preprocessing'].add_argument('-j', '--shuffling-processes', dest='shuffling_processes', type=int, default=PREPROCESSING_PARAMETERS['shuffling_processes'], metavar='<int>', help='number of processes to run the shuffling rounds in parallel; up to the number of CPUs if not given')
     __subparser['preprocessing'].add_argument('-p', '--coactivity-significance-level', dest='coactivity_significance_level', type=float, default=PREPROCESSING_PARAMETERS['coactivity_significance_level'], metavar='<float>', help='significance level for coactivity')
 
     # *** 'detection' ***
@@ -1340,8 +2339,35 @@ if __name__ == "__main__":
     __subparser['detection'].add_argument('input-file', type=str, metavar='<file name>', help='`*_ACTIVITY-RASTER.mat`-file')
     __subparser['detection'].add_argument('-r', '--montecarlo-rounds', dest='montecarlo_rounds', type=int, default=DETECTION_PARAMETERS['montecarlo_rounds'], metavar='<int>', help='number of indepedent Monte Carlo rounds to estimate the number of assemblies')
     __subparser['detection'].add_argument('-s', '--montecarlo-steps', dest='montecarlo_steps', type=int, default=DETECTION_PARAMETERS['montecarlo_steps'], metavar='<int>', help='number of steps in each indepedent Monte Carlo round')
+    __subparser['detection'].add_argument('--montecarlo-seed', dest='montecarlo_seed', type=int, default=DETECTION_PARAMETERS['montecarlo_seed'], metavar='<int>', help='master seed from which the seeds of the Monte Carlo rounds are derived; random if not given')
+    __subparser['detection'].add_argument('-j', '--montecarlo-processes', dest='montecarlo_processes', type=int, default=DETECTION_PARAMETERS['montecarlo_processes'], metavar='<int>', help='number of processes to run the Monte Carlo rounds in parallel; one per round up to the number of CPUs if not given')
+    __subparser['detection'].add_argument('-t', '--montecarlo-tolerance', dest='montecarlo_tolerance', type=float, default=DETECTION_PARAMETERS['montecarlo_tolerance'], metavar='<float>', help='stop the Monte Carlo rounds early once the split-R-hat of the number of assemblies of every round is at most 1 + this and its effective sample size at least 100 (default: {:g}); 0 to always run all steps'.format(DETECTION_PARAMETERS['montecarlo_tolerance']))
+    __subparser['detection'].add_argument('--montecarlo-check-interval', dest='montecarlo_check_interval', type=int, default=DETECTION_PARAMETERS['montecarlo_check_interval'], metavar='<int>', help='number of Monte Carlo steps between convergence checks')
+    __subparser['detection'].add_argument('-c', '--continue', dest='montecarlo_continue', action='store_true', help='if the `*_SGC-ASSEMBLIES.mat`-file exists, continue its Monte Carlo rounds for another --montecarlo-steps steps and start new rounds up to --montecarlo-rounds instead of only redoing the assembly inference')
+    __subparser['detection'].add_argument('--clustering-replicates', dest='clustering_replicates', type=int, default=DETECTION_PARAMETERS['clustering_replicates'], metavar='<int>', help='number of k-means runs with different initial centroids in the spectral clustering of the activity patterns')
+    __subparser['detection'].add_argument('--clustering-threads', dest='clustering_threads', type=int, default=DETECTION_PARAMETERS['clustering_threads'], metavar='<int>', help='number of threads of the k-means runs; all CPUs if not given')
     __subparser['detection'].add_argument('-A', '--assembly-affinity-threshold', dest='affinity_threshold', type=float, default=DETECTION_PARAMETERS['affinity_threshold'], metavar='<float>', help='affinity threshold in the assembly construction')
 
+    # *** 'batch' ***
+
+    __subparser['batch'].add_argument('input-paths', type=str, nargs='+', metavar='<path>', help='`*_CALCIUM-FLUORESCENCE.mat`- or `*_ACTIVITY-RASTER.mat`-files, directories (searched recursively) or glob patterns')
+    __subparser['batch'].add_argument('-j', '--processes', dest='processes', type=int, default=None, metavar='<int>', help='number of files processed in parallel; up to the number of CPUs if not given')
+    __subparser['batch'].add_argument('-o', '--summary-file', dest='summary_file', type=str, default=BATCH_SUMMARY_FILE, metavar='<file name>', help='tab-separated table of the runtimes, number of activity patterns and assemblies and content hashes of every step; steps it lists as finished with the same input, parameters and output are skipped')
+    __subparser['batch'].add_argument('--standard-deviations-threshold', dest='standard_deviations_threshold', type=float, default=PREPROCESSING_PARAMETERS['standard_deviations_threshold'], metavar='<float>', help='standard deviation threshold for activity')
+    __subparser['batch'].add_argument('--shuffling-rounds', dest='shuffling_rounds', type=int, default=PREPROCESSING_PARAMETERS['shuffling_rounds'], metavar='<int>', help='number of shuffling round to generate a coactivity null model')
+    __subparser['batch'].add_argument('--shuffling-seed', dest='shuffling_seed', type=int, default=PREPROCESSING_PARAMETERS['shuffling_seed'], metavar='<int>', help='seed of the shuffling rounds; random if not given')
+    __subparser['batch'].add_argument('--shuffling-processes', dest='shuffling_processes', type=int, default=PREPROCESSING_PARAMETERS['shuffling_processes'], metavar='<int>', help='number of processes to run the shuffling rounds of a file in parallel; one if several files are processed in parallel and up to the number of CPUs otherwise if not given')
+    __subparser['batch'].add_argument('--coactivity-significance-level', dest='coactivity_significance_level', type=float, default=PREPROCESSING_PARAMETERS['coactivity_significance_level'], metavar='<float>', help='significance level for coactivity')
+    __subparser['batch'].add_argument('--montecarlo-rounds', dest='montecarlo_rounds', type=int, default=DETECTION_PARAMETERS['montecarlo_rounds'], metavar='<int>', help='number of indepedent Monte Carlo rounds to estimate the number of assemblies')
+    __subparser['batch'].add_argument('--montecarlo-steps', dest='montecarlo_steps', type=int, default=DETECTION_PARAMETERS['montecarlo_steps'], metavar='<int>', help='number of steps in each indepedent Monte Carlo round')
+    __subparser['batch'].add_argument('--montecarlo-seed', dest='montecarlo_seed', type=int, default=DETECTION_PARAMETERS['montecarlo_seed'], metavar='<int>', help='master seed from which the seeds of the Monte Carlo rounds are derived; random if not given')
+    __subparser['batch'].add_argument('--montecarlo-processes', dest='montecarlo_processes', type=int, default=DETECTION_PARAMETERS['montecarlo_processes'], metavar='<int>', help='number of processes to run the Monte Carlo rounds of a file in parallel; one if several files are processed in parallel and one per round up to the number of CPUs otherwise if not given')
+    __subparser['batch'].add_argument('--montecarlo-tolerance', dest='montecarlo_tolerance', type=float, default=DETECTION_PARAMETERS['montecarlo_tolerance'], metavar='<float>', help='stop the Monte Carlo rounds early once the split-R-hat of the number of assemblies of every round is at most 1 + this and its effective sample size at least 100 (default: {:g}); 0 to always run all steps'.format(DETECTION_PARAMETERS['montecarlo_tolerance']))
+    __subparser['batch'].add_argument('--montecarlo-check-interval', dest='montecarlo_check_interval', type=int, default=DETECTION_PARAMETERS['montecarlo_check_interval'], metavar='<int>', help='number of Monte Carlo steps between convergence checks')
+    __subparser['batch'].add_argument('--clustering-replicates', dest='clustering_replicates', type=int, default=DETECTION_PARAMETERS['clustering_replicates'], metavar='<int>', help='number of k-means runs with different initial centroids in the spectral clustering of the activity patterns')
+    __subparser['batch'].add_argument('--clustering-threads', dest='clustering_threads', type=int, default=DETECTION_PARAMETERS['clustering_threads'], metavar='<int>', help='number of threads of the k-means runs; one if several files are processed in parallel and all CPUs otherwise if not given')
+    __subparser['batch'].add_argument('--assembly-affinity-threshold', dest='affinity_threshold', type=float, default=DETECTION_PARAMETERS['affinity_threshold'], metavar='<float>', help='affinity threshold in the assembly construction')
+
     kwargs = vars(__parser.parse_args())
     
     # ********************************************************************************
@@ -1359,19 +2385,33 @@ if __name__ == "__main__":
         DETECTION_PARAMETERS = dict(DETECTION_PARAMETERS, **kwargs)
         pass
 
+    if __parser_subcommand == 'batch':
+        __input_paths = kwargs.pop('input-paths')
+        __processes = kwargs.pop('processes')
+        __summary_file = kwargs.pop('summary_file')
+        PREPROCESSING_PARAMETERS.update({key: value for key, value in kwargs.items() if key in PREPROCESSING_PARAMETERS})
+        DETECTION_PARAMETERS.update({key: value for key, value in kwargs.items() if key in DETECTION_PARAMETERS})
+        pass
+
     # ********************************************************************************
     # Execute main function
     
     SCRIPT_END_INDICATOR = True
     
+    __exit_code = 0
+    
     try:
         if __parser_subcommand == 'detection':
             SGC_ASSEMBLY_DETECTION(__input_file)
         elif __parser_subcommand == 'preprocessing':
             CALCIUM_FLUORESCENCE_PROCESSING(__input_file)
+        elif __parser_subcommand == 'batch':
+            __records = SGC_BATCH_PROCESSING(__input_paths, processes=__processes, summary_file=__summary_file)
+            if any(_['status'] == 'failed' for _ in __records):
+                __exit_code = 1
             
     except:
         print(traceback.format_exc(), file=sys.stderr)
         sys.exit(1)
 
-    sys.exit(0)
+    sys.exit(__exit_code)
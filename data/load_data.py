@@ -4,7 +4,10 @@ from PyQt6.QtGui import QStandardItemModel, QStandardItem
 import numpy as np
 import scipy.io
 import csv
-import matlab
+try:
+    import matlab
+except ImportError:
+    matlab = None
 
 class FileTreeItem:
     def __init__(self, name, obj, mdl_type, parent=None):
@@ -45,10 +48,10 @@ class FileTreeItem:
                 # This is an array or matrix.
                 self.obj_type = "PythonList"
                 self.obj_size = len(obj)
-            elif isinstance(obj, matlab.double):
+            elif matlab is not None and isinstance(obj, matlab.double):
                 self.obj_type = "MatlabDouble"
                 self.obj_size = -1
-            elif isinstance(obj, matlab.logical):
+            elif matlab is not None and isinstance(obj, matlab.logical):
                 self.obj_type = "MatlabLogical"
                 self.obj_size = -1 
             elif isinstance(obj, str):
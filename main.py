@@ -24,10 +24,20 @@ from data.assign_data import assign_data_from_file
 import utils.metrics as metrics
 
 from gui.MatplotlibWidget import MatplotlibWidget
+from utils.matlab_engines import MatlabEnginePool
+from utils.matlab_data import put_raster, clear_variables
+from utils.svd_ensembles import stoixeion
+from utils.pca_ensembles import raster2ens_by_density
+from utils.ica_assemblies import zscore_rows, assembly_patterns, assembly_activity
+from utils.xsembles import get_xsembles
 
 import matplotlib.pyplot as plt
 
-import matlab.engine
+try:
+    import matlab.engine
+    MATLAB_AVAILABLE = True
+except ImportError:
+    MATLAB_AVAILABLE = False
 
 class WorkerSignals(QObject):
     result_ready = pyqtSignal(object)  # Signal to emit the result
@@ -61,6 +71,10 @@ class MainWindow(QMainWindow):
         }
 
         self.threadpool = QThreadPool()
+        # Warm MATLAB engines shared by all the algorithms
+        self.engine_pool = MatlabEnginePool(size=1, max_size=4)
+        if MATLAB_AVAILABLE:
+            self.engine_pool.start()
 
         # Initialize the GUI
         self.reset_gui()
@@ -113,7 +127,8 @@ class MainWindow(QMainWindow):
             'csi_step': 0.01,
             'csi_end': 0.1,
             'tf_idf_norm': True,
-            'parallel_processing': False
+            'parallel_processing': False,
+            'python_engine': False
         }
         self.svd_defaults = defaults
         defaults = {
@@ -124,7 +139,8 @@ class MainWindow(QMainWindow):
             'prct': 99.9,
             'cent_thr': 99.9,
             'inner_corr': 5,
-            'minsize': 3
+            'minsize': 3,
+            'python_engine': False
         }
         self.pca_defaults = defaults
         defaults = {
@@ -136,7 +152,8 @@ class MainWindow(QMainWindow):
             'Patterns': {
                 'method': 'ICA',
                 'number_of_iterations': 500
-            }
+            },
+            'python_engine': False
         }
         self.ica_defaults = defaults
         defaults = {
@@ -149,9 +166,18 @@ class MainWindow(QMainWindow):
             'clustering_fixed': 0,
             'iterations_ensemble': 1000,
             'parallel_processing': False,
-            'file_log': ''
+            'file_log': '',
+            'python_engine': False
         }
         self.x2p_defaults = defaults
+        defaults = {
+            'shuffling_rounds': 1000,
+            'coactivity_significance_level': 0.05,
+            'montecarlo_rounds': 5,
+            'montecarlo_steps': 50000,
+            'affinity_threshold': 0.2
+        }
+        self.sgc_defaults = defaults
 
         ## Numeric validator
         double_validator = QDoubleValidator()
@@ -186,6 +212,23 @@ class MainWindow(QMainWindow):
         self.x2p_edit_rangeend.setValidator(double_validator)
         self.x2p_edit_fixed.setValidator(double_validator)
         self.x2p_edit_itensemble.setValidator(double_validator)
+        # For SGC analysis
+        self.sgc_edit_shuffling.setValidator(double_validator)
+        self.sgc_edit_significance.setValidator(double_validator)
+        self.sgc_edit_mcrounds.setValidator(double_validator)
+        self.sgc_edit_mcsteps.setValidator(double_validator)
+        self.sgc_edit_affinity.setValidator(double_validator)
+
+        ## Without MATLAB only the Python engines can run
+        if not MATLAB_AVAILABLE:
+            self.svd_check_python.setChecked(True)
+            self.svd_check_python.setEnabled(False)
+            self.pca_check_python.setChecked(True)
+            self.pca_check_python.setEnabled(False)
+            self.ica_check_python.setChecked(True)
+            self.ica_check_python.setEnabled(False)
+            self.x2p_check_python.setChecked(True)
+            self.x2p_check_python.setEnabled(False)
 
         ## SVD analysis
         self.svd_btn_defaults.clicked.connect(self.load_defaults_svd)
@@ -199,6 +242,9 @@ class MainWindow(QMainWindow):
         ## X2P analysis
         self.x2p_btn_defaults.clicked.connect(self.load_defaults_x2p)
         self.btn_run_x2p.clicked.connect(self.run_x2p)
+        ## SGC analysis
+        self.sgc_btn_defaults.clicked.connect(self.load_defaults_sgc)
+        self.btn_run_sgc.clicked.connect(self.run_sgc)
 
         ## Ensembles visualizer
         self.ensvis_tabs.currentChanged.connect(self.ensvis_tabchange)
@@ -206,6 +252,7 @@ class MainWindow(QMainWindow):
         self.ensvis_btn_pca.clicked.connect(self.vis_ensembles_pca)
         self.ensvis_btn_ica.clicked.connect(self.vis_ensembles_ica)
         self.ensvis_btn_x2p.clicked.connect(self.vis_ensembles_x2p)
+        self.ensvis_btn_sgc.clicked.connect(self.vis_ensembles_sgc)
         self.envis_slide_selectedens.valueChanged.connect(self.update_ensemble_visualization)
         self.ensvis_check_onlyens.stateChanged.connect(self.update_ens_vis_coords)
         self.ensvis_check_onlycont.stateChanged.connect(self.update_ens_vis_coords)
@@ -216,6 +263,7 @@ class MainWindow(QMainWindow):
         self.enscomp_slider_pca.valueChanged.connect(self.ensembles_compare_update_ensembles)
         self.enscomp_slider_ica.valueChanged.connect(self.ensembles_compare_update_ensembles)
         self.enscomp_slider_x2p.valueChanged.connect(self.ensembles_compare_update_ensembles)
+        self.enscomp_slider_sgc.valueChanged.connect(self.ensembles_compare_update_ensembles)
         #self.enscomp_slider_stim.connect(self.ensembles_compare_update_ensembles)
 
         self.enscomp_visopts_setneusize.clicked.connect(self.ensembles_compare_update_ensembles)
@@ -261,6 +309,7 @@ class MainWindow(QMainWindow):
         self.performance_check_pca.stateChanged.connect(self.performance_check_change)
         self.performance_check_ica.stateChanged.connect(self.performance_check_change)
         self.performance_check_x2p.stateChanged.connect(self.performance_check_change)
+        self.performance_check_sgc.stateChanged.connect(self.performance_check_change)
         self.performance_btn_compare.clicked.connect(self.performance_compare)
 
         # Saving
@@ -268,6 +317,10 @@ class MainWindow(QMainWindow):
         self.save_btn_pkl.clicked.connect(self.save_results_pkl)
         self.save_btn_mat.clicked.connect(self.save_results_mat)
         
+    def closeEvent(self, event):
+        self.engine_pool.shutdown()
+        super().closeEvent(event)
+
     def update_console_log(self, message, msg_type="log"):
         color_map = {"log": "#000000", "error": "#da1e28", "warning": "#ff832b", "complete": "#198038"}
         current_date_time = QDateTime.currentDateTime().toString(Qt.DateFormat.ISODateWithMs)
@@ -294,6 +347,7 @@ class MainWindow(QMainWindow):
         self.btn_run_pca.setEnabled(False)
         self.btn_run_ica.setEnabled(False)
         self.btn_run_x2p.setEnabled(False)
+        self.btn_run_sgc.setEnabled(False)
 
         self.ensvis_btn_svd.setEnabled(False)
         self.ensvis_btn_pca.setEnabled(False)
@@ -360,6 +414,12 @@ class MainWindow(QMainWindow):
         self.findChild(MatplotlibWidget, 'x2p_plot_onsemneu').reset(default_txt)
         self.findChild(MatplotlibWidget, 'x2p_plot_offsemneu').reset(default_txt)
 
+        default_txt = "Perform the SGC analysis to see results"
+        self.findChild(MatplotlibWidget, 'sgc_plot_similarity').reset(default_txt)
+        self.findChild(MatplotlibWidget, 'sgc_plot_patterns').reset(default_txt)
+        self.findChild(MatplotlibWidget, 'sgc_plot_timecourse').reset(default_txt)
+        self.findChild(MatplotlibWidget, 'sgc_plot_cellsinens').reset(default_txt)
+
         self.ensvis_edit_numens.setText("")
         self.envis_slide_selectedens.setMaximum(2)
         self.envis_slide_selectedens.setValue(1)
@@ -387,6 +447,7 @@ class MainWindow(QMainWindow):
             "pca": {'enscomp_check_coords': True, 'enscomp_check_ens': True, 'enscomp_check_neus': False, 'color': 'blue', 'enabled': False},
             "ica": {'enscomp_check_coords': True, 'enscomp_check_ens': True, 'enscomp_check_neus': False, 'color': 'green', 'enabled': False},
             "x2p": {'enscomp_check_coords': True, 'enscomp_check_ens': True, 'enscomp_check_neus': False, 'color': 'orange', 'enabled': False},
+            "sgc": {'enscomp_check_coords': True, 'enscomp_check_ens': True, 'enscomp_check_neus': False, 'color': 'purple', 'enabled': False},
             "sim_neus": {'method': 'Jaccard', 'colormap': 'viridis'},
             "sim_time": {'method': 'Cosine', 'colormap': 'plasma'},
         }
@@ -449,6 +510,14 @@ class MainWindow(QMainWindow):
         self.enscomp_slider_x2p.setValue(1)
         self.enscomp_slider_lbl_min_x2p.setText("1")
         self.enscomp_slider_lbl_max_x2p.setText("1")
+        self.enscomp_slider_sgc.setEnabled(False)
+        self.enscomp_slider_lbl_min_sgc.setEnabled(False)
+        self.enscomp_slider_lbl_max_sgc.setEnabled(False)
+        self.enscomp_slider_sgc.setMinimum(1)
+        self.enscomp_slider_sgc.setMaximum(2)
+        self.enscomp_slider_sgc.setValue(1)
+        self.enscomp_slider_lbl_min_sgc.setText("1")
+        self.enscomp_slider_lbl_max_sgc.setText("1")
         if not hasattr(self, "data_stims"):
             self.enscomp_slider_stim.setEnabled(False)
             self.enscomp_slider_lbl_min_stim.setEnabled(False)
@@ -604,17 +673,19 @@ class MainWindow(QMainWindow):
 
     ## Identify the tab changes
     def main_tabs_change(self, index):
-        if index > 0 and index < 5: # Analysis tabs
+        if index > 0 and index < 6: # Analysis tabs
             if hasattr(self, "data_neuronal_activity"):
                 self.lbl_sdv_spikes_selected.setText(f"Loaded")
                 self.lbl_pca_spikes_selected.setText(f"Loaded")
                 self.lbl_ica_spikes_selected.setText(f"Loaded")
                 self.lbl_x2p_spikes_selected.setText(f"Loaded")
+                self.lbl_sgc_spikes_selected.setText(f"Loaded")
             else:
                 self.lbl_sdv_spikes_selected.setText(f"Nothing selected")
                 self.lbl_pca_spikes_selected.setText(f"Nothing selected")
                 self.lbl_ica_spikes_selected.setText(f"Nothing selected")
                 self.lbl_x2p_spikes_selected.setText(f"Nothing selected")
+                self.lbl_sgc_spikes_selected.setText(f"Nothing selected")
 
             # Validate data for SVD
             needed_data = ["data_neuronal_activity"]
@@ -631,7 +702,11 @@ class MainWindow(QMainWindow):
             # Validate needed data for x2p
             needed_data = ["data_neuronal_activity"]
             self.btn_run_x2p.setEnabled(self.validate_needed_data(needed_data))
-        if index == 6: #Ensembles compare tab
+
+            # Validate needed data for SGC
+            needed_data = ["data_neuronal_activity"]
+            self.btn_run_sgc.setEnabled(self.validate_needed_data(needed_data))
+        if index == 7: #Ensembles compare tab
             if len(self.results) > 0:
                 self.ensembles_compare_update_ensembles()
 
@@ -1123,16 +1198,14 @@ class MainWindow(QMainWindow):
         self.svd_edit_csiend.setText(f"{defaults['csi_end']}")
         self.svd_check_tfidf.setChecked(defaults['tf_idf_norm'])
         self.svd_check_parallel.setChecked(defaults['parallel_processing'])
+        if MATLAB_AVAILABLE:
+            self.svd_check_python.setChecked(defaults['python_engine'])
         self.update_console_log("Loaded default SVD parameter values", "complete")
     def run_svd(self):
         # Temporarly disable the button
         self.btn_run_svd.setEnabled(False)
         # Prepare data
-        data = self.data_neuronal_activity
-        spikes = matlab.double(data.tolist())
-        #Prepare dummy data
-        data = np.zeros((self.cant_neurons,2))
-        coords_foo = matlab.double(data.tolist())
+        spikes = self.data_neuronal_activity
 
         # Prepare parameters
         input_value = self.svd_edit_pks.text()
@@ -1171,6 +1244,7 @@ class MainWindow(QMainWindow):
             self.svd_edit_csiend.setText(f"{val_csiend}")
         val_idtfd = self.svd_check_tfidf.isChecked()
         parallel_computing = self.svd_check_parallel.isChecked()
+        python_engine = self.svd_check_python.isChecked()
 
         # Pack parameters
         pars = {
@@ -1182,10 +1256,11 @@ class MainWindow(QMainWindow):
             'csi_start': val_csistart,
             'csi_step': val_csistep,
             'csi_end': val_csiend,
-            'parallel_processing': parallel_computing
+            'parallel_processing': parallel_computing,
+            'python_engine': python_engine
         }
         self.params['svd'] = pars
-        pars_matlab = self.dict_to_matlab_struct(pars)
+        pars_matlab = None if python_engine else self.dict_to_matlab_struct(pars)
 
         # Clean all the figures in case there was something previously
         if 'svd' in self.results:
@@ -1197,31 +1272,58 @@ class MainWindow(QMainWindow):
         # Run the SVD in parallel
         self.update_console_log("Performing SVD...")
         self.update_console_log("Look in the Python console for additional logs.", "warning")
-        worker_svd = WorkerRunnable(self.run_svd_parallel, spikes, coords_foo, pars_matlab)
+        worker_svd = WorkerRunnable(self.run_svd_parallel, spikes, pars, pars_matlab)
         worker_svd.signals.result_ready.connect(self.run_svd_parallel_end)
         self.threadpool.start(worker_svd)
-    def run_svd_parallel(self, spikes, coords_foo, pars_matlab):
+    def run_svd_parallel(self, spikes, pars, pars_matlab):
         log_flag = "GUI SVD:"
-        print(f"{log_flag} Starting MATLAB engine...")
-        start_time = time.time()
-        eng = matlab.engine.start_matlab()
-        # Adding to path
-        relative_folder_path = 'analysis/SVD'
-        folder_path = os.path.abspath(relative_folder_path)
-        folder_path_with_subfolders = eng.genpath(folder_path)
-        eng.addpath(folder_path_with_subfolders, nargout=0)
-        end_time = time.time()
-        engine_time = end_time - start_time
-        print(f"{log_flag} Loaded MATLAB engine.")
-        start_time = time.time()
-        try:
-            answer = eng.Stoixeion(spikes, coords_foo, pars_matlab)
-        except:
-            print(f"{log_flag} An error occurred while excecuting the algorithm. Check console logs for more info.")
+        if pars['python_engine']:
+            # No engine nor data transfer are needed for the Python version
+            engine_time = 0
+            conversion_time = 0
+            print(f"{log_flag} Running the Python engine...")
+            start_time = time.time()
+            try:
+                answer = stoixeion(spikes, pars)
+            except Exception as error:
+                print(f"{log_flag} An error occurred while excecuting the algorithm: {error}")
+                answer = None
+            end_time = time.time()
+            algorithm_time = end_time - start_time
+            print(f"{log_flag} Done.")
+        else:
+            print(f"{log_flag} Acquiring MATLAB engine...")
+            start_time = time.time()
+            engine_time = 0
+            conversion_time = 0
+            algorithm_time = 0
             answer = None
-        end_time = time.time()
-        algorithm_time = end_time - start_time
-        print(f"{log_flag} Done.")
+            try:
+                # Leased so the engine goes back to the pool on any error
+                with self.engine_pool.lease('svd') as eng:
+                    end_time = time.time()
+                    engine_time = end_time - start_time
+                    print(f"{log_flag} Acquired MATLAB engine.")
+                    print(f"{log_flag} Sending data to MATLAB...")
+                    start_time = time.time()
+                    put_raster(eng, 'gui_spikes', spikes)
+                    eng.eval(f"gui_coords = zeros({spikes.shape[0]}, 2);", nargout=0)
+                    eng.workspace['gui_pars'] = pars_matlab
+                    end_time = time.time()
+                    conversion_time = end_time - start_time
+                    start_time = time.time()
+                    try:
+                        answer = eng.eval("Stoixeion(gui_spikes, gui_coords, gui_pars)", nargout=1)
+                    except:
+                        print(f"{log_flag} An error occurred while excecuting the algorithm. Check console logs for more info.")
+                        answer = None
+                    end_time = time.time()
+                    algorithm_time = end_time - start_time
+                    clear_variables(eng, 'gui_spikes', 'gui_coords', 'gui_pars')
+            except Exception as error:
+                print(f"{log_flag} An error occurred while running the algorithm in MATLAB: {error}")
+                answer = None
+            print(f"{log_flag} Done.")
         plot_times = 0
         if answer != None:
             self.algotrithm_results['svd'] = answer
@@ -1236,12 +1338,13 @@ class MainWindow(QMainWindow):
             end_time = time.time()
             plot_times = end_time - start_time
             print(f"{log_flag} Done plotting and saving...")
-        return [engine_time, algorithm_time, plot_times]
+        return [engine_time, conversion_time, algorithm_time, plot_times]
     def run_svd_parallel_end(self, times):
         self.update_console_log("Done executing the SVD algorithm", "complete") 
-        self.update_console_log(f"- Loading the engine took {times[0]:.2f} seconds") 
-        self.update_console_log(f"- Running the algorithm took {times[1]:.2f} seconds") 
-        self.update_console_log(f"- Plotting and saving results took {times[2]:.2f} seconds")
+        self.update_console_log(f"- Acquiring the engine took {times[0]:.2f} seconds") 
+        self.update_console_log(f"- Sending the data to MATLAB took {times[1]:.2f} seconds") 
+        self.update_console_log(f"- Running the algorithm took {times[2]:.2f} seconds") 
+        self.update_console_log(f"- Plotting and saving results took {times[3]:.2f} seconds")
         self.btn_run_svd.setEnabled(True)
     def plot_SVD_results(self, answer):
         # Similarity map
@@ -1314,13 +1417,14 @@ class MainWindow(QMainWindow):
         self.pca_edit_centthr.setText(f"{defaults['cent_thr']}")
         self.pca_edit_innercorr.setText(f"{defaults['inner_corr']}")
         self.pca_edit_minsize.setText(f"{defaults['minsize']}")
+        if MATLAB_AVAILABLE:
+            self.pca_check_python.setChecked(defaults['python_engine'])
         self.update_console_log("Loaded default PCA parameter values", "complete")
     def run_PCA(self):
         # Temporarly disable the button
         self.btn_run_pca.setEnabled(False)
         # Prepare data
-        data = self.data_neuronal_activity
-        raster = matlab.double(data.tolist())
+        raster = self.data_neuronal_activity
 
         # Prepare parameters
         input_value = self.pca_edit_dc.text()
@@ -1339,6 +1443,7 @@ class MainWindow(QMainWindow):
         inner_corr = float(input_value) if len(input_value) > 0 else self.pca_defaults['inner_corr']
         input_value = self.pca_edit_minsize.text()
         minsize = float(input_value) if len(input_value) > 0 else self.pca_defaults['minsize']
+        python_engine = self.pca_check_python.isChecked()
 
         # Pack data
         pars = {
@@ -1349,10 +1454,11 @@ class MainWindow(QMainWindow):
             'prct': prct,
             'cent_thr': cent_thr,
             'inner_corr': inner_corr,
-            'minsize': minsize
+            'minsize': minsize,
+            'python_engine': python_engine
         }
         self.params['pca'] = pars
-        pars_matlab = self.dict_to_matlab_struct(pars)
+        pars_matlab = None if python_engine else self.dict_to_matlab_struct(pars)
 
         # Clean all the figures in case there was something previously
         if 'pca' in self.results:
@@ -1368,26 +1474,52 @@ class MainWindow(QMainWindow):
         self.threadpool.start(worker_pca) 
     def run_pca_parallel(self, raster, pars_matlab, pars):
         log_flag = "GUI PCA:"
-        start_time = time.time()
-        print(f"{log_flag} Starting MATLAB engine...")
-        eng = matlab.engine.start_matlab()
-        # Adding to path
-        relative_folder_path = 'analysis/NeuralEnsembles'
-        folder_path = os.path.abspath(relative_folder_path)
-        folder_path_with_subfolders = eng.genpath(folder_path)
-        eng.addpath(folder_path_with_subfolders, nargout=0)
-        end_time = time.time()
-        engine_time = end_time - start_time
-        print(f"{log_flag} Loaded MATLAB engine.")
-        start_time = time.time()
-        try:
-            answer = eng.raster2ens_by_density(raster, pars_matlab)
-        except:
-            print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+        if pars['python_engine']:
+            # No engine nor data transfer are needed for the Python version
+            engine_time = 0
+            conversion_time = 0
+            print(f"{log_flag} Running the Python engine...")
+            start_time = time.time()
+            try:
+                answer = raster2ens_by_density(raster, pars)
+            except Exception as error:
+                print(f"{log_flag} An error occurred while excecuting the algorithm: {error}")
+                answer = None
+            end_time = time.time()
+            algorithm_time = end_time - start_time
+            print(f"{log_flag} Done.")
+        else:
+            print(f"{log_flag} Acquiring MATLAB engine...")
+            start_time = time.time()
+            engine_time = 0
+            conversion_time = 0
+            algorithm_time = 0
             answer = None
-        end_time = time.time()
-        algorithm_time = end_time - start_time
-        print(f"{log_flag} Done.")
+            try:
+                # Leased so the engine goes back to the pool on any error
+                with self.engine_pool.lease('pca') as eng:
+                    end_time = time.time()
+                    engine_time = end_time - start_time
+                    print(f"{log_flag} Acquired MATLAB engine.")
+                    print(f"{log_flag} Sending data to MATLAB...")
+                    start_time = time.time()
+                    put_raster(eng, 'gui_raster', raster)
+                    eng.workspace['gui_pars'] = pars_matlab
+                    end_time = time.time()
+                    conversion_time = end_time - start_time
+                    start_time = time.time()
+                    try:
+                        answer = eng.eval("raster2ens_by_density(gui_raster, gui_pars)", nargout=1)
+                    except:
+                        print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+                        answer = None
+                    end_time = time.time()
+                    algorithm_time = end_time - start_time
+                    clear_variables(eng, 'gui_raster', 'gui_pars')
+            except Exception as error:
+                print(f"{log_flag} An error occurred while running the algorithm in MATLAB: {error}")
+                answer = None
+            print(f"{log_flag} Done.")
         plot_times = 0
         # Plot the results
         if answer != None:
@@ -1410,12 +1542,13 @@ class MainWindow(QMainWindow):
             end_time = time.time()
             plot_times = end_time - start_time
             print(f"{log_flag} Done plotting and saving...")
-        return [engine_time, algorithm_time, plot_times]
+        return [engine_time, conversion_time, algorithm_time, plot_times]
     def run_pca_parallel_end(self, times):
         self.update_console_log("Done executing the PCA algorithm", "complete") 
-        self.update_console_log(f"- Loading the engine took {times[0]:.2f} seconds") 
-        self.update_console_log(f"- Running the algorithm took {times[1]:.2f} seconds") 
-        self.update_console_log(f"- Plotting and saving results took {times[2]:.2f} seconds")
+        self.update_console_log(f"- Acquiring the engine took {times[0]:.2f} seconds") 
+        self.update_console_log(f"- Sending the data to MATLAB took {times[1]:.2f} seconds") 
+        self.update_console_log(f"- Running the algorithm took {times[2]:.2f} seconds") 
+        self.update_console_log(f"- Plotting and saving results took {times[3]:.2f} seconds")
         self.btn_run_pca.setEnabled(True)
     def plot_PCA_results(self, pars, answer):
         ## Plot the eigs
@@ -1479,13 +1612,14 @@ class MainWindow(QMainWindow):
         self.ica_edit_percant.setText(f"{defaults['threshold']['number_of_permutations']}")
         self.ica_radio_method_ica.setChecked(True)
         self.ica_edit_iterations.setText(f"{defaults['Patterns']['number_of_iterations']}")
+        if MATLAB_AVAILABLE:
+            self.ica_check_python.setChecked(defaults['python_engine'])
         self.update_console_log("Loaded default ICA parameter values", "complete")
     def run_ICA(self):
         # Temporarly disable the button
         self.btn_run_ica.setEnabled(False)
         # Prepare data
-        data = self.data_neuronal_activity
-        spikes = matlab.double(data.tolist())
+        spikes = self.data_neuronal_activity
 
         # Prepare parameters
         if self.ica_radio_method_marcenko.isChecked():
@@ -1506,6 +1640,7 @@ class MainWindow(QMainWindow):
             patterns_method = "PCA"
         input_value = self.ica_edit_iterations.text()
         val_iteartions = float(input_value) if len(input_value) > 0 else self.ica_defaults['Patterns']['number_of_iterations']
+        python_engine = self.ica_check_python.isChecked()
 
         # Pack parameters
         pars = {
@@ -1517,10 +1652,11 @@ class MainWindow(QMainWindow):
             'Patterns': {
                 'method': patterns_method,
                 'number_of_iterations': val_iteartions
-            }
+            },
+            'python_engine': python_engine
         }
         self.params['ica'] = pars
-        pars_matlab = self.dict_to_matlab_struct(pars)
+        pars_matlab = None if python_engine else self.dict_to_matlab_struct(pars)
 
         # Clean all the figures in case there was something previously
         if 'ica' in self.results:
@@ -1531,45 +1667,87 @@ class MainWindow(QMainWindow):
 
         self.update_console_log("Performing ICA...")
         self.update_console_log("Look in the Python console for additional logs.", "warning")
-        worker_ica = WorkerRunnable(self.run_ica_parallel, spikes, pars_matlab)
+        worker_ica = WorkerRunnable(self.run_ica_parallel, spikes, pars_matlab, pars)
         worker_ica.signals.result_ready.connect(self.run_ica_parallel_end)
         self.threadpool.start(worker_ica)
-    def run_ica_parallel(self, spikes, pars_matlab):
+    def run_ica_parallel(self, spikes, pars_matlab, pars):
         log_flag = "GUI ICA:"
-        print(f"{log_flag} Starting MATLAB engine...")
-        start_time = time.time()
-        eng = matlab.engine.start_matlab()
-        # Adding to path
-        relative_folder_path = 'analysis/Cell-Assembly-Detection'
-        folder_path = os.path.abspath(relative_folder_path)
-        folder_path_with_subfolders = eng.genpath(folder_path)
-        eng.addpath(folder_path_with_subfolders, nargout=0)
-        end_time = time.time()
-        engine_time = end_time - start_time
-        print(f"{log_flag} Loaded MATLAB engine.")
-        print(f"{log_flag} Looking for patterns...")
-        start_time = time.time()
-        try:
-            answer = eng.assembly_patterns(spikes, pars_matlab)
-        except:
-            print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+        if pars['python_engine']:
+            # No engine nor data transfer are needed for the Python version
+            engine_time = 0
+            conversion_time = 0
+            print(f"{log_flag} Running the Python engine...")
+            print(f"{log_flag} Looking for patterns...")
+            start_time = time.time()
+            try:
+                # The z-scored activity is shared by both stages
+                z_spikes = zscore_rows(spikes)
+                answer = assembly_patterns(spikes, pars, z_spikes=z_spikes)
+                if answer['AssemblyTemplates'].shape[1] == 0:
+                    print(f"{log_flag} No assemblies were found.")
+                    answer = None
+            except Exception as error:
+                print(f"{log_flag} An error occurred while excecuting the algorithm: {error}")
+                answer = None
+            print(f"{log_flag} Done looking for patterns...")
+
+            if answer != None:
+                self.algotrithm_results['ica'] = {}
+                self.algotrithm_results['ica']['patterns'] = answer
+                assembly_templates = answer['AssemblyTemplates'].T
+                print(f"{log_flag} Looking for assembly activity...")
+                answer = assembly_activity(answer['AssemblyTemplates'], spikes, z_spikes=z_spikes)
+                print(f"{log_flag} Done looking for assembly activity...")
+            end_time = time.time()
+            algorithm_time = end_time - start_time
+            print(f"{log_flag} Done.")
+        else:
+            print(f"{log_flag} Acquiring MATLAB engine...")
+            start_time = time.time()
+            engine_time = 0
+            conversion_time = 0
+            algorithm_time = 0
             answer = None
-        print(f"{log_flag} Done looking for patterns...")
-
-        if answer != None:
-            self.algotrithm_results['ica'] = {}
-            self.algotrithm_results['ica']['patterns'] = answer
-            assembly_templates = np.array(answer['AssemblyTemplates']).T
-            print(f"{log_flag} Looking for assembly activity...")
             try:
-                answer = eng.assembly_activity(answer['AssemblyTemplates'],spikes)
-            except:
-                print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+                # Leased so the engine goes back to the pool on any error
+                with self.engine_pool.lease('ica') as eng:
+                    end_time = time.time()
+                    engine_time = end_time - start_time
+                    print(f"{log_flag} Acquired MATLAB engine.")
+                    print(f"{log_flag} Sending data to MATLAB...")
+                    start_time = time.time()
+                    put_raster(eng, 'gui_spikes', spikes)
+                    eng.workspace['gui_pars'] = pars_matlab
+                    end_time = time.time()
+                    conversion_time = end_time - start_time
+                    print(f"{log_flag} Looking for patterns...")
+                    start_time = time.time()
+                    try:
+                        eng.eval("gui_patterns = assembly_patterns(gui_spikes, gui_pars);", nargout=0)
+                        answer = eng.workspace['gui_patterns']
+                    except:
+                        print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+                        answer = None
+                    print(f"{log_flag} Done looking for patterns...")
+
+                    if answer != None:
+                        self.algotrithm_results['ica'] = {}
+                        self.algotrithm_results['ica']['patterns'] = answer
+                        assembly_templates = np.array(answer['AssemblyTemplates']).T
+                        print(f"{log_flag} Looking for assembly activity...")
+                        try:
+                            answer = eng.eval("assembly_activity(gui_patterns.AssemblyTemplates, gui_spikes)", nargout=1)
+                        except:
+                            print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+                            answer = None
+                        print(f"{log_flag} Done looking for assembly activity...")
+                    end_time = time.time()
+                    algorithm_time = end_time - start_time
+                    clear_variables(eng, 'gui_spikes', 'gui_pars', 'gui_patterns')
+            except Exception as error:
+                print(f"{log_flag} An error occurred while running the algorithm in MATLAB: {error}")
                 answer = None
-            print(f"{log_flag} Done looking for assembly activity...")
-        end_time = time.time()
-        algorithm_time = end_time - start_time
-        print(f"{log_flag} Done.")
+            print(f"{log_flag} Done.")
         plot_times = 0
         if answer != None:
             self.algotrithm_results['ica']['assembly_activity'] = answer
@@ -1606,12 +1784,13 @@ class MainWindow(QMainWindow):
             end_time = time.time()
             plot_times = end_time - start_time
             print(f"{log_flag} Done plotting and saving...")
-        return [engine_time, algorithm_time, plot_times]
+        return [engine_time, conversion_time, algorithm_time, plot_times]
     def run_ica_parallel_end(self, times):
         self.update_console_log("Done executing the ICA algorithm", "complete") 
-        self.update_console_log(f"- Loading the engine took {times[0]:.2f} seconds") 
-        self.update_console_log(f"- Running the algorithm took {times[1]:.2f} seconds") 
-        self.update_console_log(f"- Plotting and saving results took {times[2]:.2f} seconds")
+        self.update_console_log(f"- Acquiring the engine took {times[0]:.2f} seconds") 
+        self.update_console_log(f"- Sending the data to MATLAB took {times[1]:.2f} seconds") 
+        self.update_console_log(f"- Running the algorithm took {times[2]:.2f} seconds") 
+        self.update_console_log(f"- Plotting and saving results took {times[3]:.2f} seconds")
         self.btn_run_ica.setEnabled(True)
     def plot_ICA_results(self, answer):
         # Plot the assembly templates
@@ -1644,13 +1823,14 @@ class MainWindow(QMainWindow):
         self.x2p_edit_fixed.setText(f"{defaults['clustering_fixed']}")
         self.x2p_edit_itensemble.setText(f"{defaults['iterations_ensemble']}")
         self.x2p_check_parallel.setChecked(defaults['parallel_processing'])
+        if MATLAB_AVAILABLE:
+            self.x2p_check_python.setChecked(defaults['python_engine'])
         self.update_console_log("Loaded default Xsembles2P parameter values", "complete")
     def run_x2p(self):
         # Temporarly disable the button
         self.btn_run_x2p.setEnabled(False)
         # Prepare data
-        data = self.data_neuronal_activity
-        raster = matlab.logical(data.tolist())
+        raster = self.data_neuronal_activity
 
         # Prepare parameters
         input_value = self.x2p_edit_bin.text()
@@ -1665,13 +1845,13 @@ class MainWindow(QMainWindow):
         val_clustering_range_start = float(input_value) if len(input_value) > 0 else self.x2p_defaults['clustering_range_start']
         input_value = self.x2p_edit_rangeend.text()
         val_clustering_range_end = float(input_value) if len(input_value) > 0 else self.x2p_defaults['clustering_range_end']
-        val_clustering_range = range(int(val_clustering_range_start), int(val_clustering_range_end)+1)
-        val_clustering_range = matlab.double(val_clustering_range)
+        val_clustering_range = list(range(int(val_clustering_range_start), int(val_clustering_range_end)+1))
         input_value = self.x2p_edit_fixed.text()
         val_clustering_fixed = float(input_value) if len(input_value) > 0 else self.x2p_defaults['clustering_fixed']
         input_value = self.x2p_edit_itensemble.text()
         val_iterations_ensemble = float(input_value) if len(input_value) > 0 else self.x2p_defaults['iterations_ensemble']
-        parallel = matlab.logical(self.x2p_check_parallel.isChecked())
+        parallel = self.x2p_check_parallel.isChecked()
+        python_engine = self.x2p_check_python.isChecked()
 
         # Pack parameters
         pars = {
@@ -1683,10 +1863,18 @@ class MainWindow(QMainWindow):
             'ClusteringFixed': val_clustering_fixed,
             'EnsembleIterations': val_iterations_ensemble,
             'ParallelProcessing': parallel,
-            'FileLog': ''
+            'FileLog': '',
+            'python_engine': python_engine
         }
         self.params['x2p'] = pars
-        pars_matlab = self.dict_to_matlab_struct(pars)
+        if python_engine:
+            pars_matlab = None
+        else:
+            # Get_Xsembles parses the struct as name-value pairs, it needs the MATLAB types
+            # and no fields other than its parameters
+            pars_matlab = self.dict_to_matlab_struct({key: value for key, value in pars.items() if key != 'python_engine'})
+            pars_matlab['ClusteringRange'] = matlab.double(val_clustering_range)
+            pars_matlab['ParallelProcessing'] = matlab.logical(parallel)
 
         # Clean all the figures in case there was something previously
         if 'x2p' in self.results:
@@ -1697,31 +1885,57 @@ class MainWindow(QMainWindow):
 
         self.update_console_log("Performing Xsembles2P...")
         self.update_console_log("Look in the Python console for additional logs.", "warning")
-        worker_x2p = WorkerRunnable(self.run_x2p_parallel, raster, pars_matlab)
+        worker_x2p = WorkerRunnable(self.run_x2p_parallel, raster, pars_matlab, pars)
         worker_x2p.signals.result_ready.connect(self.run_x2p_parallel_end)
         self.threadpool.start(worker_x2p)
-    def run_x2p_parallel(self, raster, pars_matlab):
+    def run_x2p_parallel(self, raster, pars_matlab, pars):
         log_flag = "GUI X2P:"
-        print(f"{log_flag} Starting MATLAB engine...")
-        start_time = time.time()
-        eng = matlab.engine.start_matlab()
-        # Adding to path
-        relative_folder_path = 'analysis/Xsembles2P'
-        folder_path = os.path.abspath(relative_folder_path)
-        folder_path_with_subfolders = eng.genpath(folder_path)
-        eng.addpath(folder_path_with_subfolders, nargout=0)
-        end_time = time.time()
-        engine_time = end_time - start_time
-        print(f"{log_flag} Loaded MATLAB engine.")
-        start_time = time.time()
-        try:
-            answer = eng.Get_Xsembles(raster, pars_matlab)
-        except:
-            print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+        if pars['python_engine']:
+            # No engine nor data transfer are needed for the Python version
+            engine_time = 0
+            conversion_time = 0
+            print(f"{log_flag} Running the Python engine...")
+            start_time = time.time()
+            try:
+                answer = get_xsembles(raster, pars)
+            except Exception as error:
+                print(f"{log_flag} An error occurred while excecuting the algorithm: {error}")
+                answer = None
+            end_time = time.time()
+            algorithm_time = end_time - start_time
+            print(f"{log_flag} Done.")
+        else:
+            print(f"{log_flag} Acquiring MATLAB engine...")
+            start_time = time.time()
+            engine_time = 0
+            conversion_time = 0
+            algorithm_time = 0
             answer = None
-        end_time = time.time()
-        algorithm_time = end_time - start_time
-        print(f"{log_flag} Done.")
+            try:
+                # Leased so the engine goes back to the pool on any error
+                with self.engine_pool.lease('x2p') as eng:
+                    end_time = time.time()
+                    engine_time = end_time - start_time
+                    print(f"{log_flag} Acquired MATLAB engine.")
+                    print(f"{log_flag} Sending data to MATLAB...")
+                    start_time = time.time()
+                    put_raster(eng, 'gui_raster', raster, 'logical')
+                    eng.workspace['gui_pars'] = pars_matlab
+                    end_time = time.time()
+                    conversion_time = end_time - start_time
+                    start_time = time.time()
+                    try:
+                        answer = eng.eval("Get_Xsembles(gui_raster, gui_pars)", nargout=1)
+                    except:
+                        print(f"{log_flag} An error occurred while excecuting the algorithm. Check the Python console for more info.")
+                        answer = None
+                    end_time = time.time()
+                    algorithm_time = end_time - start_time
+                    clear_variables(eng, 'gui_raster', 'gui_pars')
+            except Exception as error:
+                print(f"{log_flag} An error occurred while running the algorithm in MATLAB: {error}")
+                answer = None
+            print(f"{log_flag} Done.")
         plot_times = 0
         if answer != None:
             start_time = time.time()
@@ -1771,12 +1985,13 @@ class MainWindow(QMainWindow):
             end_time = time.time()
             plot_times = end_time - start_time
             print(f"{log_flag} Done plotting and saving...")
-        return [engine_time, algorithm_time, plot_times]
+        return [engine_time, conversion_time, algorithm_time, plot_times]
     def run_x2p_parallel_end(self, times):
         self.update_console_log("Done executing the Xsembles2P algorithm", "complete") 
-        self.update_console_log(f"- Loading the engine took {times[0]:.2f} seconds") 
-        self.update_console_log(f"- Running the algorithm took {times[1]:.2f} seconds") 
-        self.update_console_log(f"- Plotting and saving results took {times[2]:.2f} seconds")
+        self.update_console_log(f"- Acquiring the engine took {times[0]:.2f} seconds") 
+        self.update_console_log(f"- Sending the data to MATLAB took {times[1]:.2f} seconds") 
+        self.update_console_log(f"- Running the algorithm took {times[2]:.2f} seconds") 
+        self.update_console_log(f"- Plotting and saving results took {times[3]:.2f} seconds")
         self.btn_run_x2p.setEnabled(True)
     def plot_X2P_results(self, answer):
         # Similarity map
@@ -1808,6 +2023,133 @@ class MainWindow(QMainWindow):
         plot_widget = self.findChild(MatplotlibWidget, 'x2p_plot_offsemneu')
         plot_widget.plot_ensembles_timecourse(dataset, xlabel="Cell")
 
+    def load_defaults_sgc(self):
+        defaults = self.sgc_defaults
+        self.sgc_edit_shuffling.setText(f"{defaults['shuffling_rounds']}")
+        self.sgc_edit_significance.setText(f"{defaults['coactivity_significance_level']}")
+        self.sgc_edit_mcrounds.setText(f"{defaults['montecarlo_rounds']}")
+        self.sgc_edit_mcsteps.setText(f"{defaults['montecarlo_steps']}")
+        self.sgc_edit_affinity.setText(f"{defaults['affinity_threshold']}")
+        self.update_console_log("Loaded default SGC parameter values", "complete")
+    def run_sgc(self):
+        # Temporarly disable the button
+        self.btn_run_sgc.setEnabled(False)
+        # Prepare data
+        raster = self.data_neuronal_activity
+
+        # Prepare parameters
+        input_value = self.sgc_edit_shuffling.text()
+        val_shuffling_rounds = int(float(input_value)) if len(input_value) > 0 else self.sgc_defaults['shuffling_rounds']
+        input_value = self.sgc_edit_significance.text()
+        val_coactivity_significance = float(input_value) if len(input_value) > 0 else self.sgc_defaults['coactivity_significance_level']
+        input_value = self.sgc_edit_mcrounds.text()
+        val_montecarlo_rounds = int(float(input_value)) if len(input_value) > 0 else self.sgc_defaults['montecarlo_rounds']
+        input_value = self.sgc_edit_mcsteps.text()
+        val_montecarlo_steps = int(float(input_value)) if len(input_value) > 0 else self.sgc_defaults['montecarlo_steps']
+        input_value = self.sgc_edit_affinity.text()
+        val_affinity_threshold = float(input_value) if len(input_value) > 0 else self.sgc_defaults['affinity_threshold']
+
+        # Pack parameters
+        pars = {
+            'shuffling_rounds': val_shuffling_rounds,
+            'coactivity_significance_level': val_coactivity_significance,
+            'montecarlo_rounds': val_montecarlo_rounds,
+            'montecarlo_steps': val_montecarlo_steps,
+            'affinity_threshold': val_affinity_threshold
+        }
+        self.params['sgc'] = pars
+
+        # Clean all the figures in case there was something previously
+        if 'sgc' in self.results:
+            del self.results['sgc']
+        algorithm_figs = ["sgc_plot_similarity", "sgc_plot_patterns", "sgc_plot_timecourse", "sgc_plot_cellsinens"]
+        for fig_name in algorithm_figs:
+            self.findChild(MatplotlibWidget, fig_name).reset("Loading new plots...")
+
+        self.update_console_log("Performing SGC...")
+        self.update_console_log("Look in the Python console for additional logs.", "warning")
+        worker_sgc = WorkerRunnable(self.run_sgc_parallel, raster, pars)
+        worker_sgc.signals.result_ready.connect(self.run_sgc_parallel_end)
+        self.threadpool.start(worker_sgc)
+    def run_sgc_parallel(self, raster, pars):
+        log_flag = "GUI SGC:"
+        # SGC only has a Python version, no engine nor data transfer are needed
+        engine_time = 0
+        conversion_time = 0
+        print(f"{log_flag} Running the Python engine...")
+        start_time = time.time()
+        try:
+            # Imported here so a missing SGC dependency (networkx) only
+            # affects this tab
+            from utils.sgc_assemblies import sgc_assemblies
+            answer = sgc_assemblies(raster, pars)
+        except Exception as error:
+            print(f"{log_flag} An error occurred while excecuting the algorithm: {error}")
+            answer = None
+        end_time = time.time()
+        algorithm_time = end_time - start_time
+        print(f"{log_flag} Done.")
+        plot_times = 0
+        if answer != None:
+            start_time = time.time()
+            detection = answer['assembly_pattern_detection']
+            peaks = answer['activity_raster_peaks']
+            cant_ens = len(answer['assemblies'])
+            ## Every assembly is active in the peaks of its activity patterns
+            clean_answer = {}
+            clean_answer['similarity'] = detection['patternSimilarityAnalysis']['graph']
+            clean_answer['patterns'] = np.array(detection['assemblyActivityPatterns'])
+            clean_answer['neus_in_ens'] = np.zeros((cant_ens, self.cant_neurons))
+            clean_answer['timecourse'] = np.zeros((cant_ens, self.cant_timepoints))
+            for ens_it in range(cant_ens):
+                clean_answer['neus_in_ens'][ens_it, answer['assemblies'][ens_it]] = 1
+                clean_answer['timecourse'][ens_it, peaks[detection['assemblyIActivityPatterns'][ens_it]]] = 1
+
+            # Keep only arrays for the h5 save file
+            self.algotrithm_results['sgc'] = {
+                'activity_raster_peak_threshold': answer['activity_raster_peak_threshold'],
+                'activity_raster_peaks': peaks,
+                'similarity_graph': clean_answer['similarity'],
+                'communities_count': detection['patternSimilarityAnalysis']['communityStructure']['count'],
+                'communities_count_distribution': detection['patternSimilarityAnalysis']['communityStructure']['countDistribution'],
+                'assembly_patterns': clean_answer['patterns'],
+                'assembly_patterns_indices': {f"{ens_it}": detection['assemblyIActivityPatterns'][ens_it] for ens_it in range(cant_ens)}
+            }
+            self.plot_SGC_results(clean_answer)
+
+            print(f"{log_flag} Saving results...")
+            self.results['sgc'] = {}
+            self.results['sgc']['timecourse'] = clean_answer['timecourse']
+            self.results['sgc']['ensembles_cant'] = cant_ens
+            self.results['sgc']['neus_in_ens'] = clean_answer['neus_in_ens']
+            self.we_have_results()
+            end_time = time.time()
+            plot_times = end_time - start_time
+            print(f"{log_flag} Done plotting and saving...")
+        return [engine_time, conversion_time, algorithm_time, plot_times]
+    def run_sgc_parallel_end(self, times):
+        self.update_console_log("Done executing the SGC algorithm", "complete") 
+        self.update_console_log(f"- Running the algorithm took {times[2]:.2f} seconds") 
+        self.update_console_log(f"- Plotting and saving results took {times[3]:.2f} seconds")
+        self.btn_run_sgc.setEnabled(True)
+    def plot_SGC_results(self, answer):
+        # Similarity graph between the activity patterns
+        dataset = answer['similarity']
+        plot_widget = self.findChild(MatplotlibWidget, 'sgc_plot_similarity')
+        plot_widget.preview_dataset(dataset, xlabel="Pattern #", ylabel="Pattern #", cmap='binary', aspect='equal')
+        # Mean activity pattern of every assembly
+        dataset = answer['patterns']
+        plot_widget = self.findChild(MatplotlibWidget, 'sgc_plot_patterns')
+        plot_widget.preview_dataset(dataset, xlabel="Cell", ylabel="Ensemble", cmap='jet')
+        # Timecourse
+        dataset = answer['timecourse']
+        plot_widget = self.findChild(MatplotlibWidget, 'sgc_plot_timecourse')
+        plot_widget.plot_ensembles_timecourse(dataset)
+        # Cells in ensembles
+        dataset = answer['neus_in_ens']
+        plot_widget = self.findChild(MatplotlibWidget, 'sgc_plot_cellsinens')
+        plot_widget.plot_ensembles_timecourse(dataset, xlabel="Cell")
+
 
     def we_have_results(self):
         for analysis_name in self.results.keys():
@@ -1827,6 +2169,10 @@ class MainWindow(QMainWindow):
                 self.ensvis_btn_x2p.setEnabled(True)
                 self.performance_check_x2p.setEnabled(True)
                 self.ensembles_compare_update_opts('x2p')
+            elif analysis_name == 'sgc':
+                self.ensvis_btn_sgc.setEnabled(True)
+                self.performance_check_sgc.setEnabled(True)
+                self.ensembles_compare_update_opts('sgc')
         save_itms = [self.save_check_minimal,
                 self.save_check_params,
                 self.save_check_full,
@@ -1871,6 +2217,9 @@ class MainWindow(QMainWindow):
     def vis_ensembles_x2p(self):
         self.ensemble_currently_shown = "x2p"
         self.update_analysis_results()
+    def vis_ensembles_sgc(self):
+        self.ensemble_currently_shown = "sgc"
+        self.update_analysis_results()
 
     def update_analysis_results(self):
         self.initialize_ensemble_view()   
@@ -2021,6 +2370,10 @@ class MainWindow(QMainWindow):
             ens_selector = self.enscomp_slider_x2p
             selector_label_min = self.enscomp_slider_lbl_min_x2p
             selector_label_max = self.enscomp_slider_lbl_max_x2p
+        elif algorithm == 'sgc':
+            ens_selector = self.enscomp_slider_sgc
+            selector_label_min = self.enscomp_slider_lbl_min_sgc
+            selector_label_max = self.enscomp_slider_lbl_max_sgc
 
         # Enable the general visualization options
         self.enscomp_visopts_showcells.setEnabled(True)
@@ -2108,7 +2461,8 @@ class MainWindow(QMainWindow):
             "svd": self.enscomp_slider_svd,
             "pca": self.enscomp_slider_pca,
             "ica": self.enscomp_slider_ica,
-            "x2p": self.enscomp_slider_x2p
+            "x2p": self.enscomp_slider_x2p,
+            "sgc": self.enscomp_slider_sgc
         }
         for key, slider in ens_selector.items():
             if slider.isEnabled():
@@ -2122,6 +2476,7 @@ class MainWindow(QMainWindow):
         self.enscomp_colorflag_pca.setStyleSheet(f"background-color: {self.enscomp_visopts['pca']['color']};")
         self.enscomp_colorflag_ica.setStyleSheet(f"background-color: {self.enscomp_visopts['ica']['color']};")
         self.enscomp_colorflag_x2p.setStyleSheet(f"background-color: {self.enscomp_visopts['x2p']['color']};")
+        self.enscomp_colorflag_sgc.setStyleSheet(f"background-color: {self.enscomp_visopts['sgc']['color']};")
         
         # Update the visualization options
         current_method = self.enscomp_combo_select_result.currentText().lower()
@@ -2603,7 +2958,8 @@ class MainWindow(QMainWindow):
             scipy.io.savemat(file_path, data_to_save)
             self.update_console_log("Done saving.", "complete")
 
-app = QApplication(sys.argv)
-window = MainWindow()
-window.show()
-app.exec()  
\ No newline at end of file
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = MainWindow()
+    window.show()
+    app.exec()  
\ No newline at end of file
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The tests import the GUI modules as main.py does, from the repository root,
+# and the SGC modules from the folder of SGC.py
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SGC_PATH = os.path.join(ROOT, 'analysis', 'sgc-assembly-detection')
+for path in (ROOT, SGC_PATH):
+    if path not in sys.path:
+        sys.path.insert(0, path)
@@ -0,0 +1,28 @@
+function make_density_fixtures()
+% Runs the MATLAB raster2ens_by_density on every tests/fixtures/density_*.mat
+% raster and saves its results next to it as density_*_matlab.mat, the
+% references of tests/test_pca_ensembles.py.
+%
+%       make_density_fixtures()
+%
+% bincor and sur_cel_cor are left out, they take hundreds of MB and the
+% tests do not read them. The surrogates of the core cells come from the
+% MATLAB random number generator, the tests only compare what does not
+% depend on them.
+
+root = fileparts(fileparts(fileparts(mfilename('fullpath'))));
+addpath(fullfile(root,'analysis','NeuralEnsembles','AssemblyGui'))
+addpath(fullfile(root,'analysis','NeuralEnsembles','AssemblyGui','analysis_codes'))
+fixtures = fullfile(root,'tests','fixtures');
+
+files = dir(fullfile(fixtures,'density_*.mat'));
+files = files(~endsWith({files.name},'_matlab.mat'));
+for f = 1:numel(files)
+    fixture = load(fullfile(fixtures,files(f).name));
+    rng(0)
+    results = raster2ens_by_density(double(fixture.raster),fixture.pars);
+    results = rmfield(results,intersect(fieldnames(results),{'bincor','sur_cel_cor'}));
+    [~,name] = fileparts(files(f).name);
+    save(fullfile(fixtures,[name '_matlab.mat']),'-struct','results')
+    fprintf('%s: %d centroids, %d ensembles\n',name,results.Nens,results.Nens_final)
+end
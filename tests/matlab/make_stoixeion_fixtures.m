@@ -0,0 +1,27 @@
+function make_stoixeion_fixtures()
+% Runs the MATLAB Stoixeion on every tests/fixtures/stoixeion_*.mat raster
+% and saves its results next to it as stoixeion_*_matlab.mat, the
+% references of tests/test_svd_ensembles.py.
+%
+%       make_stoixeion_fixtures()
+%
+% pks and scut are fixed in the fixtures, so no shuffles are drawn and the
+% results do not depend on the random number generator.
+
+root = fileparts(fileparts(fileparts(mfilename('fullpath'))));
+addpath(genpath(fullfile(root,'analysis','SVD')))
+fixtures = fullfile(root,'tests','fixtures');
+
+files = dir(fullfile(fixtures,'stoixeion_*.mat'));
+files = files(~endsWith({files.name},'_matlab.mat'));
+for f = 1:numel(files)
+    fixture = load(fullfile(fixtures,files(f).name));
+    pars = fixture.pars;
+    pars.tf_idf_norm = logical(pars.tf_idf_norm);
+    pars.parallel_processing = logical(pars.parallel_processing);
+    spikes = double(fixture.spikes);
+    stoixeion_results = Stoixeion(spikes,zeros(size(spikes,1),2),pars);
+    [~,name] = fileparts(files(f).name);
+    save(fullfile(fixtures,[name '_matlab.mat']),'-struct','stoixeion_results')
+    fprintf('%s: %d ensembles\n',name,stoixeion_results.num_state)
+end
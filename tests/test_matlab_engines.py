@@ -0,0 +1,157 @@
+import queue
+import threading
+
+import pytest
+
+from utils.matlab_engines import ANALYSIS_PATHS, MatlabEnginePool
+
+class FakeEngine:
+    # Stands in for a MATLAB engine: records the calls of the pool and stops
+    # answering once killed
+    def __init__(self, number):
+        self.number = number
+        self.path = []
+        self.alive = True
+        self.quit_calls = 0
+
+    def genpath(self, folder_path):
+        return 'genpath:' + folder_path
+
+    def addpath(self, path, nargout=None):
+        self.path.insert(0, path)
+
+    def eval(self, code, nargout=None):
+        if not self.alive:
+            raise RuntimeError('MATLAB is not running')
+
+    def quit(self):
+        self.alive = False
+        self.quit_calls += 1
+
+class FakeEngines:
+    # start_engine of the pool, optionally held until gate is set
+    def __init__(self, gate=None, fail=False):
+        self.started = []
+        self.gate = gate
+        self.fail = fail
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        if self.gate is not None:
+            self.gate.wait()
+        if self.fail:
+            raise RuntimeError('no license')
+        with self.lock:
+            eng = FakeEngine(len(self.started))
+            self.started.append(eng)
+        return eng
+
+@pytest.fixture
+def engines():
+    return FakeEngines()
+
+def make_pool(engines, size=1, max_size=None):
+    return MatlabEnginePool(size=size, max_size=max_size, start_engine=engines, log_flag='test:')
+
+def test_start_adds_the_analysis_paths(engines):
+    pool = make_pool(engines)
+    pool.start()
+    eng = pool.acquire(timeout=5)
+    assert len(engines.started) == 1
+    assert sorted(eng.path) == sorted(pool._genpaths[id(eng)].values())
+    assert len(eng.path) == len(ANALYSIS_PATHS)
+    pool.release(eng)
+    with pool.lease('svd', timeout=5) as eng:
+        assert eng.path[0] == 'genpath:' + pool.paths['svd']
+    pool.shutdown()
+
+def test_lazy_growth_up_to_max_size(engines):
+    pool = make_pool(engines, size=1, max_size=3)
+    # Nothing is started before the first engine is needed
+    assert engines.started == []
+    leased = [pool.acquire(timeout=5) for _ in range(3)]
+    assert len(engines.started) == 3
+    assert len({id(_) for _ in leased}) == 3
+    # The pool does not grow past max_size, callers wait for a release
+    with pytest.raises(queue.Empty):
+        pool.acquire(timeout=0.1)
+    assert len(engines.started) == 3
+    pool.release(leased[0])
+    assert pool.acquire(timeout=5) is leased[0]
+    assert len(engines.started) == 3
+    pool.shutdown()
+
+def test_idle_engine_is_reused(engines):
+    pool = make_pool(engines, size=1, max_size=4)
+    for _ in range(5):
+        with pool.lease(timeout=5):
+            pass
+    assert len(engines.started) == 1
+    pool.shutdown()
+
+def test_lease_returns_the_engine_on_exception(engines):
+    pool = make_pool(engines)
+    with pytest.raises(ValueError):
+        with pool.lease('pca', timeout=5) as eng:
+            raise ValueError('failed analysis')
+    assert eng.quit_calls == 0
+    assert pool.acquire(timeout=5) is eng
+    assert len(engines.started) == 1
+    pool.shutdown()
+
+def test_broken_release_restarts_the_engine(engines):
+    pool = make_pool(engines)
+    eng = pool.acquire(timeout=5)
+    pool.release(eng, broken=True)
+    assert eng.quit_calls == 1
+    replacement = pool.acquire(timeout=5)
+    assert replacement is not eng
+    assert len(engines.started) == 2
+    assert pool._count == 1
+    pool.shutdown()
+
+def test_dead_engine_is_restarted_after_lease(engines):
+    pool = make_pool(engines)
+    with pool.lease('x2p', timeout=5) as eng:
+        # MATLAB crashed during the analysis
+        eng.alive = False
+    assert eng.quit_calls == 1
+    replacement = pool.acquire(timeout=5)
+    assert replacement is not eng
+    assert replacement.alive
+    assert pool._count == 1
+    pool.shutdown()
+
+def test_failed_start_is_raised_to_the_caller():
+    pool = make_pool(FakeEngines(fail=True))
+    with pytest.raises(RuntimeError, match='no license'):
+        pool.acquire(timeout=5)
+    assert pool._count == 0
+    pool.shutdown()
+
+def test_shutdown_quits_every_engine(engines):
+    pool = make_pool(engines, size=2, max_size=2)
+    pool.start()
+    leased = pool.acquire(timeout=5)
+    idle = pool.acquire(timeout=5)
+    pool.release(idle)
+    pool.shutdown()
+    assert idle.quit_calls == 1
+    with pytest.raises(RuntimeError):
+        pool.acquire(timeout=5)
+    # An engine still leased is quit when given back, not restarted
+    pool.release(leased)
+    assert leased.quit_calls == 1
+    assert len(engines.started) == 2
+    assert pool._count == 0
+
+def test_shutdown_quits_engines_being_started():
+    gate = threading.Event()
+    engines = FakeEngines(gate=gate)
+    pool = make_pool(engines, size=2, max_size=2)
+    pool.start()
+    threading.Timer(0.1, gate.set).start()
+    pool.shutdown(timeout=5)
+    assert len(engines.started) == 2
+    assert all(_.quit_calls == 1 for _ in engines.started)
+    assert pool._count == 0
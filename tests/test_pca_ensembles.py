@@ -0,0 +1,93 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import scipy.io
+
+from utils.pca_ensembles import (cluster_by_pow_fit, filter_ens_by_inner_corr, nanmean_columns, nanstd_columns,
+                                 raster2ens_by_density, robust_linear_fit, upper_prediction_bound)
+
+# density_<name>.mat holds a random raster with planted ensembles (as in
+# benchmark), the cells of every planted ensemble and the parameters of the
+# run. density_<name>_matlab.mat are the results of the MATLAB
+# raster2ens_by_density on it, made with tests/matlab/make_density_fixtures.m
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RASTERS = sorted(_ for _ in glob.glob(os.path.join(FIXTURES, 'density_*.mat')) if not _.endswith('_matlab.mat'))
+
+def load_raster(path):
+    fixture = scipy.io.loadmat(path, squeeze_me=True, struct_as_record=False)
+    pars = {name: getattr(fixture['pars'], name) for name in fixture['pars']._fieldnames}
+    return np.asarray(fixture['raster'], dtype=float), pars, np.asarray(fixture['ensemble_cells'], dtype=bool)
+
+@pytest.fixture(scope='module', params=RASTERS, ids=lambda path: os.path.basename(path)[:-4])
+def run(request):
+    raster, pars, ensemble_cells = load_raster(request.param)
+    return request.param, raster, pars, ensemble_cells, raster2ens_by_density(raster, pars, rng=0)
+
+def test_planted_ensembles_are_found(run):
+    _, _, _, ensemble_cells, results = run
+    # The inner correlation is only undefined with fewer than two core cells
+    assert np.all(np.isfinite(results['ens_corr'][0, results['core_cells'].sum(axis=0) > 1]))
+    assert np.isfinite(results['corr_thr'])
+    assert results['Nens_final'] > 0
+    # Every planted ensemble is the best match of some final ensemble
+    found = results['sel_core_cells'].astype(bool)
+    for cells in ensemble_cells.T:
+        jaccard = (found & cells[:, np.newaxis]).sum(axis=0) / (found | cells[:, np.newaxis]).sum(axis=0)
+        assert jaccard.max() >= 0.5
+
+def test_parity_with_matlab(run):
+    path, raster, pars, _, results = run
+    reference_path = path[:-4] + '_matlab.mat'
+    if not os.path.isfile(reference_path):
+        pytest.skip('no MATLAB results, run tests/matlab/make_density_fixtures.m to make ' + os.path.basename(reference_path))
+    reference = scipy.io.loadmat(reference_path, squeeze_me=True)
+
+    # Everything up to the core cells does not depend on random numbers
+    np.testing.assert_array_equal(results['selbins'], reference['selbins'].astype(bool))
+    np.testing.assert_allclose(results['exp_var'], reference['exp_var'], rtol=1e-8, atol=1e-10)
+    np.testing.assert_allclose(results['pcs'], reference['pcs'], rtol=1e-6, atol=1e-8)
+    np.testing.assert_allclose(results['rho'], reference['rho'], rtol=1e-6)
+    np.testing.assert_allclose(results['delta'], reference['delta'], rtol=1e-6)
+    assert results['Nens'] == reference['Nens']
+    np.testing.assert_array_equal(results['cents'], reference['cents'])
+    np.testing.assert_allclose(results['predbounds'], reference['predbounds'], rtol=1e-6)
+    np.testing.assert_array_equal(results['ensmat_out'], np.atleast_2d(reference['ensmat_out']))
+    np.testing.assert_allclose(results['ens_cel_corr'], np.reshape(reference['ens_cel_corr'], results['ens_cel_corr'].shape), rtol=1e-8, atol=1e-10)
+
+    # The robust fit and the prediction bound on the MATLAB densities
+    Nens, cents, predbounds = cluster_by_pow_fit(reference['delta'], reference['rho'], pars['cent_thr'])
+    assert Nens == reference['Nens']
+    np.testing.assert_allclose(predbounds, reference['predbounds'], rtol=1e-6)
+
+    # The filtering on the MATLAB core cells, which come from its surrogates
+    core_cells = np.reshape(reference['core_cells'], results['core_cells'].shape).astype(bool)
+    ens_corr, corr_thr, corr_selection = filter_ens_by_inner_corr(raster, core_cells, pars['inner_corr'])
+    np.testing.assert_allclose(ens_corr, np.ravel(reference['ens_corr']), rtol=1e-8)
+    np.testing.assert_allclose(corr_thr, reference['corr_thr'], rtol=1e-8)
+    np.testing.assert_array_equal(corr_selection & (core_cells.sum(axis=0) > pars['minsize']), np.ravel(reference['final_sel_ens']).astype(bool))
+
+    # Core cells drawn from other surrogates only differ near the threshold
+    assert np.mean(results['core_cells'] == core_cells) > 0.97
+
+def test_nan_statistics_reduce_row_vectors_as_matlab():
+    # nanmean(nanmean(X)) and nanstd(nanstd(X)) are scalars in MATLAB
+    X = np.array([[np.nan, 0.2, 0.4], [np.nan, np.nan, 0.6], [np.nan, np.nan, np.nan]])
+    assert nanmean_columns(nanmean_columns(X)[np.newaxis, :])[0] == pytest.approx(0.35)
+    assert nanstd_columns(nanstd_columns(X)[np.newaxis, :])[0] == pytest.approx(np.std([0, np.std([0.4, 0.6], ddof=1)], ddof=1))
+    assert nanstd_columns(np.array([[1., 2., 4.]]))[0] == pytest.approx(np.std([1, 2, 4], ddof=1))
+
+def test_robust_fit_ignores_outliers():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=400)
+    y = -0.8 * x + 0.3 + 0.05 * rng.normal(size=400)
+    y[:10] += 5
+    coeffs, weights = robust_linear_fit(x, y)
+    np.testing.assert_allclose(coeffs, [-0.8, 0.3], atol=0.01)
+    assert np.all(weights[:10] == 0)
+    # Without outliers the bound is the simultaneous prediction bound of
+    # ordinary least squares
+    coeffs, weights = robust_linear_fit(x[10:], y[10:])
+    upper = upper_prediction_bound(x[10:], y[10:], coeffs, weights, 0.999)
+    assert np.mean(y[10:] > upper) == 0
@@ -0,0 +1,117 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import peakfinder_baseline
+from Modules.peakfinder import PeakFinder, peakfinder
+
+OPTIONS = [(sel, threshold, extrema, includeEndpoints)
+           for sel in ['zero', 0.05, 'quarter', 'twentieth']
+           for threshold in [False, True]
+           for extrema in [1, -1]
+           for includeEndpoints in [True, False]]
+
+def traces(seed=0, count=12):
+    # White noise, random walks, integer valued traces with plateaus, very
+    # short traces, the noisy sine of the peakfinder example, and the
+    # normalised coactivity of random rasters with assemblies, as SGC
+    # computes it
+    rng = np.random.default_rng(seed)
+    traces = []
+    for length in [1, 2, 3, 4, 5, 6, 7, 10]:
+        for _ in range(count):
+            traces.append(('short', rng.integers(0, 3, size=length).astype(float)))
+    for _ in range(count):
+        length = int(rng.integers(10, 2000))
+        traces.append(('noise', rng.normal(size=length)))
+        traces.append(('walk', np.cumsum(rng.normal(size=length))))
+        traces.append(('plateaus', rng.integers(0, 5, size=length).astype(float)))
+    t = np.linspace(0, 10, 20001)
+    traces.append(('sine', 12*np.sin(10*2*np.pi*t) - 3*np.sin(.1*2*np.pi*t) + rng.normal(size=len(t))))
+    for _ in range(count // 3):
+        T, N = int(rng.integers(500, 5000)), int(rng.integers(20, 200))
+        raster = rng.random((T, N)) < rng.uniform(0.005, 0.05)
+        for _ in range(int(rng.integers(1, 6))):
+            raster[np.ix_(rng.choice(T, 20, replace=False), rng.choice(N, 10, replace=False))] = True
+        coactivity = raster.sum(axis=1)
+        traces.append(('coactivity', coactivity / max(coactivity.max(), 1)))
+    return traces
+
+TRACES = traces()
+
+def arguments(x, sel, threshold, extrema, includeEndpoints):
+    spread = x.max() - x.min()
+    sel = {'zero': 0, 'quarter': spread / 4, 'twentieth': spread / 20}.get(sel, sel)
+    return x, sel, float(np.median(x)) if threshold else None, extrema, includeEndpoints
+
+def trace_id(trace):
+    return '{:s}-{:d}'.format(trace[0], len(trace[1]))
+
+@pytest.mark.parametrize('trace', TRACES, ids=[trace_id(_) for _ in TRACES])
+def test_same_peaks_as_baseline(trace):
+    x = trace[1]
+    for options in OPTIONS:
+        args = arguments(x, *options)
+        peakInds, peakMags = peakfinder(*args)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                expected = peakfinder_baseline.peakfinder(*args)
+        except ValueError:
+            # The baseline fails without endpoints on a trace without any
+            # extremum inside, there are no peaks
+            assert not args[4]
+            assert len(peakInds) == 0
+            continue
+        expectedInds = np.atleast_1d(np.asarray(expected[0])).astype(int)
+        expectedMags = np.atleast_1d(np.asarray(expected[1], dtype=float))
+        # The baseline reports a peak at the last endpoint at index len(x),
+        # one past its end
+        expectedInds[expectedInds == len(x)] = len(x) - 1
+        np.testing.assert_array_equal(peakInds, expectedInds, err_msg=str(options))
+        np.testing.assert_array_equal(peakMags, expectedMags, err_msg=str(options))
+
+@pytest.mark.parametrize('chunk', [1, 3, 100, None])
+def test_chunked_same_peaks_as_one_shot(chunk):
+    rng = np.random.default_rng(1)
+    for name, x in TRACES:
+        # Every update is a Python loop over its extrema, small chunks are
+        # tried on the start of the traces only
+        x = x if chunk is None else x[:150 * chunk]
+        for options in OPTIONS:
+            args = arguments(x, *options)
+            expected = peakfinder(*args)
+            finder = PeakFinder(*args[1:])
+            if chunk is None:
+                bounds = np.array([0, len(x)])
+            else:
+                # Irregular chunks of about the given size, empty ones included
+                bounds = np.concatenate([[0], np.minimum(np.cumsum(rng.integers(0, 2*chunk + 1, size=len(x) + 1)), len(x))])
+                bounds = np.append(bounds[:np.searchsorted(bounds, len(x)) + 1], len(x))
+            parts = [finder.update(x[a:b]) for a, b in zip(bounds[:-1], bounds[1:])] + [finder.finish()]
+            np.testing.assert_array_equal(np.concatenate([_[0] for _ in parts]), expected[0], err_msg=str((name, len(x), options)))
+            np.testing.assert_array_equal(np.concatenate([_[1] for _ in parts]), expected[1], err_msg=str((name, len(x), options)))
+
+def test_chunked_with_given_minimum():
+    x = TRACES[-1][1]
+    expected = peakfinder(x, 0.1, None, 1, True)
+    finder = PeakFinder(0.1, None, 1, True, minimum=x.min())
+    parts = [finder.update(x[start:start + 250]) for start in range(0, len(x), 250)] + [finder.finish()]
+    np.testing.assert_array_equal(np.concatenate([_[0] for _ in parts]), expected[0])
+
+def test_integer_trace_same_as_float():
+    # The baseline lost the plateau handling on integer input
+    x = np.random.default_rng(2).integers(0, 5, size=500)
+    for options in OPTIONS:
+        for ours, theirs in zip(peakfinder(*arguments(x, *options)), peakfinder(*arguments(x.astype(float), *options))):
+            np.testing.assert_array_equal(ours, theirs)
+
+def test_interpolation_of_a_parabola():
+    # Quadratic interpolation recovers the vertex of sampled parabolas, the
+    # baseline used 1-based bounds and truncated the fractional indices
+    t = np.arange(40)
+    x = np.maximum(-(t - 10.3)**2, -(t - 30.7)**2 + 5)
+    peakInds, peakMags = peakfinder(x, 1, None, 1, False, interpolate=True)
+    np.testing.assert_allclose(peakInds, [10.3, 30.7])
+    np.testing.assert_allclose(peakMags, [0, 5])
@@ -0,0 +1,105 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+import scipy.io
+
+from utils.svd_ensembles import compare_with_matlab, hdist, hdist_loop, stoixeion
+
+# stoixeion_<name>.mat holds a synthetic raster (synthetic_raster) and the
+# parameters of the run, pks and scut fixed so no shuffles are drawn.
+# stoixeion_<name>_matlab.mat are the results of the MATLAB Stoixeion on it,
+# made with tests/matlab/make_stoixeion_fixtures.m
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RASTERS = sorted(_ for _ in glob.glob(os.path.join(FIXTURES, 'stoixeion_*.mat')) if not _.endswith('_matlab.mat'))
+
+def load_raster(path):
+    fixture = scipy.io.loadmat(path, squeeze_me=True, struct_as_record=False)
+    pars = {name: getattr(fixture['pars'], name) for name in fixture['pars']._fieldnames}
+    pars['tf_idf_norm'] = bool(pars['tf_idf_norm'])
+    pars['parallel_processing'] = bool(pars['parallel_processing'])
+    return np.asarray(fixture['spikes'], dtype=float), pars
+
+def load_reference(path):
+    reference = scipy.io.loadmat(path, squeeze_me=False)
+    return {key: value for key, value in reference.items() if not key.startswith('__')}
+
+def plot_inputs(answer, neurons, frames):
+    # Everything plot_SVD_results in main.py takes from the answer: the
+    # singular values, the ensemble timecourses and the cells of every
+    # ensemble
+    num_state = int(np.ravel(answer['num_state'])[0])
+    Pks_Frame = np.array(answer['Pks_Frame'])
+    sec_Pk_Frame = np.array(answer['sec_Pk_Frame'])
+    timecourse = np.zeros((num_state, frames))
+    for it in range(Pks_Frame.shape[1]):
+        if int(sec_Pk_Frame[it, 0]) != 0:
+            timecourse[int(sec_Pk_Frame[it, 0]) - 1, int(Pks_Frame[0, it]) - 1] = 1
+    Pools_coords = np.array(answer['Pools_coords']).reshape(neurons, 3, num_state)
+    cells = np.zeros((num_state, neurons))
+    for ens in range(num_state):
+        for cell_id in Pools_coords[:, 2, ens].astype(int):
+            if cell_id == 0:
+                break
+            cells[ens, cell_id - 1] = 1
+    return np.diagonal(np.array(answer['S_svd'])), timecourse, cells
+
+@pytest.fixture(scope='module', params=RASTERS, ids=lambda path: os.path.basename(path)[:-4])
+def run(request):
+    spikes, pars = load_raster(request.param)
+    return request.param, spikes, stoixeion(spikes, pars)
+
+def test_answer_has_what_the_plots_read(run):
+    _, spikes, answer = run
+    neurons, frames = spikes.shape
+    num_state = answer['num_state']
+    peaks = answer['Pks_Frame'].shape[1]
+    assert num_state > 0
+    assert answer['S_index_ti'].shape == (peaks, peaks)
+    assert answer['S_indexp'].shape == (peaks, peaks)
+    assert answer['svd_sig'].shape == (peaks, peaks, num_state)
+    assert answer['sec_Pk_Frame'].shape == (peaks, 1)
+    assert answer['Pools_coords'].shape == (neurons, 3, num_state)
+    singular_values, timecourse, cells = plot_inputs(answer, neurons, frames)
+    assert np.all(np.diff(singular_values) <= 0)
+    assert np.all(timecourse.sum(axis=1) > 0)
+    assert np.all(cells.sum(axis=1) > 0)
+
+def test_compare_with_matlab_reads_saved_results(run, tmp_path):
+    # The answer saved and loaded the way a MATLAB reference is must compare
+    # equal to itself, svd_sig of a single ensemble included
+    _, _, answer = run
+    for num_state in sorted({1, answer['num_state']}):
+        saved = dict(answer, num_state=num_state, svd_sig=answer['svd_sig'][:, :, :num_state],
+                     Pools_coords=answer['Pools_coords'][:, :, :num_state])
+        path = tmp_path / 'reference.mat'
+        scipy.io.savemat(path, saved)
+        differences = compare_with_matlab(saved, load_reference(path))
+        assert all(value == 0 for value in differences.values()), differences
+
+def test_parity_with_matlab(run):
+    path, spikes, answer = run
+    reference_path = path[:-4] + '_matlab.mat'
+    if not os.path.isfile(reference_path):
+        pytest.skip('no MATLAB results, run tests/matlab/make_stoixeion_fixtures.m to make ' + os.path.basename(reference_path))
+    reference = load_reference(reference_path)
+
+    differences = compare_with_matlab(answer, reference)
+    for key in ['pks', 'scut', 'num_state', 'S_indexp', 'svd_sig', 'Pools_coords', 'Pks_Frame', 'sec_Pk_Frame']:
+        assert differences[key] == 0, (key, differences[key])
+    for key in ['S_index_ti', 'S_svd']:
+        assert differences[key] < 1e-8, (key, differences[key])
+
+    neurons, frames = spikes.shape
+    for ours, theirs in zip(plot_inputs(answer, neurons, frames), plot_inputs(reference, neurons, frames)):
+        np.testing.assert_allclose(ours, theirs, rtol=0, atol=1e-8)
+
+@pytest.mark.parametrize('seed', range(5))
+def test_hdist_matches_loop(seed):
+    rng = np.random.default_rng(seed)
+    A = rng.random((int(rng.integers(1, 60)), int(rng.integers(1, 40)))) < rng.random()
+    A[:, rng.random(A.shape[1]) < 0.1] = False
+    expected = hdist_loop(A)
+    for kwargs in [{}, {'packed': True}, {'block_size': 3}, {'block_size': 7, 'packed': True}]:
+        np.testing.assert_array_equal(hdist(A, **kwargs), expected)
@@ -0,0 +1,151 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.linalg import eigh
+
+# Python port of analysis/Cell-Assembly-Detection (Lopes-dos-Santos et al.
+# 2013): assembly_patterns.m, fast_ica.m and assembly_activity.m. Activity
+# matrices are neurons x time bins. The z-scored matrix is the input of
+# every stage, so it can be computed once with zscore_rows and passed along.
+
+def zscore_rows(spike_count):
+    # zscore of every neuron with the sample std. Silent neurons are left in
+    # zero instead of NaN so they don't spread into the correlation matrix
+    spike_count = np.asarray(spike_count, dtype=float)
+    centered = spike_count - spike_count.mean(axis=1, keepdims=True)
+    std = spike_count.std(axis=1, ddof=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = centered / std
+    return np.nan_to_num(z, nan=0.0, posinf=0.0, neginf=0.0)
+
+def correlation_from_z(z):
+    return z @ z.T / (z.shape[1] - 1)
+
+def max_eigenvalue(matrix):
+    return eigh(matrix, eigvals_only=True, subset_by_index=[len(matrix) - 1, len(matrix) - 1])[0]
+
+def bin_shuffling_max_eig(z, rng):
+    # Every neuron is shuffled in time on its own, z-scores are kept
+    return max_eigenvalue(correlation_from_z(rng.permuted(z, axis=1)))
+
+def circular_shift_max_eig(z, rng):
+    # Every neuron is circularly shifted by a random number of bins
+    bins = z.shape[1]
+    shifts = rng.integers(0, bins, size=z.shape[0])
+    idx = (np.arange(bins)[np.newaxis, :] + shifts[:, np.newaxis]) % bins
+    return max_eigenvalue(correlation_from_z(np.take_along_axis(z, idx, axis=1)))
+
+SURROGATES = {
+    'binshuffling': bin_shuffling_max_eig,
+    'circularshift': circular_shift_max_eig
+}
+
+def control_max_eigenvalues(z, method, number_of_surrogates, rng=None, workers=None):
+    # Maximum eigenvalue of every surrogate correlation matrix. The linear
+    # algebra releases the GIL, so the surrogates run in a thread pool with
+    # an independent random stream each
+    surrogate = SURROGATES[method]
+    seeds = np.random.SeedSequence(rng).spawn(number_of_surrogates)
+    workers = workers or os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        control_max_eig = list(executor.map(lambda seed: surrogate(z, np.random.default_rng(seed)), seeds))
+    return np.array(control_max_eig)
+
+def inverse_sqrt(matrix):
+    # real(matrix^(-0.5)) of a symmetric matrix
+    eigenvalues, eigenvectors = np.linalg.eigh(matrix)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = np.real(np.power(eigenvalues.astype(complex), -0.5))
+    return (eigenvectors * scale) @ eigenvectors.T
+
+def fast_ica(z, pcomponents, nit=100, rng=None):
+    # fastICA with a tanh nonlinearity on the whitened top pcomponents,
+    # returns the unmixing weights as neurons x components
+    rng = np.random.default_rng(rng)
+    X = z - z.mean(axis=1, keepdims=True)
+    samples = X.shape[1]
+    eigenvalues, E = np.linalg.eigh(X @ X.T / samples)
+    order = np.argsort(-eigenvalues, kind='stable')[:pcomponents]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d = np.real(np.power(eigenvalues[order].astype(complex), -0.5))
+    whitening_matrix = d[:, np.newaxis] * E[:, order].T
+    X = whitening_matrix @ X
+
+    B = rng.standard_normal((pcomponents, pcomponents))
+    B = B @ inverse_sqrt(B.T @ B)
+    W = rng.random((pcomponents, whitening_matrix.shape[1]))
+    for _ in range(int(nit)):
+        hyp_tan = np.tanh(X.T @ B)
+        B = X @ hyp_tan / samples - np.mean(1 - hyp_tan**2, axis=0)[np.newaxis, :] * B
+        B = B @ inverse_sqrt(B.T @ B)
+        W = B.T @ whitening_matrix
+    return W.T
+
+def assembly_patterns(spike_count, opts, z_spikes=None, rng=None, workers=None):
+    if z_spikes is None:
+        z_spikes = zscore_rows(spike_count)
+    neurons, bins = z_spikes.shape
+    q = bins / neurons
+    if q < 1:
+        raise ValueError("Number of time bins must be larger than number of neurons")
+
+    eigenvalues, eigenvectors = np.linalg.eigh(correlation_from_z(z_spikes))
+
+    method = opts['threshold']['method']
+    if method == 'MarcenkoPastur':
+        print("Using Marcenko-Pastur distribution for estimating number of assemblies")
+        lambda_max = (1 + np.sqrt(1 / q))**2
+    elif method in SURROGATES:
+        number_of_permutations = int(opts['threshold']['number_of_permutations'])
+        if number_of_permutations <= 0:
+            raise ValueError("The number of surrogates must be larger than zero")
+        print("Generating control spike count matrix for estimating number of assemblies")
+        print(f"Number of permutations: {number_of_permutations}")
+        control_max_eig = control_max_eigenvalues(z_spikes, method, number_of_permutations, rng=rng, workers=workers)
+        lambda_max = np.percentile(control_max_eig, opts['threshold']['permutations_percentile'], method='hazen')
+    else:
+        raise ValueError(f"Unknown threshold method {method}")
+
+    number_of_assemblies = int(np.sum(eigenvalues > lambda_max))
+    print(f"Number of assemblies detected: {number_of_assemblies}")
+    if number_of_assemblies < 1:
+        return {'AssemblyTemplates': np.zeros((neurons, 0))}
+
+    if opts['Patterns']['method'] == 'PCA':
+        pc_position = np.argsort(-eigenvalues, kind='stable')
+        assembly_templates = eigenvectors[:, pc_position[:number_of_assemblies]]
+    else:
+        assembly_templates = fast_ica(z_spikes, number_of_assemblies, opts['Patterns']['number_of_iterations'], rng=rng)
+    return {'AssemblyTemplates': assembly_templates}
+
+def assembly_activity(assembly_templates, spike_count, z_spikes=None):
+    # z' * (w*w' - diag(w.^2)) * z for every assembly and bin is
+    # (w'*z).^2 - (w.^2)'*(z.^2), so all the bins go in two products
+    if z_spikes is None:
+        z_spikes = zscore_rows(spike_count)
+    projection = assembly_templates.T @ z_spikes
+    time_projection = projection**2 - (assembly_templates**2).T @ (z_spikes**2)
+    return {'time_projection': time_projection}
+
+def benchmark(sizes=((100, 5000), (300, 20000), (1000, 50000)), permutations=100):
+    opts = {
+        'threshold': {'method': 'binshuffling', 'permutations_percentile': 95, 'number_of_permutations': permutations},
+        'Patterns': {'method': 'ICA', 'number_of_iterations': 500}
+    }
+    rng = np.random.default_rng(0)
+    for neurons, bins in sizes:
+        spikes = rng.poisson(0.1, (neurons, bins)).astype(float)
+        for _ in range(3):
+            cells = rng.choice(neurons, neurons // 20, replace=False)
+            onsets = rng.choice(bins, bins // 50, replace=False)
+            spikes[np.ix_(cells, onsets)] += 1
+        for workers in (1, None):
+            start_time = time.time()
+            z_spikes = zscore_rows(spikes)
+            patterns = assembly_patterns(spikes, opts, z_spikes=z_spikes, rng=0, workers=workers)
+            assembly_activity(patterns['AssemblyTemplates'], spikes, z_spikes=z_spikes)
+            print(f"{neurons} x {bins}, {workers or os.cpu_count()} workers: {time.time() - start_time:.2f} seconds")
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,67 @@
+import time
+import numpy as np
+
+# NumPy dtype used to build each kind of MATLAB array
+MATLAB_DTYPES = {
+    'double': np.float64,
+    'logical': np.bool_,
+    'uint8': np.uint8
+}
+
+def is_binary(data):
+    data = np.asarray(data)
+    if data.dtype == np.bool_:
+        return True
+    return bool(np.all((data == 0) | (data == 1)))
+
+def numpy_to_matlab(data, matlab_type=None):
+    # Build the MATLAB array straight from the NumPy buffer instead of going
+    # through a list of lists of Python floats
+    import matlab
+    data = np.asarray(data)
+    if matlab_type is None:
+        matlab_type = 'logical' if is_binary(data) else 'double'
+    buffer = np.ascontiguousarray(data, dtype=MATLAB_DTYPES[matlab_type])
+    constructor = getattr(matlab, matlab_type)
+    try:
+        return constructor(buffer)
+    except (TypeError, ValueError):
+        # Releases older than R2022a can't read the buffer protocol
+        return constructor(buffer.tolist())
+
+def put_raster(eng, name, data, matlab_type='double'):
+    # Binary rasters travel as logical (1 byte per element) and are cast to
+    # the type the algorithm expects inside MATLAB
+    transfer_type = 'logical' if is_binary(data) else 'double'
+    eng.workspace[name] = numpy_to_matlab(data, transfer_type)
+    if transfer_type != matlab_type:
+        eng.eval(f"{name} = {matlab_type}({name});", nargout=0)
+
+def clear_variables(eng, *names):
+    # Engines are reused between runs, don't keep big inputs alive in them
+    try:
+        eng.eval(f"clear {' '.join(names)};", nargout=0)
+    except Exception:
+        pass
+
+def benchmark_conversion(sizes=((200, 1000), (500, 10000), (1000, 50000), (2000, 100000)), repeats=3):
+    import matlab
+    print(f"{'Neurons':>8} {'Frames':>8} {'tolist (s)':>12} {'buffer (s)':>12} {'logical (s)':>12}")
+    rng = np.random.default_rng(0)
+    for neurons, frames in sizes:
+        data = (rng.random((neurons, frames)) < 0.05).astype(float)
+        times = {'tolist': [], 'buffer': [], 'logical': []}
+        for _ in range(repeats):
+            start_time = time.time()
+            matlab.double(data.tolist())
+            times['tolist'].append(time.time() - start_time)
+            start_time = time.time()
+            numpy_to_matlab(data, 'double')
+            times['buffer'].append(time.time() - start_time)
+            start_time = time.time()
+            numpy_to_matlab(data, 'logical')
+            times['logical'].append(time.time() - start_time)
+        print(f"{neurons:>8} {frames:>8} {min(times['tolist']):>12.4f} {min(times['buffer']):>12.4f} {min(times['logical']):>12.4f}")
+
+if __name__ == "__main__":
+    benchmark_conversion()
@@ -0,0 +1,182 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+# Folders with the MATLAB code of every algorithm, added once to every engine
+ANALYSIS_PATHS = {
+    'svd': 'analysis/SVD',
+    'pca': 'analysis/NeuralEnsembles',
+    'ica': 'analysis/Cell-Assembly-Detection',
+    'x2p': 'analysis/Xsembles2P'
+}
+
+def start_matlab_engine():
+    import matlab.engine
+    return matlab.engine.start_matlab()
+
+def is_engine_alive(eng):
+    try:
+        eng.eval("1;", nargout=0)
+        return True
+    except Exception:
+        return False
+
+class MatlabEnginePool:
+    """
+    Keeps a set of MATLAB engines started and with the analysis folders
+    already in their path, so the algorithms only need to lease one.
+
+    start_engine is the function used to create a new engine, by default
+    matlab.engine.start_matlab. Any object with the genpath, addpath and
+    eval methods of a MATLAB engine can stand in for it.
+    """
+    def __init__(self, size=1, max_size=None, paths=ANALYSIS_PATHS, start_engine=start_matlab_engine, log_flag="GUI Engines:"):
+        self.size = size
+        self.max_size = max(size, max_size) if max_size is not None else size
+        self.paths = {key: os.path.abspath(path) for key, path in paths.items()}
+        self.start_engine = start_engine
+        self.log_flag = log_flag
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._count = 0     # Engines alive or being started
+        self._starting = 0  # Engines being started
+        self._waiting = 0   # Callers waiting for an engine
+        self._genpaths = {}  # genpath strings of every engine, by id
+        self._threads = []   # Threads starting engines
+        self._closed = False
+
+    def _new_engine(self):
+        start_time = time.time()
+        eng = self.start_engine()
+        # genpath is computed once per engine and reused on every lease
+        genpaths = {}
+        try:
+            for key, folder_path in self.paths.items():
+                genpaths[key] = eng.genpath(folder_path)
+                eng.addpath(genpaths[key], nargout=0)
+        except Exception:
+            # Do not leave an engine without the paths running
+            try:
+                eng.quit()
+            except Exception:
+                pass
+            raise
+        self._genpaths[id(eng)] = genpaths
+        print(f"{self.log_flag} Started a MATLAB engine in {time.time() - start_time:.2f} seconds.")
+        return eng
+
+    def _spawn(self):
+        # Start a new engine in the background and leave it idle when ready
+        with self._lock:
+            if self._closed or self._count >= self.max_size:
+                return False
+            self._count += 1
+            self._starting += 1
+        def worker():
+            try:
+                eng = self._new_engine()
+            except Exception as error:
+                print(f"{self.log_flag} Could not start a MATLAB engine: {error}")
+                with self._lock:
+                    self._count -= 1
+                    self._starting -= 1
+                self._idle.put(error)
+                return
+            with self._lock:
+                self._starting -= 1
+                closed = self._closed
+            # The pool may have been shut down while the engine was starting
+            if closed:
+                self._discard(eng)
+                return
+            self._idle.put(eng)
+        thread = threading.Thread(target=worker, daemon=True)
+        with self._lock:
+            self._threads = [_ for _ in self._threads if _.is_alive()] + [thread]
+        thread.start()
+        return True
+
+    def start(self):
+        # Warm up the pool without blocking the caller
+        with self._lock:
+            missing = self.size - self._count
+        for _ in range(missing):
+            self._spawn()
+
+    def acquire(self, timeout=None):
+        if self._closed:
+            raise RuntimeError("The MATLAB engine pool is closed.")
+        try:
+            item = self._idle.get_nowait()
+        except queue.Empty:
+            # Lazily grow the pool up to max_size when every engine is busy
+            # and none of the ones being started is already promised
+            with self._lock:
+                self._waiting += 1
+                grow = self._waiting > self._starting
+            if grow:
+                self._spawn()
+            try:
+                item = self._idle.get(timeout=timeout)
+            finally:
+                with self._lock:
+                    self._waiting -= 1
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    def release(self, eng, broken=None):
+        # The algorithms catch their own errors, so unless told otherwise
+        # check the engine survived before giving it back
+        if broken is None:
+            broken = not is_engine_alive(eng)
+        if broken or self._closed:
+            self._discard(eng)
+            if not self._closed:
+                print(f"{self.log_flag} Restarting a crashed MATLAB engine...")
+                self._spawn()
+            return
+        self._idle.put(eng)
+
+    def _discard(self, eng):
+        with self._lock:
+            self._count -= 1
+        self._genpaths.pop(id(eng), None)
+        try:
+            eng.quit()
+        except Exception:
+            pass
+
+    def prioritize(self, eng, algorithm):
+        # Several algorithms share function names (e.g. shuffle.m), bring the
+        # folder of the requested one to the top of the MATLAB path
+        genpaths = self._genpaths.get(id(eng), {})
+        if algorithm in genpaths:
+            eng.addpath(genpaths[algorithm], nargout=0)
+
+    @contextmanager
+    def lease(self, algorithm=None, timeout=None):
+        eng = self.acquire(timeout=timeout)
+        try:
+            if algorithm is not None:
+                self.prioritize(eng, algorithm)
+            yield eng
+        finally:
+            self.release(eng)
+
+    def shutdown(self, timeout=None):
+        with self._lock:
+            self._closed = True
+            threads = list(self._threads)
+        # Wait for the engines being started, they quit themselves once ready
+        for thread in threads:
+            thread.join(timeout)
+        while True:
+            try:
+                item = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not isinstance(item, Exception):
+                self._discard(item)
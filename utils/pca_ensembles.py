@@ -0,0 +1,334 @@
+import time
+import warnings
+import numpy as np
+from scipy import sparse
+from scipy.spatial.distance import cdist
+from scipy.stats import f as f_distribution
+
+# Python port of analysis/NeuralEnsembles/AssemblyGui/raster2ens_by_density.m
+# (Herzog et al. 2021). Only the npcs principal components are computed and
+# the bin to bin distances are never stored: every stage that needs them
+# goes through blocks of rows, so the memory grows linearly with the bins.
+
+# Elements of every block of the distance matrix (128 MB of doubles)
+BLOCK_ELEMENTS = 2**24
+
+def matlab_round(value):
+    # MATLAB rounds halves away from zero
+    return int(np.floor(value + 0.5))
+
+def row_blocks(rows, columns, block_elements=BLOCK_ELEMENTS):
+    size = max(1, block_elements // max(columns, 1))
+    for start in range(0, rows, size):
+        yield start, min(start + size, rows)
+
+def truncated_pca(data, npcs):
+    # pca(data) keeping only the scores of the first npcs components. The
+    # covariance is accumulated by blocks of observations, the explained
+    # variance of every component is still returned for the eigs plot
+    observations, variables = data.shape
+    mean = data.mean(axis=0)
+    gram = np.zeros((variables, variables))
+    for start, end in row_blocks(observations, variables):
+        block = np.asarray(data[start:end], dtype=float)
+        gram += block.T @ block
+    covariance = (gram - observations * np.outer(mean, mean)) / (observations - 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    eigenvalues = np.maximum(eigenvalues[::-1], 0)[:min(observations - 1, variables)]
+    coeff = eigenvectors[:, ::-1][:, :npcs]
+    # Same sign convention as MATLAB, largest coefficient of each component is positive
+    signs = np.sign(coeff[np.abs(coeff).argmax(axis=0), np.arange(coeff.shape[1])])
+    coeff = coeff * np.where(signs == 0, 1, signs)
+    scores = np.empty((observations, coeff.shape[1]))
+    for start, end in row_blocks(observations, variables):
+        scores[start:end] = (np.asarray(data[start:end], dtype=float) - mean) @ coeff
+    explained = 100 * eigenvalues / eigenvalues.sum()
+    return scores, explained
+
+def density_by_neighbors(points, perc_neigh):
+    # paraSetv2, inverse of the mean distance to the dc nearest neighbors
+    NE = len(points)
+    dc = min(matlab_round(perc_neigh * NE), NE - 1)
+    rho = np.zeros(NE)
+    if dc < 1:
+        return rho
+    for start, end in row_blocks(NE, NE):
+        dist = cdist(points[start:end], points)
+        nearest = np.sort(np.partition(dist, dc, axis=1)[:, :dc + 1], axis=1)
+        with np.errstate(divide='ignore'):
+            rho[start:end] = 1 / nearest[:, 1:].mean(axis=1)
+    rho[np.isnan(rho)] = 0
+    return rho
+
+def delta_from_points(points, rho):
+    # delta_from_dist_mat, distance to the closest point with higher density.
+    # Each block only needs the distances to the points ranked before it
+    NE = len(points)
+    ord_rho = np.argsort(-rho, kind='stable')
+    sorted_points = points[ord_rho]
+    sorted_delta = np.full(NE, np.inf)
+    for start, end in row_blocks(NE, NE):
+        dist = cdist(sorted_points[start:end], sorted_points[:end])
+        # Keep lower ranks only and skip zero distances, as the MATLAB code does
+        dist[np.arange(start, end)[:, np.newaxis] <= np.arange(end)[np.newaxis, :]] = np.inf
+        dist[dist == 0] = np.inf
+        sorted_delta[start:end] = dist.min(axis=1)
+    delta = np.empty(NE)
+    delta[ord_rho] = sorted_delta
+    finite = ~np.isinf(delta)
+    if np.any(finite):
+        delta[rho == rho.max()] = delta[finite].max()
+    delta[np.isinf(delta)] = 0
+    return delta
+
+def robust_linear_fit(x, y, tune=4.685, max_iter=50):
+    # fit(x, y, 'poly1') with Robust 'bisquare': iteratively reweighted least
+    # squares with leverage adjusted residuals, s = MAD/0.6745 as the Curve
+    # Fitting Toolbox documents it. robustfit leaves out the p smallest
+    # residuals from the MAD instead, which changes the benchmark centroids
+    # by at most one
+    X = np.column_stack([x, np.ones(len(x))])
+    Q, _ = np.linalg.qr(X)
+    leverage = np.minimum(0.9999, np.sum(Q**2, axis=1))
+    adjust = 1 / np.sqrt(1 - leverage)
+    coeffs = np.linalg.lstsq(X, y, rcond=None)[0]
+    weights = np.ones(len(x))
+    for _ in range(max_iter):
+        residuals = (y - X @ coeffs) * adjust
+        s = np.median(np.abs(residuals - np.median(residuals))) / 0.6745
+        if s == 0:
+            break
+        u = residuals / (tune * s)
+        weights = (np.abs(u) < 1) * (1 - u**2)**2
+        sqrt_weights = np.sqrt(weights)
+        new_coeffs = np.linalg.lstsq(X * sqrt_weights[:, np.newaxis], y * sqrt_weights, rcond=None)[0]
+        converged = np.max(np.abs(new_coeffs - coeffs)) <= np.sqrt(np.finfo(float).eps) * max(np.max(np.abs(new_coeffs)), np.max(np.abs(coeffs)))
+        coeffs = new_coeffs
+        if converged:
+            break
+    return coeffs, weights
+
+def upper_prediction_bound(x, y, coeffs, weights, level):
+    # Upper bound of predint(fitresult, x, level, 'observation', 'on'), with
+    # the MSE and covariance of the last weighted least squares step
+    X = np.column_stack([x, np.ones(len(x))])
+    n, p = X.shape
+    residuals = y - X @ coeffs
+    mse = np.sum(weights * residuals**2) / (n - p)
+    covariance = mse * np.linalg.pinv(X.T @ (X * weights[:, np.newaxis]))
+    crit = np.sqrt((p + 1) * f_distribution.ppf(level, p + 1, n - p))
+    spread = np.sqrt(mse + np.sum((X @ covariance) * X, axis=1))
+    return X @ coeffs + crit * spread
+
+def cluster_by_pow_fit(delta, rho, pb):
+    # Centroids are the points above the prediction bound of a power law
+    # fitted to delta vs rho
+    NE = len(rho)
+    cent_ind = np.zeros(NE)
+    nzind = np.flatnonzero((delta > 1e-4) & (rho > 0) & ~np.isinf(rho))
+    if len(nzind) < 3:
+        return 0, cent_ind, np.zeros((0, 2))
+    nzdelta = delta[nzind]
+    nzrho = rho[nzind]
+    coeffs, weights = robust_linear_fit(np.log(nzrho), np.log(nzdelta))
+    upper = upper_prediction_bound(np.log(nzrho), np.log(nzdelta), coeffs, weights, pb / 100)
+    centid = nzind[nzdelta > np.exp(upper)]
+    num_clust = len(centid)
+    cent_ind[centid] = np.arange(1, num_clust + 1)
+    predbounds = np.column_stack([nzrho, np.exp(upper)])
+    return num_clust, cent_ind, predbounds
+
+def standardize_rows(data):
+    # Rows centered and scaled to unit norm, so correlations are dot products
+    centered = data - data.mean(axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return centered / np.linalg.norm(centered, axis=1, keepdims=True)
+
+def percentile_ranks(n, p):
+    # prctile of n values interpolates as numpy's 'hazen' method between the
+    # order statistics lower and upper (1-based) of r = n*p/100 + 0.5
+    r = n * p / 100 + 0.5
+    lower = min(max(int(np.floor(r)), 1), n)
+    upper = min(lower + 1, n)
+    return lower, upper, min(max(r - lower, 0), 1)
+
+def find_core_cells_by_correlation(raster, ens_raster, nsur, p, rng=None, batch_size=100):
+    # A core cell correlates with its ensemble above the p percentile of the
+    # correlation with time shuffled versions of the ensemble activity.
+    # The ensemble rasters are binary, so the correlation with a shuffle is
+    # the sum of the standardized cell activity over random frames scaled by
+    # a constant, computed for batch_size surrogates at a time as one sparse
+    # product. Only the order statistics the percentile needs are kept for
+    # every cell instead of the correlations with all the surrogates
+    rng = np.random.default_rng(rng)
+    N, T = raster.shape
+    nens = ens_raster.shape[0]
+    raster_z = standardize_rows(np.asarray(raster, dtype=float))
+    ens_z = standardize_rows(np.asarray(ens_raster, dtype=float))
+    ens_cel_corr = raster_z @ ens_z.T
+    lower, upper, fraction = percentile_ranks(nsur, p)
+    # Keep the largest values down to the lower rank, or the smallest up to
+    # the upper one, whichever are fewer
+    largest = nsur - lower + 1 <= upper
+    keep = nsur - lower + 1 if largest else upper
+    idthr = np.full((N, nens), np.nan)
+    for e in range(nens):
+        active = int(np.sum(ens_raster[e] > 0))
+        if active == 0 or active == T:
+            continue
+        scale = np.sqrt(active * (1 - active / T))
+        order_stats = np.empty((N, 0))
+        for start in range(0, nsur, batch_size):
+            count = min(batch_size, nsur - start)
+            frames = np.concatenate([rng.choice(T, active, replace=False) for _ in range(count)])
+            surrogates = np.repeat(np.arange(count), active)
+            selection = sparse.csr_matrix((np.ones(len(frames)), (frames, surrogates)), shape=(T, count))
+            order_stats = np.concatenate([order_stats, (selection.T @ raster_z.T).T / scale], axis=1)
+            if order_stats.shape[1] > keep:
+                if largest:
+                    order_stats = np.partition(order_stats, -keep, axis=1)[:, -keep:]
+                else:
+                    order_stats = np.partition(order_stats, keep - 1, axis=1)[:, :keep]
+        order_stats.sort(axis=1)
+        if largest:
+            x_lower, x_upper = order_stats[:, lower - nsur - 1], order_stats[:, upper - nsur - 1]
+        else:
+            x_lower, x_upper = order_stats[:, lower - 1], order_stats[:, upper - 1]
+        idthr[:, e] = x_lower + fraction * (x_upper - x_lower)
+    with np.errstate(invalid='ignore'):
+        neuronid = ens_cel_corr > idthr
+    return neuronid, idthr, ens_cel_corr
+
+def first_nonsingleton(data):
+    # MATLAB reduces a row vector along its length, not along its rows
+    return data.T if data.ndim == 2 and data.shape[0] == 1 else data
+
+def nanmean_columns(data):
+    # MATLAB nanmean
+    data = first_nonsingleton(data)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanmean(data, axis=0) if data.size > 0 else np.array([np.nan])
+
+def nanstd_columns(data):
+    # MATLAB nanstd, the std of a single value is 0
+    data = first_nonsingleton(data)
+    if data.size == 0:
+        return np.array([np.nan])
+    counts = np.sum(~np.isnan(data), axis=0)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        std = np.nanstd(data, axis=0, ddof=1)
+    std[counts == 1] = 0
+    return std
+
+def filter_ens_by_inner_corr(raster, core_cells, sdfact):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        C_cells = np.corrcoef(raster)
+    C_cells = np.triu(C_cells, 1)
+    C_cells[C_cells == 0] = np.nan
+    noncore = core_cells.sum(axis=1) == 0
+    noncore_cells = C_cells[np.ix_(noncore, noncore)]
+    noncore_corr = nanmean_columns(nanmean_columns(noncore_cells)[np.newaxis, :])[0]
+    noncore_std = nanstd_columns(nanstd_columns(noncore_cells)[:, np.newaxis])[0]
+    if np.isnan(noncore_corr):
+        noncore_corr = nanmean_columns(nanmean_columns(C_cells)[np.newaxis, :])[0]
+        noncore_std = nanstd_columns(nanstd_columns(C_cells)[:, np.newaxis])[0]
+    ens_corr = np.array([nanmean_columns(nanmean_columns(C_cells[np.ix_(core, core)])[np.newaxis, :])[0]
+                         for core in core_cells.T.astype(bool)])
+    corr_thr = noncore_corr + sdfact * noncore_std
+    with np.errstate(invalid='ignore'):
+        selection = ens_corr > corr_thr
+    return ens_corr, corr_thr, selection
+
+def raster2ens_by_density(raster, pars, rng=None):
+    raster = np.asarray(raster)
+    npcs = int(pars.get('npcs', 6))
+    minsize = pars.get('minsize', 3)
+
+    print("> Selecting timepoints...")
+    N, T = raster.shape
+    selbins = raster.sum(axis=0) > pars.get('minspk', 3)
+    ras = raster[:, selbins].astype(float)
+
+    print("> Calculating PCA and distance matrix...")
+    pcs, exp_var = truncated_pca(ras.T, npcs)
+
+    print("> Rho and delta computation...")
+    rho = density_by_neighbors(pcs, pars.get('dc', 0.02))
+    delta = delta_from_points(pcs, rho)
+    Nens, cents, predbounds = cluster_by_pow_fit(delta, rho, pars.get('cent_thr', 99.9))
+    if Nens == 1:
+        labels = np.ones(len(delta))
+    elif Nens == 0:
+        labels = np.zeros(len(delta))
+    else:
+        dist2cent = cdist(pcs[cents > 0], pcs)
+        labels = dist2cent.argmin(axis=0) + 1.0
+
+    print("> Calculating ensemble raster...")
+    ensmat_out = np.zeros((Nens, T))
+    ensmat_out[:, selbins] = labels[np.newaxis, :] == np.arange(1, Nens + 1)[:, np.newaxis]
+
+    print("> Core-cells computation...")
+    core_cells, idthr, ens_cel_corr = find_core_cells_by_correlation(raster, ensmat_out, int(pars.get('nsur', 100)), pars.get('prct', 99.9), rng=rng)
+    id_sel_core = core_cells.sum(axis=0) > minsize
+
+    print("> Filtering core cells...")
+    ens_corr, corr_thr, corr_selection = filter_ens_by_inner_corr(raster, core_cells, pars.get('inner_corr', 0))
+    final_sel_ens = corr_selection & id_sel_core
+
+    print("> Final ensemble filtering...")
+    sel_ensmat_out = ensmat_out[final_sel_ens]
+    sel_core_cells = core_cells[:, final_sel_ens]
+    Nens_final = sel_ensmat_out.shape[0]
+    sel_labels = (sel_ensmat_out * np.arange(1, Nens_final + 1)[:, np.newaxis]).sum(axis=0)
+
+    print("> Packing final results...")
+    # The bin to bin distance matrix (bincor) is not returned, it is never built.
+    # Neither is the N x nens x nsur cube of surrogate correlations that the
+    # MATLAB results keep as sur_cel_cor, only its percentile idthr
+    results = {
+        'active_raster': ras,
+        'selbins': selbins,
+        'exp_var': exp_var,
+        'pcs': pcs,
+        'rho': rho,
+        'delta': delta,
+        'Nens': Nens,
+        'cents': cents,
+        'predbounds': predbounds,
+        'labels': labels[np.newaxis, :],
+        'ensmat_out': ensmat_out,
+        'core_cells': core_cells,
+        'ens_cel_corr': ens_cel_corr,
+        'idthr': idthr,
+        'id_sel_core': id_sel_core,
+        'ens_corr': ens_corr[np.newaxis, :],
+        'corr_thr': corr_thr,
+        'corr_selection': corr_selection,
+        'final_sel_ens': final_sel_ens,
+        'sel_ensmat_out': sel_ensmat_out,
+        'sel_core_cells': sel_core_cells,
+        'Nens_final': Nens_final,
+        'sel_labels': sel_labels
+    }
+    return results
+
+def benchmark(sizes=((200, 5000), (400, 20000), (1000, 100000))):
+    pars = {'dc': 0.01, 'npcs': 3, 'minspk': 3, 'nsur': 1000, 'prct': 99.9,
+            'cent_thr': 99.9, 'inner_corr': 5, 'minsize': 3}
+    rng = np.random.default_rng(0)
+    for neurons, frames in sizes:
+        raster = (rng.random((neurons, frames)) < 0.02).astype(float)
+        for _ in range(5):
+            cells = rng.choice(neurons, neurons // 20, replace=False)
+            onsets = rng.choice(frames, frames // 10, replace=False)
+            raster[np.ix_(cells, onsets)] = rng.random((len(cells), len(onsets))) < 0.7
+        start_time = time.time()
+        answer = raster2ens_by_density(raster, pars, rng=0)
+        print(f"{neurons} x {frames} ({int(answer['selbins'].sum())} active bins): "
+              f"{time.time() - start_time:.2f} seconds, {answer['Nens_final']} ensembles")
+
+if __name__ == "__main__":
+    benchmark()
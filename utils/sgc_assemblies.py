@@ -0,0 +1,33 @@
+import os
+import sys
+import numpy as np
+
+# Runs the Similarity-Graph-Clustering assembly detection (Mölter, Avitan &
+# Goodhill 2018) in-process. SGC.py imports its helpers from the Modules
+# folder next to it, so that folder needs to be in the path. Rasters are
+# neurons x time bins as in the rest of the GUI, SGC works with time x neurons.
+SGC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'analysis', 'sgc-assembly-detection')
+if SGC_PATH not in sys.path:
+    sys.path.append(SGC_PATH)
+
+import SGC
+
+def sgc_assemblies(raster, pars):
+    activity_raster = SGC.activity_raster_preprocessing_array(np.asarray(raster).T,
+        shuffling_rounds=int(pars['shuffling_rounds']),
+        coactivity_significance_level=pars['coactivity_significance_level'])
+    print(f"SGC: {len(activity_raster['activity_raster_peaks'])} significant coactivity peaks")
+
+    detection = SGC.assembly_detection_array(activity_raster,
+        montecarlo_rounds=int(pars['montecarlo_rounds']),
+        montecarlo_steps=int(pars['montecarlo_steps']),
+        affinity_threshold=pars['affinity_threshold'])
+    if len(detection['assemblies']) == 0:
+        return None
+
+    return {
+        'activity_raster_peak_threshold': activity_raster['activity_raster_peak_threshold'],
+        'activity_raster_peaks': activity_raster['activity_raster_peaks'],
+        'assembly_pattern_detection': detection['assembly_pattern_detection'],
+        'assemblies': detection['assemblies']
+    }
@@ -0,0 +1,507 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from scipy.stats import rankdata
+
+# Python port of analysis/SVD/Stoixeion.m (Carrillo-Reid et al. 2015)
+# Every function follows the MATLAB function of the same stage, with the
+# loops replaced by matrix operations. Rasters are neurons x frames and all
+# the indices in the answer are 1-based, as the MATLAB engine returns them.
+
+def colon(start, step, stop):
+    # Same values as MATLAB's start:step:stop, which builds the range from
+    # both ends to avoid accumulating the floating point error of the step
+    count = int(np.floor((stop - start) / step + 1e-10))
+    if count < 0:
+        return np.array([])
+    k = np.arange(count + 1)
+    end = start + count * step
+    half = (count + 1) // 2
+    return np.where(k < half, start + k * step, end - (count - k) * step)
+
+def histc(values, edges):
+    # MATLAB histc: edges[k] <= x < edges[k+1], the last bin only counts
+    # values equal to the last edge and out of range values are dropped.
+    # The edges are evenly spaced, so the bin is found by division and only
+    # corrected where rounding puts a value next to its edge
+    values = np.ravel(values)
+    values = values[(values >= edges[0]) & (values <= edges[-1])]
+    if len(edges) == 1:
+        return np.array([float(np.sum(values == edges[0]))])
+    step = (edges[-1] - edges[0]) / (len(edges) - 1)
+    idx = np.minimum(((values - edges[0]) / step).astype(int), len(edges) - 1)
+    idx[values < edges[idx]] -= 1
+    upper = np.minimum(idx + 1, len(edges) - 1)
+    idx[(idx + 1 < len(edges)) & (values >= edges[upper])] += 1
+    return np.bincount(idx, minlength=len(edges)).astype(float)
+
+def shuffle_time(data, rng):
+    # shuffle(x,'time'), every cell keeps its activity at random frames
+    return rng.permuted(data, axis=1)
+
+def normalize_columns(data):
+    norms = np.linalg.norm(data, axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return data / norms
+
+def cosine_similarity(A, B=None):
+    # 1-pdist2(A',B','cosine'), frames without activity give NaN
+    An = normalize_columns(A)
+    Bn = An if B is None else normalize_columns(B)
+    with np.errstate(invalid='ignore'):
+        return An.T @ Bn
+
+def find_high_activity_frames(data, pks=None, num_shuff=100, p=0.98, rng=None):
+    rng = np.random.default_rng(rng)
+    activity = data.sum(axis=0)
+    if pks is None:
+        # findHighactFrames.m takes the frames of every shuffle from the first
+        # shuffled raster (data_shuff(:,idx) only reaches its first page), this
+        # keeps that behavior so the thresholds match. Only the first shuffled
+        # raster and the activity of the frames of every shuffle are needed
+        first_shuffle = shuffle_time(data, rng)
+        shuffled_activity = np.empty((num_shuff, data.shape[1]))
+        shuffled_activity[0] = first_shuffle.sum(axis=0)
+        for n2 in range(1, num_shuff):
+            shuffled_activity[n2] = shuffle_time(data, rng).sum(axis=0)
+        first_shuffle = normalize_columns(first_shuffle)
+        first_active = np.isfinite(first_shuffle).all(axis=0)
+        first_shuffle = np.nan_to_num(first_shuffle)
+        high = np.nan_to_num(normalize_columns(data))
+        # The frames above n only lose the frames at n-1 when n grows, so the
+        # sums of the unit vectors of the selected frames of the data and of
+        # every shuffle are updated instead of recomputed
+        selected = (shuffled_activity >= 3) & first_active
+        sums = first_shuffle @ selected.T
+        sizes = selected.sum(axis=1)
+        high_sum = high[:, activity >= 3].sum(axis=1)
+        high_size = np.sum(activity >= 3)
+        for n in range(3, int(activity.max()) + 1):
+            if n > 3:
+                dropped = (shuffled_activity == n - 1) & first_active
+                high_dropped = activity == n - 1
+                # Nothing changed, neither does the criterion
+                if not dropped.any() and not high_dropped.any():
+                    continue
+                frames = dropped.any(axis=0)
+                sums -= first_shuffle[:, frames] @ dropped[:, frames].T
+                sizes = sizes - dropped.sum(axis=1)
+                selected &= ~dropped
+                high_sum -= high[:, high_dropped].sum(axis=1)
+                high_size -= np.sum(high_dropped)
+            # No shuffle reaches n, nor any larger threshold
+            if not sizes.any():
+                break
+            # The mean of a cosine similarity matrix is |sum of unit vectors|^2 / m^2
+            mean_similarity = np.sum(high_sum**2) / high_size**2
+            # Mean similarity of every selected frame of every shuffle, only
+            # for the frames still selected in any of them
+            frames = selected.any(axis=0)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                projections = (first_shuffle[:, frames].T @ sums) / sizes
+            S_out = projections.T[selected[:, frames]]
+            bins = colon(0, 0.02, S_out.max())
+            cd = histc(S_out, bins)
+            if cd.sum() == 0:
+                continue
+            cd = np.cumsum(cd / cd.sum())
+            above = np.flatnonzero(cd > p)
+            if len(above) > 0 and mean_similarity > bins[above[0]]:
+                pks = n
+                break
+    # Like the MATLAB version, when no threshold is significant pks stays
+    # empty (None) and there are no high activity frames
+    if pks is None:
+        pks_frame = np.array([], dtype=int)
+    else:
+        pks_frame = np.flatnonzero(activity >= pks)
+    return data[:, pks_frame], pks_frame, pks
+
+def tf_idf_normalization(raster):
+    # Ras_tf_idf, term frequency by frame times inverse frequency by cell
+    frames = raster.shape[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tf = raster / raster.sum(axis=0)
+        appearances = (raster == 1).sum(axis=1)
+        idf = np.where(appearances > 0, 1 + np.log(frames / np.maximum(appearances, 1)), 1 + np.log(frames))
+    return tf * idf[:, np.newaxis]
+
+def similarity_histogram(data, bins, block_size):
+    # histc of the cosine similarities of every pair of frames, computed for
+    # block_size frames at a time
+    normalized = normalize_columns(data)
+    counts = np.zeros(len(bins))
+    for start in range(0, data.shape[1], block_size):
+        with np.errstate(invalid='ignore'):
+            counts += histc(normalized[:, start:start + block_size].T @ normalized, bins)
+    return counts
+
+def calc_scut(data, num_shuff=100, p=0.88, rng=None, block_size=None, workers=1):
+    # Threshold of similarity from time shuffled data. Only the histogram is
+    # needed, so it is accumulated over blocks of block_size x frames
+    # similarities and over the shuffles instead of keeping all the
+    # similarity matrices. The shuffles are drawn in order, workers at a time,
+    # and their histograms computed in a thread pool, so the result does not
+    # depend on the number of workers
+    rng = np.random.default_rng(rng)
+    if block_size is None:
+        block_size = max(1, (1 << 22) // max(1, data.shape[1]))
+    bins = colon(0, 0.01, 1)
+    counts = np.zeros(len(bins))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, num_shuff, workers):
+            shuffles = [shuffle_time(data, rng) for _ in range(min(workers, num_shuff - start))]
+            for histogram in executor.map(lambda shuffled: similarity_histogram(shuffled, bins, block_size), shuffles):
+                counts += histogram
+    cd = np.cumsum(counts / counts.sum())
+    return bins[np.flatnonzero(cd > p)[0]]
+
+# Number of set bits of every byte, for NumPy versions without bitwise_count
+POPCOUNT_TABLE = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+def popcount(words):
+    # Set bits of every element of a uint64 array, summed over the last axis
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    return POPCOUNT_TABLE[words.view(np.uint8)].sum(axis=-1, dtype=np.int64)
+
+def pack_columns(A):
+    # Every column of a binary matrix as a row of 64 bit words
+    packed = np.packbits(A.T, axis=1)
+    padding = -packed.shape[1] % 8
+    if padding:
+        packed = np.pad(packed, ((0, 0), (0, padding)))
+    return np.ascontiguousarray(packed).view(np.uint64)
+
+def hdist(A, block_size=None, packed=False):
+    # Hdist, fraction of differing elements over the active ones between
+    # every pair of binary columns. With |a xor b| = |a or b| - |a and b| and
+    # |a or b| = |a| + |b| - |a and b| only the shared elements of every pair
+    # are needed, which are a Gram matrix computed for block_size columns at
+    # a time, either as a matrix product or with packed bits and popcounts
+    A = np.asarray(A) != 0
+    rows, columns = A.shape
+    if block_size is None:
+        block_size = columns
+    Hd = np.empty((columns, columns))
+    if packed:
+        words = pack_columns(A)
+        active = popcount(words)
+        # Keep the block of pairwise words at about 16M elements
+        block_size = max(1, min(block_size, (1 << 24) // max(1, columns * words.shape[1])))
+    else:
+        # Counts up to 2^24 are exact in single precision
+        A = A.astype(np.float32 if rows < (1 << 24) else np.float64)
+        active = A.sum(axis=0, dtype=np.float64)
+    for start in range(0, columns, block_size):
+        stop = min(start + block_size, columns)
+        if packed:
+            shared = popcount(words[start:stop, np.newaxis, :] & words[np.newaxis, :, :])
+        else:
+            shared = (A[:, start:stop].T @ A).astype(np.float64)
+        union = active[start:stop, np.newaxis] + active[np.newaxis, :] - shared
+        with np.errstate(divide='ignore', invalid='ignore'):
+            Hd[start:stop] = (union - shared) / union
+    return Hd
+
+def hdist_loop(A):
+    # Hdist.m, one pair of columns at a time, as a reference
+    A = np.asarray(A) != 0
+    columns = A.shape[1]
+    Hd = np.zeros((columns, columns))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i in range(columns):
+            for j in range(i, columns):
+                Hd[i, j] = Hd[j, i] = np.sum(A[:, i] ^ A[:, j]) / np.sum(A[:, i] | A[:, j])
+    return Hd
+
+def count_factor_above(v, s, cut):
+    # Number of elements of v*v'*s above cut without building the matrix,
+    # only pairs of values with the same sign can pass a positive cut
+    if s <= 0:
+        return 0
+    count = 0
+    for values in (np.sort(v[v > 0]), np.sort(-v[v < 0])):
+        if len(values) > 0:
+            count += np.sum(len(values) - np.searchsorted(values, cut / s / values, side='right'))
+    return int(count)
+
+def frames_in_factor(v, s, cut):
+    # Columns of v*v'*s with at least one element above cut
+    return np.maximum(v * v.max(), v * v.min()) * s > cut
+
+def states_from_svd(S_indexp, state_cut, p=0.05):
+    # Edos_from_Sindex_svd
+    sz = S_indexp.shape[1]
+    _, S, Vh = np.linalg.svd(S_indexp)
+    V = Vh.T
+    state_cut = min(state_cut, len(S))
+    fac_cut = 0.4
+    while True:
+        fac_count = np.array([count_factor_above(V[:, n], S[n], fac_cut) for n in range(state_cut)])
+        edos_temp1 = np.floor(np.sqrt(fac_count))
+        if edos_temp1.sum() > 0:
+            states = np.flatnonzero(edos_temp1 / edos_temp1.sum() >= p)
+        else:
+            states = np.array([], dtype=int)
+        edos_pks_num = np.zeros((len(states), sz))
+        for epi, state in enumerate(states):
+            edos_pks_num[epi, frames_in_factor(V[:, state], S[state], fac_cut)] = 1
+        # Increase the cut until no frame belongs to two states
+        if len(states) > 0 and edos_pks_num.sum(axis=0).max() > 1:
+            fac_cut = fac_cut + 0.01
+        else:
+            break
+    num_state = len(states)
+    svd_sig = np.zeros((sz, sz, num_state))
+    for n, state in enumerate(states):
+        svd_sig[:, :, n] = np.outer(V[:, state], V[:, state]) * S[state] > fac_cut
+    # flipud(sortrows(edos_pks_num))
+    order = np.lexsort(edos_pks_num.T[::-1])
+    edos_pks_num_sort = edos_pks_num[order][::-1]
+    C_edos = edos_pks_num_sort.T
+    sec_Pk_edos = (edos_pks_num_sort * np.arange(1, num_state + 1)[:, np.newaxis]).sum(axis=0)
+    return C_edos, sec_Pk_edos, np.diag(S), num_state, svd_sig
+
+def roc_auc(labels, scores):
+    # Area under the ROC curve as perfcurve computes it, ignoring NaN scores
+    valid = ~np.isnan(scores)
+    labels = labels[valid]
+    positives = labels.sum()
+    negatives = len(labels) - positives
+    if positives == 0 or negatives == 0:
+        return np.nan
+    ranks = rankdata(scores[valid])
+    return (ranks[labels].sum() - positives * (positives + 1) / 2) / (positives * negatives)
+
+def find_core_cells(tf_idf_raster, raster, sec_Pk_edos, num_state, csi_vec):
+    # Cross-validate the cut of every state with the cosine similarity
+    core_cells = []
+    for csi in range(1, num_state + 1):
+        labels = sec_Pk_edos == csi
+        tf_idf_csi_hist = tf_idf_raster[:, labels].sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tf_idf_csi_hist_norm = tf_idf_csi_hist / tf_idf_csi_hist.max()
+        core_vecs = (tf_idf_csi_hist_norm[:, np.newaxis] > csi_vec[np.newaxis, :]).astype(float)
+        sim_core = cosine_similarity(raster, core_vecs)
+        auc = np.array([roc_auc(labels, sim_core[:, n]) for n in range(len(csi_vec))])
+        # max ignores NaN and keeps the first maximum
+        best_indx = 0 if np.all(np.isnan(auc)) else int(np.nanargmax(auc))
+        core_cells.append(np.flatnonzero(tf_idf_csi_hist_norm > csi_vec[best_indx]))
+    return core_cells
+
+def search_significant(core_cells, tf_idf_raster, raster):
+    # Search_significant, similarity of the tf-idf query of each state with
+    # every frame
+    sis_query = np.zeros((tf_idf_raster.shape[0], len(core_cells)))
+    for sis_i, cells in enumerate(core_cells):
+        sis_query[cells, sis_i] = 1
+    frames = tf_idf_raster.shape[1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        appearances = (raster == 1).sum(axis=1)
+        idf = np.where(appearances > 0, 1 + np.log(frames / np.maximum(appearances, 1)), 1 + np.log(frames))
+        tf_idf_query = sis_query / sis_query.sum(axis=0) * idf[:, np.newaxis]
+    S_index_significant = cosine_similarity(tf_idf_query, tf_idf_raster)
+    return S_index_significant, sis_query
+
+def pkedos(C_edos, Rasterbin):
+    # Pkedos, the peaks (1-based, padded with zeros) of every state and the
+    # cells active in them numbered by state, with the states sorted by
+    # their first peak
+    states = C_edos.shape[1]
+    state_of_peak = C_edos @ np.arange(1, states + 1)
+    peaks = [np.flatnonzero(state_of_peak == state) + 1 for state in range(1, states + 1)]
+    Pksc = np.zeros((max((len(_) for _ in peaks), default=0), states))
+    for state, state_peaks in enumerate(peaks):
+        Pksc[:len(state_peaks), state] = state_peaks
+    order = np.argsort(Pksc[0], kind='stable') if len(Pksc) > 0 else np.arange(states)
+    Pk_edos = Pksc[:, order]
+    Cells_edos = ((Rasterbin @ C_edos)[:, order] >= 1) * np.arange(1, states + 1)
+    return Pk_edos, Cells_edos
+
+def search_edos_coords(Cells_edos, sis_query, coordinates):
+    # Search_edos_coords, [x, y, cell] of the cells of every state and of
+    # the core cells of every state, padded with zeros
+    cells, states = Cells_edos.shape
+    Cells_coords = np.zeros((cells, 3, states))
+    Pools_coords = np.zeros((cells, 3, states))
+    for seci in range(states):
+        for coords, members in ((Cells_coords, Cells_edos[:, seci]), (Pools_coords, sis_query[:, seci])):
+            pool = np.flatnonzero(members > 0)
+            coords[:len(pool), :2, seci] = coordinates[pool]
+            coords[:len(pool), 2, seci] = pool + 1
+    return Cells_coords, Pools_coords
+
+def optional_value(value):
+    # The GUI sends pks and scut as empty arrays to compute them
+    value = np.atleast_1d(value)
+    return float(value[0]) if value.size > 0 else None
+
+def stoixeion(spikes, pars, coordinates=None, rng=None):
+    print(" -> Running Stoixeion")
+    rng = np.random.default_rng(rng)
+    spikes = np.asarray(spikes, dtype=float)
+    if coordinates is None:
+        coordinates = np.zeros((spikes.shape[0], 2))
+    pks = optional_value(pars['pks'])
+    scut = optional_value(pars['scut'])
+    hcut = pars['hcut']
+    state_cut = int(np.round(spikes.shape[0] / pars['statecut']))
+    csi_vec = colon(pars['csi_start'], pars['csi_step'], pars['csi_end'])
+    tf_idf_norm = pars['tf_idf_norm']
+    workers = (os.cpu_count() or 1) if pars.get('parallel_processing', False) else 1
+
+    calculate_pks = pks is None
+    if calculate_pks:
+        print("> Calculating pks...")
+    Rasterbin, Pks_Frame, pks = find_high_activity_frames(spikes, pks, rng=rng)
+    if pks is None:
+        raise ValueError("No significant pks was found, the raster is too sparse. Set pks manually.")
+    if calculate_pks:
+        print(f"   - Value for pks calculated: {pks}")
+
+    if tf_idf_norm:
+        print("> Performing TF-IDF normalization...")
+        tf_idf_Rasterbin = tf_idf_normalization(Rasterbin)
+    else:
+        tf_idf_Rasterbin = Rasterbin
+
+    print("> Calculating cosine similarity...")
+    S_index_ti = cosine_similarity(tf_idf_Rasterbin)
+
+    if scut is None:
+        print("> Calculating scut...")
+        scut = calc_scut(tf_idf_Rasterbin, rng=rng, workers=workers)
+        print(f"   - Value for scut calculated: {scut}")
+
+    with np.errstate(invalid='ignore'):
+        S_indexb = (S_index_ti > scut).astype(float)
+        H_index = 1 - hdist(S_indexb)
+        H_indexb = 1 - hdist((H_index > hcut).astype(float))
+        S_indexp = (H_indexb > hcut).astype(float)
+
+    print("> Performing SVD...")
+    C_edos, sec_Pk_edos, S_svd, num_state, svd_sig = states_from_svd(S_indexp, state_cut)
+    sec_Pk_frames = C_edos @ np.arange(1, C_edos.shape[1] + 1)
+    _, Cells_edos = pkedos(C_edos, Rasterbin)
+
+    print("> Finding core cells...")
+    core_cells = find_core_cells(tf_idf_Rasterbin, Rasterbin, sec_Pk_edos, num_state, csi_vec)
+    _, sis_query = search_significant(core_cells, tf_idf_Rasterbin, Rasterbin)
+
+    print("> Packing final results...")
+    _, Pools_coords = search_edos_coords(Cells_edos, sis_query, coordinates)
+    stoixeion_results = {
+        'pks': pks,
+        'scut': scut,
+        'hcut': hcut,
+        'tf_idf_norm': tf_idf_norm,
+        'state_cut': state_cut,
+        'csi_vec_start': pars['csi_start'],
+        'csi_vec_step': pars['csi_step'],
+        'csi_vec_end': pars['csi_end'],
+        'S_index_ti': S_index_ti,
+        'S_indexp': S_indexp == 0,
+        'S_svd': S_svd,
+        'num_state': num_state,
+        'svd_sig': svd_sig,
+        'Pools_coords': Pools_coords,
+        'Pks_Frame': (Pks_Frame + 1)[np.newaxis, :].astype(float),
+        'sec_Pk_Frame': sec_Pk_frames[:, np.newaxis]
+    }
+    print(" -> Done with Stoixeion")
+    return stoixeion_results
+
+def compare_with_matlab(answer, reference):
+    # Largest absolute difference of every result saved from the MATLAB
+    # Stoixeion, e.g. save('reference.mat', '-struct', 'stoixeion_results')
+    differences = {}
+    for key in ['pks', 'scut', 'num_state', 'S_index_ti', 'S_indexp', 'S_svd', 'svd_sig', 'Pools_coords', 'Pks_Frame', 'sec_Pk_Frame']:
+        ours = np.asarray(answer[key], dtype=float)
+        theirs = np.asarray(reference[key], dtype=float)
+        # MATLAB saves scalars as 1x1 and drops the trailing singleton
+        # dimension of svd_sig and Pools_coords with a single ensemble
+        if ours.shape != theirs.shape and np.squeeze(ours).shape == np.squeeze(theirs).shape:
+            ours, theirs = np.squeeze(ours), np.squeeze(theirs)
+        if ours.shape != theirs.shape:
+            differences[key] = f"shape {ours.shape} != {theirs.shape}"
+            continue
+        if key == 'S_svd':
+            ours, theirs = np.diagonal(ours), np.diagonal(theirs)
+        differences[key] = float(np.nanmax(np.abs(ours - theirs))) if ours.size > 0 else 0.0
+    return differences
+
+def synthetic_raster(neurons, frames, ensembles=4, ensemble_size=15, rate=0.02, seed=0):
+    # Random background activity with some groups of cells firing together
+    rng = np.random.default_rng(seed)
+    raster = (rng.random((neurons, frames)) < rate).astype(float)
+    for _ in range(ensembles):
+        cells = rng.choice(neurons, ensemble_size, replace=False)
+        onsets = rng.choice(frames, frames // 20, replace=False)
+        raster[np.ix_(cells, onsets)] = rng.random((ensemble_size, len(onsets))) < 0.8
+    return raster
+
+def benchmark(sizes=((100, 1000), (200, 3000), (400, 6000))):
+    pars = {'pks': np.array([]), 'scut': np.array([]), 'hcut': 0.22, 'statecut': 6,
+            'csi_start': 0.01, 'csi_step': 0.01, 'csi_end': 0.1, 'tf_idf_norm': True}
+    for neurons, frames in sizes:
+        raster = synthetic_raster(neurons, frames)
+        start_time = time.time()
+        answer = stoixeion(raster, pars, rng=0)
+        print(f"{neurons} x {frames}: {time.time() - start_time:.2f} seconds, "
+              f"pks {answer['pks']}, scut {answer['scut']}, {answer['num_state']} ensembles")
+
+def benchmark_hdist(frame_counts=(250, 1000, 2500, 5000), loop_frames=250, seed=0):
+    # Hdist of a thresholded similarity matrix of random frames with a few
+    # similar groups, the double loop is only run up to loop_frames and its
+    # time per pair extrapolated beyond
+    rng = np.random.default_rng(seed)
+    loop_time = None
+    for frames in frame_counts:
+        groups = rng.integers(0, 5, frames)
+        A = ((groups[:, np.newaxis] == groups[np.newaxis, :]) & (rng.random((frames, frames)) < 0.6)) | (rng.random((frames, frames)) < 0.05)
+        times = {}
+        for name, function in [('gemm', hdist), ('blocks', lambda A: hdist(A, block_size=512)), ('packed', lambda A: hdist(A, packed=True))]:
+            start_time = time.time()
+            Hd = function(A)
+            times[name] = time.time() - start_time
+        assert np.allclose(Hd, hdist(A), equal_nan=True)
+        if frames <= loop_frames:
+            start_time = time.time()
+            assert np.allclose(hdist_loop(A), Hd, equal_nan=True)
+            loop_time = (time.time() - start_time) / frames**2
+        estimate = '' if loop_time is None else f", loop {loop_time * frames**2:.2f} s{'' if frames <= loop_frames else ' (extrapolated)'}"
+        print(f"{frames} frames: " + ", ".join(f"{name} {value:.3f} s" for name, value in times.items()) + estimate)
+
+if __name__ == "__main__":
+    import argparse
+    import scipy.io
+    parser = argparse.ArgumentParser(description="Runtime benchmark and MATLAB parity check of the Python Stoixeion")
+    parser.add_argument("raster", nargs="?", help=".mat file with the raster used by the MATLAB run")
+    parser.add_argument("reference", nargs="?", help=".mat file with the saved stoixeion_results")
+    parser.add_argument("--variable", default="spikes", help="Name of the raster inside the .mat file")
+    parser.add_argument("--hdist", action="store_true", help="Benchmark the Hdist kernels at several frame counts instead")
+    args = parser.parse_args()
+    if args.hdist:
+        benchmark_hdist()
+    elif args.raster is None:
+        benchmark()
+    else:
+        spikes = scipy.io.loadmat(args.raster)[args.variable]
+        reference = scipy.io.loadmat(args.reference, squeeze_me=False)
+        reference = {key: value for key, value in reference.items() if not key.startswith('__')}
+        # Same parameters as the MATLAB run, pks and scut fixed to skip the shuffles
+        pars = {
+            'pks': np.ravel(reference['pks']),
+            'scut': np.ravel(reference['scut']),
+            'hcut': float(np.ravel(reference['hcut'])[0]),
+            'statecut': spikes.shape[0] / float(np.ravel(reference['state_cut'])[0]),
+            'csi_start': float(np.ravel(reference['csi_vec_start'])[0]),
+            'csi_step': float(np.ravel(reference['csi_vec_step'])[0]),
+            'csi_end': float(np.ravel(reference['csi_vec_end'])[0]),
+            'tf_idf_norm': bool(np.ravel(reference['tf_idf_norm'])[0])
+        }
+        answer = stoixeion(spikes, pars)
+        for key, difference in compare_with_matlab(answer, reference).items():
+            print(f"{key}: {difference}")
@@ -0,0 +1,616 @@
+import contextlib
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from scipy.cluster.hierarchy import linkage, fcluster, leaves_list
+from scipy.spatial.distance import squareform
+from scipy.stats import ttest_ind, norm
+
+# Python port of analysis/Xsembles2P/Xsembles/Get_Xsembles.m and the stages it
+# calls. Rasters are neurons x frames. Indices returned in the analysis dict
+# (neurons, frames, vectors, tree nodes) are 1-based, like the MATLAB output.
+
+def reshape_raster(raster, window):
+    if window == 1:
+        return raster.astype(bool)
+    frames = raster.shape[-1] // window * window
+    return raster[..., :frames].reshape(*raster.shape[:-1], -1, window).sum(axis=-1) > 0
+
+def pairwise_coactivity(raster):
+    # Counts are exact in float32 up to 2^24 frames
+    raster = raster.astype(np.float32)
+    coactivity = raster @ raster.T
+    np.fill_diagonal(coactivity, 0)
+    return coactivity
+
+def shuffle_raster(raster, rng):
+    # Circular shift of every neuron by a random amount between 1 and frames
+    neurons, frames = raster.shape
+    shifts = rng.integers(1, frames + 1, size=neurons)
+    idx = (np.arange(frames)[np.newaxis, :] - shifts[:, np.newaxis]) % frames
+    return np.take_along_axis(raster, idx, axis=1)
+
+def surrogate_coactivity_counts(raster, coactivity, seeds, bin=1):
+    # Coactivity of one circular shift surrogate per seed, computed as a batch
+    # of matrix products and reduced to the number of surrogates below the
+    # observed coactivity and the minimum and maximum of every edge
+    shuffled = np.stack([shuffle_raster(raster, np.random.default_rng(seed)) for seed in seeds])
+    if bin > 1:
+        shuffled = reshape_raster(shuffled, bin)
+    shuffled = shuffled.astype(np.float32)
+    surrogate = shuffled @ shuffled.transpose(0, 2, 1)
+    diagonal = np.arange(surrogate.shape[1])
+    surrogate[:, diagonal, diagonal] = 0
+    below = (surrogate < coactivity).sum(axis=0)
+    return below, surrogate.min(axis=0), surrogate.max(axis=0)
+
+def neuronal_network(raster, iterations=1000, alpha=0.05, bin=1, rng=None, workers=1, batch_size=None):
+    raster = np.asarray(raster) > 0
+    if bin > 1:
+        raster = reshape_raster(raster, bin)
+    coactivity = pairwise_coactivity(raster)
+    n_neurons, n_frames = raster.shape
+    iterations = int(iterations)
+
+    # The surrogates are not kept. coactivity > coactivity_threshold(...) only
+    # depends on the minimum and maximum of the surrogates of an edge and on
+    # whether the order statistic at position is below the observed
+    # coactivity, that is whether more than position surrogates are below it.
+    # Batches of at most 2^24 surrogate counts, one batch per worker at a time
+    if batch_size is None:
+        batch_size = max(1, 2**24 // (n_neurons * max(n_neurons, n_frames)))
+    position = np.argmax(np.arange(1, iterations + 1) / iterations > (1 - alpha))
+    below = np.zeros((n_neurons, n_neurons), dtype=np.int64)
+    minimum = np.full((n_neurons, n_neurons), np.inf, dtype=np.float32)
+    maximum = np.zeros((n_neurons, n_neurons), dtype=np.float32)
+
+    # Like the MATLAB version, the binned raster is binned again after shuffling
+    def counts(batch):
+        return surrogate_coactivity_counts(raster, coactivity, batch, bin)
+
+    print("   Shuffling data...")
+    seeds = np.random.SeedSequence(rng).spawn(iterations)
+    batches = [seeds[i:i + batch_size] for i in range(0, iterations, batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(batches), workers):
+            for batch_below, batch_minimum, batch_maximum in executor.map(counts, batches[i:i + workers]):
+                below += batch_below
+                np.minimum(minimum, batch_minimum, out=minimum)
+                np.maximum(maximum, batch_maximum, out=maximum)
+
+    # Edges without variation in the surrogates need maximum+1 coactivations
+    return np.where(minimum == maximum, coactivity > maximum + 1, (below > position) | (coactivity >= maximum))
+
+def coactivity_threshold(surrogate_coactivity, alpha):
+    # Coactivity_Threshold.m for every edge at once, only used by the
+    # reference below. The threshold is the first count whose cumulative
+    # histogram goes above 1-alpha, limited to the left edge of the last bin
+    iterations = surrogate_coactivity.shape[0]
+    position = np.argmax(np.arange(1, iterations + 1) / iterations > (1 - alpha))
+    surrogate_coactivity = np.sort(surrogate_coactivity, axis=0)
+    minimum = surrogate_coactivity[0].astype(float)
+    maximum = surrogate_coactivity[-1].astype(float)
+    th = np.minimum(surrogate_coactivity[position].astype(float), maximum - 1)
+    return np.where(minimum == maximum, maximum + 1, th)
+
+def neuronal_network_loop(raster, iterations=1000, alpha=0.05, bin=1, rng=None):
+    # neuronal_network as it was, keeping every surrogate, as a reference.
+    # Same seeds, so the same surrogates as neuronal_network
+    raster = np.asarray(raster) > 0
+    if bin > 1:
+        raster = reshape_raster(raster, bin)
+    coactivity = pairwise_coactivity(raster)
+    upper = np.triu_indices(coactivity.shape[0], 1)
+    surrogate_coactivity = []
+    for seed in np.random.SeedSequence(rng).spawn(int(iterations)):
+        shuffled = shuffle_raster(raster, np.random.default_rng(seed))
+        if bin > 1:
+            shuffled = reshape_raster(shuffled, bin)
+        surrogate_coactivity.append(pairwise_coactivity(shuffled)[upper])
+    th = squareform(coactivity_threshold(np.stack(surrogate_coactivity), alpha))
+    return coactivity > th
+
+def check_network(cases=40, seed=0):
+    # neuronal_network against the reference on random rasters with varying
+    # iterations, alpha, bin, workers and batch size
+    rng = np.random.default_rng(seed)
+    different = 0
+    for case in range(cases):
+        raster = rng.random((int(rng.integers(2, 60)), int(rng.integers(5, 400)))) < rng.uniform(0.01, 0.5)
+        iterations = int(rng.choice([1, 2, 7, 50, 200]))
+        alpha = float(rng.choice([0.01, 0.05, 0.2, 0.5]))
+        bin = int(rng.choice([1, 1, 2, 3]))
+        workers = int(rng.choice([1, 4]))
+        batch_size = int(rng.choice([1, 3, 64])) if case % 2 else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            network = neuronal_network(raster, iterations, alpha, bin, rng=case, workers=workers, batch_size=batch_size)
+        if not np.array_equal(network, neuronal_network_loop(raster, iterations, alpha, bin, rng=case)):
+            different += 1
+            print(f"Case {case}: {raster.shape[0]} x {raster.shape[1]}, {iterations} iterations, "
+                  f"alpha {alpha}, bin {bin}, batch size {batch_size} differs")
+    print(f"{cases} cases, {different} different")
+    return different == 0
+
+def filter_raster_by_network(raster, network):
+    # Remove the spikes of neurons without significant connections to the
+    # other neurons active in the same frame
+    raster = np.asarray(raster) > 0
+    connections = network.T.astype(np.float32) @ raster.astype(np.float32)
+    raster_filtered = raster & (connections > 0)
+    removed = int(raster.sum() - raster_filtered.sum())
+    fraction_removed = removed / raster.sum()
+    print(f"      {removed}({fraction_removed*100:.1f}%) spikes removed!")
+    return raster_filtered, fraction_removed
+
+def find_peaks(data, threshold=0, join=True, detect_peaks=True, ignore_ini_fin=False):
+    # Find_Peaks.m without the minimum and fixed width options, returns the
+    # peak number of every point (0 outside peaks) and the peak widths
+    data = np.ravel(np.asarray(data, dtype=float))
+    above = data > threshold if detect_peaks else data < threshold
+    if ignore_ini_fin and above.any():
+        # Peaks touching the first or last point are discarded
+        if above[0]:
+            above[:np.argmin(above) if not above.all() else len(above)] = False
+        if above.any() and above[-1]:
+            above[len(above) - np.argmin(above[::-1]):] = False
+    if join:
+        starts = above & ~np.concatenate(([False], above[:-1]))
+        indices = np.cumsum(starts) * above
+    else:
+        indices = np.cumsum(above) * above
+    widths = np.bincount(indices, minlength=1)[1:]
+    return indices, widths
+
+def get_peak_vectors(data, peak_indices, vector_method='binary'):
+    # Peak vectors as peaks x neurons
+    peaks = peak_indices.max()
+    membership = np.zeros((data.shape[1], peaks))
+    frames = np.flatnonzero(peak_indices)
+    membership[frames, peak_indices[frames] - 1] = 1
+    sums = (data.astype(float) @ membership).T
+    if vector_method == 'binary':
+        return sums > 0
+    elif vector_method == 'sum':
+        return sums
+    elif vector_method == 'average':
+        return sums / membership.sum(axis=0)[:, np.newaxis]
+    raise ValueError("Vector method should be: 'sum', 'binary' or 'average'")
+
+def jaccard_similarity(vectors):
+    # 1 - pdist(vectors, 'jaccard') in matrix form from the Gram matrix
+    vectors = vectors.astype(float)
+    intersection = vectors @ vectors.T
+    active = np.diag(intersection)
+    union = active[:, np.newaxis] + active[np.newaxis, :] - intersection
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return intersection / union
+
+def get_peaks_similarity(vectors):
+    if vectors.shape[0] < 2:
+        print("   There are no data to compare!")
+        return None
+    similarity = jaccard_similarity(vectors)
+    if np.nanmax(1 - similarity) == 0:
+        return np.ones(similarity.shape)
+    return similarity
+
+def contrast_index(n_clusters, similarity, labels):
+    # Average similarity inside and outside every group from one product
+    # with the group membership matrix
+    sim = similarity - np.diag(np.diag(similarity))
+    membership = (labels[:, np.newaxis] == np.arange(1, n_clusters + 1)[np.newaxis, :]).astype(float)
+    sums = membership.T @ sim @ membership
+    count = membership.sum(axis=0)
+    total = len(labels)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg_in = np.diag(sums) / (count**2 - count)
+        avg_out = (sums.sum(axis=1) - np.diag(sums)) / (count * (total - count))
+        index = (avg_in - avg_out) / (avg_in + avg_out)
+    valid = index[~np.isnan(index)]
+    sem = np.std(valid, ddof=1) / np.sqrt(len(valid)) if len(valid) > 1 else (0.0 if len(valid) else np.nan)
+    return np.mean(index), sem
+
+def select_best_index(indices, method='max'):
+    # Select_Best_Index.m, returns a 0-based position
+    indices = np.asarray(indices, dtype=float)
+    if np.any(indices == 1):
+        return int(np.flatnonzero(indices == 1)[-1])
+    if method == 'max':
+        return 0 if np.all(np.isnan(indices)) else int(np.nanargmax(indices))
+    elif method == 'firstpeak':
+        increasing = np.flatnonzero(np.diff(indices) > 0)
+        if len(increasing) == 0 or increasing[0] == len(indices) - 2:
+            return 0
+        indices_copy = indices.copy()
+        indices_copy[:increasing[0] + 1] = 0
+        decreasing = np.flatnonzero(np.diff(indices_copy) < 0)
+        if len(decreasing) == 0:
+            return select_best_index(indices, 'max')
+        return int(decreasing[0])
+    raise ValueError("Select only the following methods 'max' or 'firstpeak'")
+
+def contrast_test(tree, similarity, clustering_range):
+    clustering_range = np.asarray(clustering_range, dtype=int)
+    avg_indices = np.zeros(len(clustering_range))
+    sem_indices = np.zeros(len(clustering_range))
+    for j, n_clusters in enumerate(clustering_range):
+        labels = fcluster(tree, n_clusters, criterion='maxclust')
+        avg_indices[j], sem_indices[j] = contrast_index(n_clusters, similarity, labels)
+    indices = avg_indices - sem_indices
+
+    # 'localmax' selection
+    last = len(clustering_range) - 1
+    id = select_best_index(indices, 'max')
+    if id == last:
+        id = select_best_index(avg_indices, 'max')
+    if id == last:
+        id = select_best_index(avg_indices, 'firstpeak')
+    if id == last:
+        difference = np.diff(avg_indices)
+        id = select_best_index(np.max(difference) - difference, 'firstpeak') + 1
+    return int(clustering_range[id]), indices
+
+def get_evoked_neurons(activity, stim):
+    # Get_Evoked_Neurons.m comparing the ensemble activations against the
+    # frames between them, t-tests run for all the neurons at once
+    n_neurons = activity.shape[0]
+    stim_id, _ = find_peaks(stim, 0.1, True, True)
+    if stim_id.max() < 2:
+        return np.zeros(n_neurons, dtype=bool), np.zeros(n_neurons), np.zeros((n_neurons, 2)), np.ones(n_neurons), np.zeros(n_neurons, dtype=bool)
+    no_stim_id, _ = find_peaks(stim, 0.1, True, False, ignore_ini_fin=True)
+
+    spikes_stim = get_peak_vectors(activity, stim_id, 'average').T
+    spikes_no_stim = get_peak_vectors(activity, no_stim_id, 'average').T
+    weights = np.column_stack((spikes_stim.mean(axis=1), spikes_no_stim.mean(axis=1)))
+
+    total_spikes = spikes_stim.sum(axis=1) + spikes_no_stim.sum(axis=1)
+    active = total_spikes > 0
+    p = np.ones(n_neurons)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        p[active] = ttest_ind(spikes_stim[active], spikes_no_stim[active], axis=1).pvalue
+        cp = np.where(active, (spikes_stim.sum(axis=1) - spikes_no_stim.sum(axis=1)) / total_spikes, 0)
+    tuned = p <= 0.05
+
+    change = weights[:, 1] - weights[:, 0]
+    tuned1 = tuned & ~(change > 0)
+    tuned2 = tuned & ~(change < 0)
+    return tuned1, cp, weights, p, tuned2
+
+def get_epi(raster, ensemble_times):
+    # Ensemble Participation Index of every neuron
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction_ensemble = raster[:, ensemble_times].mean(axis=1)
+        fraction_noensemble = raster[:, ~ensemble_times].mean(axis=1)
+        return (fraction_ensemble - fraction_noensemble) / (fraction_ensemble + fraction_noensemble)
+
+def get_xsemble_neurons(raster, vector_id, sequence):
+    n_ensembles = len(np.unique(sequence))
+    n_neurons, n_frames = raster.shape
+    vector_frames = np.flatnonzero(vector_id)
+    structures = {key: [] for key in ['Activated', 'Silenced', 'BelongingnessTest', 'EPI', 'P']}
+    onsemble_neurons = []
+    offsemble_neurons = []
+    ensemble_vectors = []
+    ensemble_indices = []
+    for i in range(1, n_ensembles + 1):
+        peak_indices = vector_frames[sequence == i]
+        ensemble_vectors.append(raster[:, peak_indices])
+        ensemble_indices.append(peak_indices)
+
+        ensemble_activity = np.zeros(n_frames, dtype=bool)
+        ensemble_activity[peak_indices] = True
+        significantly_active, belongingness, _, p, significantly_silence = get_evoked_neurons(raster, ensemble_activity)
+        EPI = get_epi(raster, ensemble_activity)
+
+        neurons_i = np.flatnonzero(significantly_active)
+        onsemble_neurons.append(neurons_i[np.argsort(-belongingness[neurons_i], kind='stable')])
+        neurons_i = np.flatnonzero(significantly_silence)
+        offsemble_neurons.append(neurons_i[np.argsort(belongingness[neurons_i], kind='stable')])
+
+        structures['Activated'].append(significantly_active)
+        structures['Silenced'].append(significantly_silence)
+        structures['BelongingnessTest'].append(belongingness)
+        structures['EPI'].append(EPI)
+        structures['P'].append(p)
+
+    structures = {key: np.array(value) for key, value in structures.items()}
+    structures['Trinary'] = structures['Activated'].astype(float)
+    structures['Trinary'][structures['Silenced']] = -1
+    return structures, onsemble_neurons, offsemble_neurons, ensemble_vectors, ensemble_indices
+
+def subnetworks(network, sub_nodes):
+    n_nodes = network.shape[0]
+    all_subnetworks = np.zeros((n_nodes, n_nodes), dtype=bool)
+    networks = []
+    for nodes in sub_nodes:
+        network_i = np.zeros((n_nodes, n_nodes))
+        network_i[np.ix_(nodes, nodes)] = network[np.ix_(nodes, nodes)]
+        networks.append(network_i)
+        all_subnetworks |= network_i > 0
+    return networks, all_subnetworks
+
+def group_mean(vectors):
+    # mean() of MATLAB over the rows, which averages a single row over its
+    # columns and gives NaN for no rows
+    if vectors.shape[0] == 0:
+        return np.nan
+    if vectors.shape[0] == 1:
+        return vectors.mean()
+    return vectors.mean(axis=0)
+
+def get_xsemble_activity(raster, ensemble_indices, ensemble_vectors, structure_on, structure_off):
+    neurons, frames = raster.shape
+    n_clusters = len(ensemble_indices)
+    on_activity = np.zeros((n_clusters, frames))
+    off_activity = np.zeros((n_clusters, frames))
+    structure_weights = np.zeros((n_clusters, neurons))
+    for i in range(n_clusters):
+        id = ensemble_indices[i]
+        vectors = ensemble_vectors[i].astype(float)
+        on_activity[i, id] = group_mean(vectors[structure_on[i]])
+        off_activity[i, id] = group_mean(vectors[structure_off[i]])
+        structure_weights[i] = vectors.mean(axis=1)
+    structure_weights_significant = structure_weights.copy()
+    structure_weights_significant[~structure_on | ~structure_off] = 0
+    ensemble_activity = on_activity > 0
+    return ensemble_activity, on_activity, off_activity, structure_weights, structure_weights_significant
+
+def ensemble_duration(vector_id, sequence):
+    # Length of every run of consecutive vectors of the same ensemble
+    ensembles = np.unique(sequence)
+    n_activations = np.zeros(len(ensembles), dtype=int)
+    widths = []
+    for i, ensemble in enumerate(ensembles):
+        _, w = find_peaks((sequence == ensemble).astype(float))
+        n_activations[i] = len(w)
+        widths.append(w)
+    return widths, n_activations
+
+def similarity_within_rasters(ensemble_vectors):
+    within = np.zeros(len(ensemble_vectors))
+    count = np.zeros(len(ensemble_vectors), dtype=int)
+    for i, vectors in enumerate(ensemble_vectors):
+        count[i] = vectors.shape[1]
+        similarity = jaccard_similarity(vectors.T)
+        within[i] = np.mean(similarity[np.triu_indices(count[i], 1)]) if count[i] > 1 else np.nan
+    return within, count
+
+def test_ensemble_similarity(similarity, within, counts, iterations=1000, rng=0):
+    # Average similarity of random groups of vectors of every size, all the
+    # permutations are drawn at once
+    rng = np.random.default_rng(rng)
+    n_vectors = similarity.shape[0]
+    vector_id = rng.permuted(np.tile(np.arange(n_vectors), (int(iterations), 1)), axis=1)
+    group = similarity[vector_id[:, :1], vector_id[:, 1:]]
+    avg_sim = np.cumsum(group, axis=1) / np.arange(1, n_vectors)
+    p = np.zeros(len(within))
+    for i in range(len(within)):
+        selected = avg_sim[:, counts[i] - 1]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p[i] = 1 - norm.cdf(within[i], np.mean(selected), np.std(selected, ddof=1))
+    return p
+
+def sort_ensembles_by_epi(EPI):
+    avg_epi_onoff = np.mean(np.clip(EPI, 0, None), axis=1) - np.mean(np.clip(EPI, None, 0), axis=1)
+    # MATLAB puts NaN first when sorting in descending order
+    missing = np.isnan(avg_epi_onoff)
+    valid = np.flatnonzero(~missing)
+    ensemble_id = np.concatenate((np.flatnonzero(missing), valid[np.argsort(-avg_epi_onoff[valid], kind='stable')]))
+    return avg_epi_onoff[ensemble_id], ensemble_id, avg_epi_onoff
+
+def sort_neurons_by_weights(structure):
+    n_ensembles, n_neurons = structure.shape
+    neuron_id = np.arange(n_neurons)
+    for i in range(n_ensembles - 1, -1, -1):
+        id = np.argsort(-structure[i], kind='stable')
+        structure = structure[:, id]
+        neuron_id = neuron_id[id]
+    return structure, neuron_id
+
+def get_xsembles(raster, pars, rng=0):
+    network_bin = int(pars['NetworkBin'])
+    network_iterations = int(pars['NetworkIterations'])
+    network_significance = float(pars['NetworkSignificance'])
+    coactive_neurons_threshold = float(pars['CoactiveNeuronsThreshold'])
+    clustering_range = np.ravel(np.asarray(pars['ClusteringRange'], dtype=int))
+    clustering_fixed = int(pars['ClusteringFixed'])
+    ensemble_iterations = int(pars['EnsembleIterations'])
+    parallel_processing = bool(pars['ParallelProcessing'])
+
+    print("---Xsembles---")
+    print("Extraction of neuronal ensembles (onsembles and offsembles)...")
+    t_initial = time.time()
+    raster = np.asarray(raster) > 0
+    n_neurons, n_frames = raster.shape
+    print(f"   Analyzing activity from {n_neurons} neurons along {n_frames} frames...")
+
+    print("   Identifying functional network connectivity...")
+    workers = (os.cpu_count() or 1) if parallel_processing else 1
+    network = neuronal_network(raster, network_iterations, network_significance, network_bin, rng=rng, workers=workers)
+
+    print("   Filtering non-significant coactivations...")
+    raster_filtered, spikes_fraction_removed = filter_raster_by_network(raster, network)
+
+    print(f"   Finding coactivity above {coactive_neurons_threshold} neurons...")
+    population_vectors, _ = find_peaks(raster_filtered.sum(axis=0), coactive_neurons_threshold, False)
+    if population_vectors.max() == 0:
+        print("   There is not enough coactivity to extract ensembles.")
+        return None
+
+    print("   Getting vectors...")
+    raster_vectors = get_peak_vectors(raster, population_vectors, 'binary')
+
+    print("   Getting similarity...")
+    similarity = get_peaks_similarity(raster_vectors)
+    if similarity is None:
+        return None
+
+    print("   Clustering vectors...")
+    tree = linkage(squareform(1 - similarity, checks=False), 'ward')
+    tree_id = leaves_list(tree) + 1
+
+    print("   Evaluating clusters by contrast index...")
+    n_recommended, clustering_indices = contrast_test(tree, similarity, clustering_range)
+    if clustering_fixed:
+        print(f"      Number of clusters fixed to {clustering_fixed}")
+        n_ensembles = clustering_fixed
+    else:
+        n_ensembles = n_recommended
+    print(f"      Number of clusters recommended = {n_recommended}")
+
+    print(f"   Extracting {n_ensembles} ensembles...")
+    sequence = fcluster(tree, n_ensembles, criterion='maxclust')
+    n_ensembles = len(np.unique(sequence))
+
+    print("   Identifying significant activated and silenced neurons for each ensemble...")
+    structures, onsemble_neurons, offsemble_neurons, ensemble_vectors, ensemble_indices = \
+        get_xsemble_neurons(raster, population_vectors, sequence)
+
+    print("   Getting ensemble networks...")
+    onsemble_networks, all_onsemble_networks = subnetworks(network, onsemble_neurons)
+    offsemble_networks, all_offsemble_networks = subnetworks(network, offsemble_neurons)
+
+    print("   Getting ensemble activity...")
+    ensemble_activity, on_activity, off_activity, structure_weights, structure_weights_significant = \
+        get_xsemble_activity(raster, ensemble_indices, ensemble_vectors, structures['Activated'], structures['Silenced'])
+
+    print("   Getting ensemble durations...")
+    widths, n_continuous_activations = ensemble_duration(population_vectors, sequence)
+
+    print(f"   Testing similarity within ensemble vectors ({ensemble_iterations} iterations)...")
+    within_similarity, vector_count = similarity_within_rasters(ensemble_vectors)
+    ensemble_p = test_ensemble_similarity(similarity, within_similarity, n_continuous_activations, ensemble_iterations)
+    print(f"      {np.count_nonzero(ensemble_p < 0.05)} ensembles with similarity p < 0.05")
+
+    print("   Sorting ensembles from high to low participation...")
+    _, ensemble_id_sorted, ensemble_avg_weights = sort_ensembles_by_epi(structures['EPI'])
+    def sort_list(values):
+        return [values[i] for i in ensemble_id_sorted]
+    on_activity = on_activity[ensemble_id_sorted]
+    off_activity = off_activity[ensemble_id_sorted]
+    ensemble_activity = ensemble_activity[ensemble_id_sorted]
+    onsemble_networks = sort_list(onsemble_networks)
+    offsemble_networks = sort_list(offsemble_networks)
+    ensemble_vectors = sort_list(ensemble_vectors)
+    ensemble_indices = sort_list(ensemble_indices)
+    within_similarity = within_similarity[ensemble_id_sorted]
+    vector_count = vector_count[ensemble_id_sorted]
+    structures = {key: value[ensemble_id_sorted] for key, value in structures.items()}
+    structure_weights = structure_weights[ensemble_id_sorted]
+    structure_weights_significant = structure_weights_significant[ensemble_id_sorted]
+    onsemble_neurons = sort_list(onsemble_neurons)
+    offsemble_neurons = sort_list(offsemble_neurons)
+    widths = sort_list(widths)
+    n_continuous_activations = n_continuous_activations[ensemble_id_sorted]
+    ensemble_p = ensemble_p[ensemble_id_sorted]
+
+    _, neuron_id = sort_neurons_by_weights(structure_weights_significant)
+    n_ensemble_activations = np.array([len(indices) for indices in ensemble_indices])
+    vector_id = np.concatenate(ensemble_indices) + 1
+    activation_sequence = np.zeros(n_frames)
+    for i in range(n_ensembles):
+        activation_sequence[ensemble_activity[i]] = i + 1
+
+    print("   Adding results to 'analysis' variable output...")
+    analysis = {
+        'Options': {
+            'Network': {'Bin': network_bin, 'Iterations': network_iterations, 'SignificanceLevel': network_significance},
+            'Vectors': {'CoactivityThreshold': coactive_neurons_threshold},
+            'Clustering': {'Range': clustering_range, 'Fixed': clustering_fixed},
+            'Ensemble': {'Iterations': ensemble_iterations},
+            'ParallelProcessing': parallel_processing
+        },
+        'Raster': raster,
+        'Neurons': n_neurons,
+        'Frames': n_frames,
+        'Network': network,
+        'Filter': {
+            'RasterFiltered': raster_filtered,
+            'SpikesFractionRemoved': spikes_fraction_removed,
+            'RasterVectors': raster_vectors,
+            'VectorID': population_vectors
+        },
+        'Clustering': {
+            'Similarity': similarity,
+            'Tree': np.column_stack((tree[:, :2] + 1, tree[:, 2])),
+            'TreeID': tree_id,
+            'Fixed': clustering_fixed,
+            'RecommendedClusters': n_recommended,
+            'ClusteringRange': clustering_range,
+            'ClusteringIndices': clustering_indices
+        },
+        'Ensembles': {
+            'Count': n_ensembles,
+            'ActivationSequence': activation_sequence,
+            'Activity': ensemble_activity,
+            'OnsembleNeurons': [neurons + 1 for neurons in onsemble_neurons],
+            'OffsembleNeurons': [neurons + 1 for neurons in offsemble_neurons],
+            'OnsembleActivity': on_activity,
+            'OffsembleActivity': off_activity,
+            'OnsembleNetworks': onsemble_networks,
+            'OffsembleNetworks': offsemble_networks,
+            'AllOnsembleNetwork': all_onsemble_networks,
+            'AllOffsembleNetwork': all_offsemble_networks,
+            'Vectors': ensemble_vectors,
+            'Indices': [indices + 1 for indices in ensemble_indices],
+            'VectorCount': vector_count,
+            'Similarity': within_similarity,
+            'StructureOn': structures['Activated'],
+            'StructureOff': structures['Silenced'],
+            'StructureTrinary': structures['Trinary'],
+            'StructureBelongingness': structures['BelongingnessTest'],
+            'StructureP': structures['P'],
+            'StructureWeights': structure_weights,
+            'StructureWeightsSignificant': structure_weights_significant,
+            'EPI': structures['EPI'],
+            'Weights': ensemble_avg_weights,
+            'NeuronID': neuron_id + 1,
+            'VectorID': vector_id,
+            'Durations': widths,
+            'ContinuousActivationCount': n_continuous_activations,
+            'FrameActivationCount': n_ensemble_activations,
+            'Probability': ensemble_p,
+            'Iterations': ensemble_iterations
+        }
+    }
+    print(f"You are all set! (total time: {time.time() - t_initial:.2f} seconds)")
+    return analysis
+
+def synthetic_raster(neurons, frames, ensembles=4, ensemble_size=15, rate=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    raster = rng.random((neurons, frames)) < rate
+    for _ in range(ensembles):
+        cells = rng.choice(neurons, ensemble_size, replace=False)
+        onsets = rng.choice(frames, frames // 50, replace=False)
+        raster[np.ix_(cells, onsets)] |= rng.random((ensemble_size, len(onsets))) < 0.8
+    return raster
+
+def benchmark(sizes=((100, 2000), (200, 5000), (400, 10000)), iterations=1000):
+    pars = {
+        'NetworkBin': 1,
+        'NetworkIterations': iterations,
+        'NetworkSignificance': 0.05,
+        'CoactiveNeuronsThreshold': 2,
+        'ClusteringRange': np.arange(3, 11),
+        'ClusteringFixed': 0,
+        'EnsembleIterations': 1000,
+        'ParallelProcessing': True
+    }
+    for neurons, frames in sizes:
+        raster = synthetic_raster(neurons, frames)
+        start_time = time.time()
+        analysis = get_xsembles(raster, pars)
+        count = analysis['Ensembles']['Count'] if analysis is not None else 0
+        print(f"{neurons} x {frames}: {time.time() - start_time:.2f} seconds, {count} ensembles")
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Runtime benchmark of the Python Get_Xsembles")
+    parser.add_argument("--check", action="store_true", help="Compare the streamed network surrogates with the previous implementation instead")
+    args = parser.parse_args()
+    if args.check:
+        sys.exit(0 if check_network() else 1)
+    benchmark()